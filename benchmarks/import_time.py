@@ -0,0 +1,48 @@
+"""Temps d'import à froid du cœur `foleskine` (sans interface graphique).
+
+    python benchmarks/import_time.py [--runs N] [--max-ms MS]
+
+Chaque mesure lance un interpréteur neuf avec `-X importtime`. Le script
+échoue (code 1) si la meilleure mesure dépasse --max-ms. L'absence de
+tkinter et sqlite3 et de dossier de données créé est vérifiée par
+tests/test_import.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_once(data_dir: str) -> float:
+    env = dict(os.environ, FOLESKINE_DATA_DIR=data_dir, PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import foleskine"],
+                          capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == "foleskine":
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError("ligne 'foleskine' absente de -X importtime")
+    return cumulative_us / 1000
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = [measure_once(os.path.join(tmp, "data")) for _ in range(args.runs)]
+
+    best = min(timings)
+    print(f"import foleskine: meilleur {best:.1f} ms, médiane {sorted(timings)[len(timings) // 2]:.1f} ms")
+    if best > args.max_ms:
+        print(f"ÉCHEC: import trop lent ({best:.1f} ms > {args.max_ms} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""Banc d'essai des chemins critiques du stockage et de l'interface.
+
+    python benchmarks/run.py --profile medium --output resultats.json
+    python benchmarks/run.py --profile medium --baseline resultats.json
+
+Une bibliothèque synthétique est générée dans un dossier temporaire
+(FOLESKINE_DATA_DIR), puis chaque opération est chronométrée plusieurs fois
+via l'API du cœur. Les mesures de l'interface utilisent une racine Tk cachée
+et sont marquées "skipped" sans affichage disponible.
+
+Avec --baseline, le script échoue (code 1) si la médiane d'une mesure
+dépasse celle de la référence multipliée par --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import import_time  # noqa: E402
+import synth  # noqa: E402
+
+PROFILES = {
+    "small": dict(notebooks=10, pages=5, page_size=2_000, big_pages=200, huge_page_mb=1),
+    "medium": dict(notebooks=1_000, pages=20, page_size=2_000, big_pages=2_000, huge_page_mb=4),
+    "large": dict(notebooks=10_000, pages=10, page_size=2_000, big_pages=10_000, huge_page_mb=8),
+}
+
+# Écart absolu toléré (ms) en plus du facteur: évite les faux positifs sur les mesures minuscules
+ABSOLUTE_SLACK_MS = 0.5
+
+def timed(fn, runs: int, setup=None) -> dict:
+    samples = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "runs": runs,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+def bench_core(core, info: dict, runs: int) -> dict:
+    results = {}
+    lib_dir, index_path = core.LIB_DIR, core.INDEX_PATH
+
+    def cold_index():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        core.LIBRARY._entries = None
+
+    results["refresh_library.cold"] = timed(lambda: core.LIBRARY.refresh(), max(1, runs // 3), setup=cold_index)
+    # Premières lignes de la barre latérale (titres provisoires), avant la lecture des carnets par le pool
+    results["library.scan.first_rows"] = timed(lambda: core.LIBRARY.scan().close(), max(1, runs // 3),
+                                               setup=cold_index)
+    core.LIBRARY.refresh()
+    core.LIBRARY.flush()
+    results["refresh_library.warm"] = timed(lambda: core.LIBRARY.refresh(), runs)
+    entries = core.LIBRARY.sorted_entries()
+    target = entries[len(entries) // 2]["path"]
+    results["lib_paths"] = timed(lambda: [e["path"] for e in entries], runs)
+    results["select_current_in_list"] = timed(lambda: [e["path"] for e in entries].index(target), runs)
+
+    # Modèle de la barre latérale à 50 000 carnets (indépendant du profil)
+    rng = random.Random(0)
+    fake = [{"path": f"/bench/{i:05d}.json", "title": synth.make_text(rng, 24),
+             "updated_at": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00"} for i in range(50_000)]
+    model = core.LibraryModel()
+    results["library_model.set_entries.50k"] = timed(lambda: model.set_entries(fake), runs)
+
+    def type_filter():
+        for n in range(1, 6):
+            model.set_filter("rivière"[:n])
+        model.set_filter("")
+    results["library_model.filter.50k"] = timed(type_filter, runs)
+    results["library_model.sort.50k"] = timed(lambda: (model.set_sort("updated_at"), model.set_sort("title")), runs)
+    results["library_model.totals.50k"] = timed(model.totals, runs)
+
+    big = info["big"]
+    results["notebook.load.json"] = timed(lambda: core.Notebook.load(big), runs)
+    results["notebook.load.huge_page"] = timed(lambda: core.Notebook.load(info["huge"]), runs)
+
+    # Retour à un carnet quitté récemment: cache LRU (un stat) au lieu de notebook.load.json
+    cache = core.NotebookCache(max_bytes=1 << 40)
+    cache.put(core.Notebook.load(big))
+
+    def switch_back():
+        entry = cache.take(big)
+        cache.put(entry.notebook, entry.page, entry.cursor)
+    results["notebook.switch.cached"] = timed(switch_back, runs)
+
+    nb = core.Notebook.load(big)
+    counter = iter(range(10 ** 9))
+
+    def edit(notebook):
+        notebook.set_page(len(notebook.data["pages"]) // 2, f"modification {next(counter)}")
+
+    core.SETTINGS["journal"] = True
+    results["notebook.save.journal"] = timed(lambda: (edit(nb), nb.save()), runs)
+    nb.compact()
+    core.SETTINGS["journal"] = False
+    results["notebook.save.full"] = timed(lambda: (edit(nb), nb.save()), runs)
+
+    # Réglage "durability": coût de la synchronisation disque selon le mode
+    for mode in core.DURABILITY_MODES:
+        core.SETTINGS["durability"] = mode
+        core.SETTINGS["journal"] = True
+        results[f"notebook.save.journal.{mode}"] = timed(lambda: (edit(nb), nb.save()), runs)
+        nb.compact()
+        core.SETTINGS["journal"] = False
+        results[f"notebook.save.full.{mode}"] = timed(lambda: (edit(nb), nb.save()), runs)
+    core.SETTINGS["durability"] = "batched"
+    core.SYNC_BATCH.flush()
+
+    # Réglage "compression": taille, réécriture complète et chargement du gros carnet
+    snapshot = nb.to_dict()
+    for compression in core.COMPRESSIONS:
+        path = os.path.join(core.DATA_DIR, f"bench-{compression}.json")
+        results[f"compression.{compression}.save"] = timed(
+            lambda: core.write_json_atomic(path, snapshot, compression), max(1, runs // 3))
+        results[f"compression.{compression}.load"] = timed(lambda: core.Notebook.load(path), max(1, runs // 3))
+        results[f"compression.{compression}.size"] = {"bytes": os.path.getsize(path)}
+    core.SETTINGS["journal"] = True
+
+    # Historique des pages: une version de plus pour une retouche de la grande page, taille après 200 versions
+    from foleskine.history import PageHistory
+    history = PageHistory(os.path.join(core.DATA_DIR, "bench-history"))
+    huge = core.Notebook.load(info["huge"]).data["pages"][0]
+    versions = iter(range(10 ** 9))
+
+    def retouch():
+        k = next(versions)
+        mid = len(huge) // 2
+        history.record("bench", {0: f"{huge[:mid]} retouche {k}.{huge[mid:]}"})
+
+    results["history.record.huge_page"] = timed(retouch, runs)
+
+    # Statistiques après une retouche de la grande page: seule la page modifiée est recomptée
+    stats_nb = core.Notebook.load(info["huge"])
+    stats_nb.stats
+
+    def restat():
+        stats_nb.set_page(0, f"{huge} retouche {next(versions)}")
+        stats_nb._update_stats()
+        stats_nb._mark_saved()
+
+    results["notebook.stats.huge_page"] = timed(restat, runs)
+    for _ in range(200):
+        retouch()
+    results["history.size.200"] = {"bytes": os.path.getsize(history.pack_path("bench"))}
+
+    fnb_path = os.path.join(lib_dir, "zz-gros-carnet.fnb")
+    core.Notebook.write_new(fnb_path, nb.to_dict()).close()
+    results["notebook.load.fnb"] = timed(lambda: core.Notebook.load(fnb_path).close(), runs)
+    fnb = core.Notebook.load(fnb_path)
+    results["notebook.save.fnb"] = timed(lambda: (edit(fnb), fnb.save()), runs)
+
+    n_nav = min(500, len(nb.data["pages"]))
+    results["page.navigation.json"] = timed(lambda: [nb.data["pages"][i] for i in range(n_nav)], runs)
+    fresh = core.Notebook.load(fnb_path)
+    results["page.navigation.fnb"] = timed(lambda: [fresh.data["pages"][i] for i in range(n_nav)], 1)
+    fresh.close()
+    fnb.close()
+
+    storage = core.FileStorage(lib_dir, core.LIBRARY)
+    data = nb.to_dict()
+    imported = []
+    results["import_notebook"] = timed(lambda: imported.append(storage.import_data(data, "import")), runs)
+    for path in imported:
+        os.remove(path)
+    # Index de recherche: reconstruction complète (pool de processus), puis requêtes sur l'index chaud
+    results["search.index.build"] = timed(lambda: storage.reindex(full=True).step(None), 1)
+    # Vérification de toute la bibliothèque (lecture seule), par lots dans un pool de processus
+    from foleskine.verify import LibraryCheck
+    results["verify.library"] = timed(lambda: LibraryCheck(lib_dir).step(None), 1)
+    # Synchronisation avec le serveur de référence sur localhost: envoi complet, puis une page modifiée
+    from foleskine import sync
+    server = sync.SyncServer(("127.0.0.1", 0), os.path.join(core.DATA_DIR, "bench-sync-server"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    summaries = []
+
+    def sync_once():
+        summaries.append(sync.LibrarySync(lib_dir, sync.SyncClient(server.url),
+                                          os.path.join(core.DATA_DIR, "bench-sync")).run())
+
+    results["sync.initial"] = timed(sync_once, 1)
+    sync_nb = core.Notebook.load(big)
+    results["sync.one_page_edit"] = timed(sync_once, runs, setup=lambda: (edit(sync_nb), sync_nb.save()))
+    results["sync.one_page_edit.bytes"] = {"bytes": summaries[-1]["bytes_sent"]}
+    sync_nb.close()
+    server.shutdown()
+    server.server_close()
+    results["search.files"] = timed(lambda: storage.search("rivière souvenir"), max(1, runs // 3))
+    results["search.files.phrase"] = timed(lambda: storage.search('"la rivière"'), max(1, runs // 3))
+    results["search.files.prefix"] = timed(lambda: storage.search("souv*"), max(1, runs // 3))
+    from foleskine.search import SEARCH
+    huge_path = info["huge"]
+    huge_disk = core.disk_state(huge_path)
+    results["search.index.update.huge_page"] = timed(
+        lambda: SEARCH.update(huge_path, {0: huge + f" retouche {next(counter)}"}, 1, huge_disk, huge_disk), runs)
+
+    from foleskine import transfer
+    zip_path = os.path.join(core.DATA_DIR, "bench-export.zip")
+    results["export_library.zip"] = timed(lambda: transfer.BulkExport(storage, zip_path).step(None), 1)
+    # Rendu Markdown dans le pool de processus, puis une page géante exportée en flux
+    md_zip_path = os.path.join(core.DATA_DIR, "bench-export.md.zip")
+    results["export_library.md.zip"] = timed(lambda: transfer.BulkExport(storage, md_zip_path, fmt="md").step(None), 1)
+    huge_nb = core.Notebook.load(info["huge"])
+    html_path = os.path.join(core.DATA_DIR, "bench-export.html")
+    results["export_notebook.html.huge_page"] = timed(lambda: transfer.export_notebook(huge_nb.data, html_path), runs)
+    huge_nb.close()
+    import_dir = os.path.join(core.DATA_DIR, "bench-import")
+
+    def bulk_import():
+        bulk = transfer.BulkImport(core.FileStorage(import_dir, core.LIBRARY), transfer.collect_sources([zip_path]))
+        while not bulk.step(None):
+            pass
+
+    results["import_library.zip"] = timed(bulk_import, 1, setup=lambda: shutil.rmtree(import_dir, ignore_errors=True))
+
+    db_path = os.path.join(core.DATA_DIR, "bench.sqlite3")
+    sqlite = core.SqliteStorage(db_path)
+    results["sqlite.migrate"] = timed(lambda: sqlite.migrate_from(lib_dir), 1)
+    key = sqlite.list_notebooks()[-1]["path"]
+    snb = sqlite.load(key)
+    results["notebook.save.sqlite"] = timed(lambda: (edit(snb), snb.save()), runs)
+    results["search.sqlite"] = timed(lambda: sqlite.search("rivière souvenir"), runs)
+    sqlite.close()
+    return results
+
+def bench_ui(info: dict, runs: int) -> dict:
+    names = ["ui.refresh_library", "ui.lib_paths", "ui.select_current_in_list", "ui.page_navigation", "ui.load_huge_page",
+             "ui.load_huge_page.full"]
+    try:
+        import tkinter as tk
+        probe = tk.Tk()
+        probe.destroy()
+    except Exception as e:  # pas d'affichage (CI, SSH…)
+        return {name: {"skipped": f"Tk indisponible: {e}"} for name in names}
+
+    import foleskine_notes
+    app = foleskine_notes.App()
+    app.withdraw()
+    try:
+        results = {"ui.refresh_library": timed(app.refresh_library, runs),
+                   "ui.lib_paths": timed(app.lib_paths, runs)}
+        app.open_notebook(info["big"])
+        results["ui.select_current_in_list"] = timed(app.select_current_in_list, runs)
+
+        def navigate():
+            for _ in range(20):
+                app.next_page()
+            for _ in range(20):
+                app.prev_page()
+            app.update_idletasks()
+        results["ui.page_navigation"] = timed(navigate, runs)
+        app.open_notebook(info["huge"])
+
+        # Premier écran seulement: la suite de la page est insérée depuis `after`
+        def load_huge():
+            app.current_page_index = 0
+            app.load_page()
+            app.update_idletasks()
+        results["ui.load_huge_page"] = timed(load_huge, max(1, runs // 3))
+
+        def load_huge_full():
+            load_huge()
+            app.finish_page_load()
+            app.update_idletasks()
+        results["ui.load_huge_page.full"] = timed(load_huge_full, max(1, runs // 3))
+    finally:
+        app.writer.stop()
+        app.destroy()
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        ref = baseline.get("results", {}).get(name)
+        if not ref or "median_ms" not in ref or "median_ms" not in current:
+            continue
+        limit = ref["median_ms"] * tolerance + ABSOLUTE_SLACK_MS
+        if current["median_ms"] > limit:
+            regressions.append(f"{name}: {current['median_ms']:.2f} ms > {limit:.2f} ms "
+                               f"(référence {ref['median_ms']:.2f} ms × {tolerance})")
+    return regressions
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Banc d'essai FoleskineNotes")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--notebooks", type=int, help="remplace la valeur du profil")
+    parser.add_argument("--pages", type=int, help="pages par carnet (remplace le profil)")
+    parser.add_argument("--page-size", type=int, help="caractères par page (remplace le profil)")
+    parser.add_argument("--big-pages", type=int, help="pages du gros carnet (remplace le profil)")
+    parser.add_argument("--huge-page-mb", type=float, help="taille de la page géante (remplace le profil)")
+    parser.add_argument("--runs", type=int, default=9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-ui", action="store_true", help="ne pas mesurer l'interface Tk")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=1.3)
+    parser.add_argument("--keep", action="store_true", help="conserver la bibliothèque générée")
+    args = parser.parse_args(argv)
+
+    params = dict(PROFILES[args.profile])
+    for key in params:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+
+    tmp = tempfile.mkdtemp(prefix="foleskine-bench-")
+    os.environ["FOLESKINE_DATA_DIR"] = tmp
+    try:
+        import foleskine.core as core
+        t0 = time.perf_counter()
+        info = synth.generate_library(core.LIB_DIR, seed=args.seed, **params)
+        print(f"Bibliothèque générée en {time.perf_counter() - t0:.1f} s dans {tmp}", file=sys.stderr)
+
+        results = bench_core(core, info, args.runs)
+        if not args.no_ui:
+            results.update(bench_ui(info, args.runs))
+        timings = [import_time.measure_once(os.path.join(tmp, "import-probe")) for _ in range(args.runs)]
+        results["import.foleskine"] = {
+            "runs": len(timings), "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3), "max_ms": round(max(timings), 3),
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "profile": args.profile,
+            "params": params,
+            "runs": args.runs,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    for name, r in results.items():
+        if "median_ms" in r:
+            print(f"{name:32s} médiane {r['median_ms']:10.2f} ms   max {r['max_ms']:10.2f} ms")
+        elif "bytes" in r:
+            print(f"{name:32s} {r['bytes']:18,d} octets")
+        else:
+            print(f"{name:32s} {r.get('skipped', '')}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"RÉGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Génération de bibliothèques synthétiques pour les bancs d'essai.
+
+Le contenu est déterministe (graine fixe) et écrit directement au format
+JSON de l'application, sans passer par `Notebook`, pour que la génération
+ne fausse pas les mesures.
+"""
+import datetime
+import json
+import os
+import random
+
+WORDS = (
+    "le la les un une des carnet page encre papier plume matin soir café été hiver "
+    "lumière fenêtre jardin rivière mémoire voyage lettre silence nuit étoile chemin "
+    "écrire relire effacer souvenir automne printemps fleur orage brume éclat"
+).split()
+
+def make_text(rng: random.Random, size: int) -> str:
+    """Texte pseudo-français d'environ `size` caractères."""
+    if size <= 0:
+        return ""
+    # Au-delà de 64 Ko, on répète un bloc: la génération reste rapide pour des pages de plusieurs Mo
+    block_size = min(size, 64 * 1024)
+    parts, n = [], 0
+    while n < block_size:
+        word = rng.choice(WORDS)
+        parts.append(word)
+        n += len(word) + 1
+        if rng.random() < 0.08:
+            parts.append("\n")
+    block = " ".join(parts)[:block_size]
+    return (block * (size // len(block) + 1))[:size]
+
+def write_notebook(path: str, title: str, pages: list[str]):
+    ts = datetime.datetime(2025, 8, 26, 12, 0, 0).isoformat(timespec="seconds")
+    data = {"title": title, "created_at": ts, "updated_at": ts, "pages": pages}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def generate_library(lib_dir: str, notebooks: int, pages: int, page_size: int,
+                     big_pages: int = 0, huge_page_mb: float = 0, seed: int = 0) -> dict:
+    """Crée `notebooks` carnets de `pages` pages dans `lib_dir`.
+
+    En plus: un carnet de `big_pages` pages ("big") et un carnet dont une
+    page fait `huge_page_mb` Mo ("huge"). Retourne les chemins de ces deux
+    carnets et un échantillon de carnets ordinaires.
+    """
+    rng = random.Random(seed)
+    os.makedirs(lib_dir, exist_ok=True)
+    sample_pages = [make_text(rng, page_size) for _ in range(min(pages, 32) or 1)]
+    paths = []
+    for i in range(notebooks):
+        path = os.path.join(lib_dir, f"carnet-{i:05d}.json")
+        write_notebook(path, f"Carnet {i}", [sample_pages[(i + j) % len(sample_pages)] for j in range(pages)])
+        paths.append(path)
+    info = {"notebooks": paths[:10]}
+    if big_pages:
+        info["big"] = os.path.join(lib_dir, "zz-gros-carnet.json")
+        write_notebook(info["big"], "Gros carnet",
+                       [sample_pages[j % len(sample_pages)] for j in range(big_pages)])
+    if huge_page_mb:
+        info["huge"] = os.path.join(lib_dir, "zz-page-geante.json")
+        write_notebook(info["huge"], "Page géante", [make_text(rng, int(huge_page_mb * 1024 * 1024)), "fin"])
+    return info
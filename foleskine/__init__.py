@@ -0,0 +1,37 @@
+"""FoleskineNotes sans interface graphique: modèle de carnet et stockage.
+
+    >>> from foleskine import open_storage
+    >>> storage = open_storage()
+    >>> [entry["title"] for entry in storage.list_notebooks()]
+
+L'interface Tk reste dans `foleskine_notes.py`; ce paquet ne l'importe pas.
+"""
+from .core import (
+    APP_NAME,
+    DATA_DIR,
+    LIB_DIR,
+    LIBRARY,
+    SETTINGS,
+    FileStorage,
+    LibraryIndex,
+    Notebook,
+    SaveWorker,
+    SqliteStorage,
+    open_storage,
+    slugify,
+)
+
+__all__ = [
+    "APP_NAME",
+    "DATA_DIR",
+    "LIB_DIR",
+    "LIBRARY",
+    "SETTINGS",
+    "FileStorage",
+    "LibraryIndex",
+    "Notebook",
+    "SaveWorker",
+    "SqliteStorage",
+    "open_storage",
+    "slugify",
+]
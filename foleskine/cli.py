@@ -0,0 +1,293 @@
+"""Ligne de commande: python -m foleskine <commande> ...
+
+    list                       liste les carnets
+    cat CARNET [-p N]          affiche un carnet (ou sa page N)
+    append CARNET [TEXTE]      ajoute une page (texte lu sur stdin si absent)
+    export CARNET FICHIER      exporte en JSON, Markdown, HTML ou texte (d'après l'extension: .json, .md, .html, .txt)
+    import CHEMIN... [-j N]    importe des carnets JSON (fichiers, dossiers, .zip)
+    export-all ARCHIVE [--format F] [-j N]
+                               exporte toute la bibliothèque dans un .zip (JSON par défaut, .md.zip: Markdown…)
+    search REQUÊTE             recherche dans tous les carnets (mots, "expression", préfixe*)
+    reindex [-j N]             reconstruit l'index de recherche
+    verify [--normalize | --minify] [--repair] [--report FICHIER] [-j N]
+                               vérifie les carnets (schéma, doublons), les normalise ou les répare
+    sync [URL]                 synchronise la bibliothèque avec un serveur (réglage "sync_url" par défaut)
+    sync-server [--host H] [--port P] [--dir DOSSIER]
+                               lance le serveur de synchronisation de référence
+    history CARNET -p N [-s K] [--restore K]
+                               versions de la page N (affiche ou restaure la K-ième)
+    gui                        lance l'interface graphique
+
+Un CARNET se désigne par son chemin (ou sa clé), son nom de fichier sans
+extension ou son titre.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from .core import SETTINGS, FileStorage, open_storage
+from .transfer import EXPORT_FORMATS, BulkExport, BulkImport, collect_sources, export_notebook, library_export_format
+
+def find_notebook(storage, ref: str) -> dict:
+    entries = storage.list_notebooks()
+    for match in (
+        lambda e: e["path"] == ref,
+        lambda e: os.path.splitext(os.path.basename(e["path"]))[0] == ref,
+        lambda e: e["title"].casefold() == ref.casefold(),
+    ):
+        found = [e for e in entries if match(e)]
+        if len(found) == 1:
+            return found[0]
+        if len(found) > 1:
+            raise LookupError(f"plusieurs carnets correspondent à '{ref}'")
+    raise LookupError(f"aucun carnet ne correspond à '{ref}'")
+
+def cmd_list(storage, args):
+    for entry in storage.list_notebooks():
+        print(f"{entry['title']}\t{entry['pages']} p.\t{entry.get('words', 0)} mots\t{entry['path']}")
+
+def cmd_cat(storage, args):
+    nb = storage.load(find_notebook(storage, args.notebook)["path"])
+    try:
+        pages = nb.data["pages"]
+        if args.page is not None:
+            if not 1 <= args.page <= len(pages):
+                raise LookupError(f"page {args.page} hors limites (1..{len(pages)})")
+            sys.stdout.write(pages[args.page - 1] + "\n")
+            return
+        for i, text in enumerate(pages):
+            if i:
+                sys.stdout.write("\n")
+            sys.stdout.write(f"--- Page {i + 1} ---\n{text}\n")
+    finally:
+        nb.close()
+
+def cmd_append(storage, args):
+    text = args.text if args.text is not None else sys.stdin.read()
+    nb = storage.load(find_notebook(storage, args.notebook)["path"])
+    try:
+        pages = nb.data["pages"]
+        if len(pages) == 1 and pages[0] == "":
+            nb.set_page(0, text)
+        else:
+            nb.append_page(text)
+        nb.save()
+        print(f"Page {len(pages)} ajoutée à '{nb.title}'")
+    finally:
+        nb.close()
+
+def cmd_export(storage, args):
+    nb = storage.load(find_notebook(storage, args.notebook)["path"])
+    try:
+        export_notebook(dict(nb.data, title=nb.title), args.output, args.format)
+    finally:
+        nb.close()
+
+def cmd_import(storage, args):
+    bulk = BulkImport(storage, collect_sources(args.files), workers=args.jobs)
+    while not bulk.step(None):
+        pass
+    for label, dest in bulk.imported:
+        print(f"{label} -> {dest}")
+    for label, error in bulk.errors:
+        print(f"foleskine: {label}: {error}", file=sys.stderr)
+    if bulk.errors:
+        raise ValueError(f"{len(bulk.errors)} fichier(s) non importé(s) sur {bulk.total}")
+
+def cmd_export_all(storage, args):
+    bulk = BulkExport(storage, args.output, fmt=args.format or library_export_format(args.output), workers=args.jobs)
+    bulk.step(None)
+    for path, error in bulk.errors:
+        print(f"foleskine: {path}: {error}", file=sys.stderr)
+    print(f"{bulk.total - len(bulk.errors)} carnet(s) exporté(s) dans {args.output}")
+
+def cmd_search(storage, args):
+    for hit in storage.search(args.query, limit=args.limit):
+        print(f"{hit['title']}\tp.{hit['page'] + 1}\t{hit['snippet']}")
+
+def cmd_reindex(storage, args):
+    build = storage.reindex(full=True, workers=args.jobs)
+    if build is None:
+        print("Index de recherche reconstruit")
+        return
+    build.step(None)
+    for path, error in build.errors:
+        print(f"foleskine: {path}: {error}", file=sys.stderr)
+    print(f"{build.total} carnet(s) indexé(s)")
+
+VERIFY_ACTIONS = {"normalized": "normalisé", "minified": "minifié", "repaired": "réparé"}
+
+def cmd_verify(storage, args):
+    from .verify import LibraryCheck
+    if not isinstance(storage, FileStorage):
+        raise ValueError("verify ne s'applique qu'au stockage en fichiers (réglage \"storage\": \"files\")")
+    check = LibraryCheck(storage.lib_dir, args.mode, repair=args.repair, workers=args.jobs)
+    check.step(None)
+    report = check.report()
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for r in report["notebooks"]:
+        for problem in r["errors"]:
+            print(f"{r['path']}: erreur: {problem}", file=sys.stderr)
+        for problem in r["warnings"]:
+            print(f"{r['path']}: {problem}")
+        if r["action"]:
+            print(f"{r['path']}: {VERIFY_ACTIONS[r['action']]}")
+    for paths in report["duplicate_titles"]:
+        print(f"titre en double: {', '.join(paths)}")
+    for collision in report["slug_collisions"]:
+        print(f"même nom de fichier ({collision['slug']}): {', '.join(collision['paths'])}")
+    summary = report["summary"]
+    print(f"{summary['notebooks']} carnet(s) vérifié(s) en {summary['seconds']:.2f} s: "
+          f"{summary['ok']} sans problème, {summary['warnings']} avec avertissements, {summary['errors']} en erreur, "
+          f"{summary['normalized']} normalisé(s), {summary['repaired']} réparé(s)")
+    if summary["errors"]:
+        raise ValueError(f"{summary['errors']} carnet(s) illisible(s)" + ("" if args.repair else " (essayer --repair)"))
+
+def cmd_sync(storage, args):
+    from .sync import LibrarySync, SyncClient, summary_text
+    if not isinstance(storage, FileStorage):
+        raise ValueError("sync ne s'applique qu'au stockage en fichiers (réglage \"storage\": \"files\")")
+    url = args.url or SETTINGS["sync_url"]
+    if not url:
+        raise ValueError("aucun serveur: donner son adresse ou le réglage \"sync_url\"")
+    summary = LibrarySync(storage.lib_dir, SyncClient(url)).run()
+    for key, error in summary["errors"]:
+        print(f"{key}: {error}", file=sys.stderr)
+    print(f"{summary_text(summary)} ({summary['seconds']:.2f} s)")
+    if summary["errors"]:
+        raise ValueError(f"{len(summary['errors'])} carnet(s) non synchronisé(s)")
+
+def cmd_sync_server(storage, args):
+    from .sync import DEFAULT_PORT, SERVER_DIR, SyncServer
+    root = args.dir or SERVER_DIR
+    server = SyncServer((args.host, args.port or DEFAULT_PORT), root, verbose=args.verbose)
+    print(f"Serveur de synchronisation sur {server.url} (données dans {root})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def cmd_history(storage, args):
+    from .history import HISTORY
+    nb = storage.load(find_notebook(storage, args.notebook)["path"])
+    try:
+        page = args.page - 1
+        if not 0 <= page < len(nb.data["pages"]):
+            raise LookupError(f"page {args.page} hors du carnet ({len(nb.data['pages'])} pages)")
+        versions = HISTORY.versions(nb.path, page)
+        chosen = args.show if args.show is not None else args.restore
+        if chosen is None:
+            for k, v in enumerate(versions, 1):
+                date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v["t"]))
+                print(f"{k}\t{date}\t{'delta' if v['delta'] else 'complet'}")
+            return
+        if not 1 <= chosen <= len(versions):
+            raise LookupError(f"version {chosen} inconnue ({len(versions)} versions)")
+        text = HISTORY.text(nb.path, versions[chosen - 1]["h"])
+        if args.show is not None:
+            sys.stdout.write(text + "\n")
+            return
+        nb.set_page(page, text)
+        nb.save()
+        print(f"Page {args.page} de '{nb.title}' restaurée")
+    finally:
+        nb.close()
+
+def cmd_gui(storage, args):
+    # Import différé: tkinter n'est chargé que pour l'interface
+    from foleskine_notes import main as gui_main
+    gui_main()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="foleskine", description="Carnets FoleskineNotes en ligne de commande")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="liste les carnets").set_defaults(func=cmd_list)
+
+    p = sub.add_parser("cat", help="affiche un carnet")
+    p.add_argument("notebook")
+    p.add_argument("-p", "--page", type=int, help="numéro de page (à partir de 1)")
+    p.set_defaults(func=cmd_cat)
+
+    p = sub.add_parser("append", help="ajoute une page à un carnet")
+    p.add_argument("notebook")
+    p.add_argument("text", nargs="?", help="texte de la page (stdin si absent)")
+    p.set_defaults(func=cmd_append)
+
+    p = sub.add_parser("export", help="exporte un carnet en JSON, Markdown, HTML ou texte")
+    p.add_argument("notebook")
+    p.add_argument("output")
+    p.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="format (d'après l'extension par défaut)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="importe des carnets JSON (fichiers, dossiers ou archives .zip)")
+    p.add_argument("files", nargs="+")
+    p.add_argument("-j", "--jobs", type=int, help="nombre de processus (1: sans pool)")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export-all", help="exporte toute la bibliothèque dans une archive .zip")
+    p.add_argument("output")
+    p.add_argument("--format", choices=sorted(EXPORT_FORMATS),
+                   help="format des carnets (JSON par défaut, ou d'après le nom: bibliotheque.md.zip)")
+    p.add_argument("-j", "--jobs", type=int, help="nombre de processus (1: sans pool)")
+    p.set_defaults(func=cmd_export_all)
+
+    p = sub.add_parser("search", help="recherche dans tous les carnets")
+    p.add_argument("query")
+    p.add_argument("-n", "--limit", type=int, default=50)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("reindex", help="reconstruit l'index de recherche")
+    p.add_argument("-j", "--jobs", type=int, help="nombre de processus (1: sans pool)")
+    p.set_defaults(func=cmd_reindex)
+
+    p = sub.add_parser("verify", help="vérifie, normalise ou répare les carnets de la bibliothèque")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--normalize", dest="mode", action="store_const", const="normalize", default="check",
+                       help="réécrit les carnets sous leur forme canonique")
+    group.add_argument("--minify", dest="mode", action="store_const", const="minify",
+                       help="comme --normalize, en JSON compact")
+    p.add_argument("--repair", action="store_true", help="récupère les pages des fichiers tronqués ou corrompus")
+    p.add_argument("--report", metavar="FICHIER", help="écrit le rapport JSON dans FICHIER")
+    p.add_argument("-j", "--jobs", type=int, help="nombre de processus (1: sans pool)")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("sync", help="synchronise la bibliothèque avec un serveur")
+    p.add_argument("url", nargs="?", help="adresse du serveur (réglage \"sync_url\" par défaut)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("sync-server", help="lance le serveur de synchronisation de référence")
+    p.add_argument("--host", default="127.0.0.1", help="adresse d'écoute (127.0.0.1 par défaut)")
+    p.add_argument("--port", type=int, help="port d'écoute (8765 par défaut)")
+    p.add_argument("--dir", help="dossier des données du serveur (DATA_DIR/sync-server par défaut)")
+    p.add_argument("-v", "--verbose", action="store_true", help="journalise chaque requête")
+    p.set_defaults(func=cmd_sync_server)
+
+    p = sub.add_parser("history", help="versions enregistrées d'une page")
+    p.add_argument("notebook")
+    p.add_argument("-p", "--page", type=int, required=True, help="numéro de page (à partir de 1)")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("-s", "--show", type=int, metavar="K", help="affiche la version K (1: la plus récente)")
+    group.add_argument("--restore", type=int, metavar="K", help="restaure la version K dans la page")
+    p.set_defaults(func=cmd_history)
+
+    sub.add_parser("gui", help="lance l'interface graphique").set_defaults(func=cmd_gui)
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    storage = open_storage()
+    try:
+        args.func(storage, args)
+    except (LookupError, OSError, ValueError) as e:
+        print(f"foleskine: {e}", file=sys.stderr)
+        return 1
+    finally:
+        storage.close()
+    return 0
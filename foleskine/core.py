@@ -0,0 +1,1921 @@
+"""Cœur de FoleskineNotes, utilisable sans interface graphique.
+
+Modèle de carnet, formats de stockage (JSON, journal, conteneur .fnb,
+SQLite), index de la bibliothèque et thread d'écriture. L'import de ce
+module n'a aucun effet de bord: aucun dossier n'est créé et les réglages
+ne sont lus qu'au premier accès.
+"""
+import json
+import os
+import sys
+import re
+import datetime
+import mmap
+import queue
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, UserDict
+from collections.abc import MutableSequence
+from operator import itemgetter
+
+from . import diagnostics
+from .diagnostics import timed
+
+APP_NAME = "FoleskineNotes"
+
+# ---------------------- Utilitaires chemins & fichiers ----------------------
+def get_data_dir():
+    """Retourne un dossier de données par-OS, ex:
+    - Windows: %APPDATA%/FoleskineNotes
+    - macOS: ~/Library/Application Support/FoleskineNotes
+    - Linux: ~/.local/share/FoleskineNotes
+    La variable d'environnement FOLESKINE_DATA_DIR a priorité (scripts, bancs d'essai).
+    """
+    override = os.environ.get("FOLESKINE_DATA_DIR")
+    if override:
+        return os.path.abspath(override)
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        base = os.environ.get("APPDATA", os.path.join(home, "AppData", "Roaming"))
+        return os.path.join(base, APP_NAME)
+    elif sys.platform == "darwin":
+        return os.path.join(home, "Library", "Application Support", APP_NAME)
+    else:
+        # linux / autres UNIX
+        return os.path.join(home, ".local", "share", APP_NAME)
+
+DATA_DIR = get_data_dir()
+LIB_DIR = os.path.join(DATA_DIR, "notebooks")
+# Manifeste de la bibliothèque, stocké à côté de LIB_DIR
+INDEX_PATH = os.path.join(DATA_DIR, "library_index.json")
+SETTINGS_PATH = os.path.join(DATA_DIR, "settings.json")
+DB_PATH = os.path.join(DATA_DIR, "library.sqlite3")
+SESSION_PATH = os.path.join(DATA_DIR, "session.json")
+
+# ---------------------- Réglages ----------------------
+DEFAULT_SETTINGS = {
+    # Sauvegarde journalisée: chaque autosave ajoute les pages modifiées à
+    # <carnet>.json.journal au lieu de réécrire tout le carnet.
+    "journal": True,
+    # Taille du journal au-delà de laquelle il est recompacté dans le JSON.
+    "journal_max_bytes": 1024 * 1024,
+    # Format des nouveaux carnets: "json" ou "fnb" (conteneur indexé, pages lues à la demande).
+    "format": "json",
+    # Compression des carnets JSON: "none" (JSON indenté), "gzip" ou "lzma" (JSON compact
+    # compressé). Reconnue à la lecture: un carnet est converti à sa prochaine réécriture.
+    "compression": "none",
+    # Durabilité des écritures (voir sync_file): "paranoid", "batched" ou "fast", et la
+    # fenêtre pendant laquelle le mode "batched" regroupe les fsync.
+    "durability": "batched",
+    "durability_window_ms": 1000,
+    # Stockage de la bibliothèque: "files" (LIB_DIR) ou "sqlite" (DB_PATH, recherche FTS5).
+    # Au premier passage en "sqlite", les carnets de LIB_DIR sont importés une fois.
+    "storage": "files",
+    # Historique des versions de pages (voir foleskine.history), et sa taille maximale par carnet.
+    "history": True,
+    "history_max_bytes": 4 * 1024 * 1024,
+    # Carnets quittés gardés en mémoire pour y revenir sans relire le disque (texte des pages, en caractères).
+    "notebook_cache_bytes": 64 * 1024 * 1024,
+    # Synchronisation (voir foleskine.sync): adresse du serveur ("" : désactivée) et intervalle des
+    # synchronisations automatiques de l'interface, en secondes (0: seulement à la demande).
+    "sync_url": "",
+    "sync_interval_s": 300,
+}
+
+def load_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
+            user = json.load(f)
+    except (OSError, ValueError):
+        return settings
+    if isinstance(user, dict):
+        settings.update({k: v for k, v in user.items() if k in DEFAULT_SETTINGS})
+    return settings
+
+class Settings(UserDict):
+    """Réglages, lus depuis SETTINGS_PATH au premier accès seulement."""
+
+    def __init__(self):
+        self._data = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = load_settings()
+        return self._data
+
+SETTINGS = Settings()
+
+# ---------------------- Session ----------------------
+# État de l'interface à la dernière fermeture (écrit aussi périodiquement), relu
+# en tout premier au lancement pour rouvrir la page où l'on s'était arrêté:
+# {"notebook": "<clé du carnet>", "page": 3, "cursor": "12.4", "top": "9.0",
+#  "fullscreen": false, "geometry": "1000x650+80+40"}
+
+def load_session() -> dict:
+    try:
+        with open(SESSION_PATH, "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return session if isinstance(session, dict) else {}
+
+def save_session(session: dict):
+    """Écrit l'état de la session (fichier temporaire renommé, sans fsync: ce n'est qu'un confort)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp = SESSION_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(session, f, ensure_ascii=False)
+    os.replace(tmp, SESSION_PATH)
+
+# ---------------------- Conteneur indexé (.fnb) ----------------------
+# Format binaire alternatif, lu via mmap page par page:
+#   en-tête  : magic, version, nb de pages, capacité de la table, capacité des
+#              métadonnées, offset de la table, offset et longueur des métadonnées
+#   table    : une entrée (offset, longueur, capacité) par page
+#   blobs    : métadonnées JSON (tout sauf "pages") et pages en UTF-8
+# Une page réécrite reprend son emplacement si elle y tient, sinon elle est
+# ajoutée en fin de fichier avec un peu de marge pour les frappes suivantes.
+CONTAINER_EXT = ".fnb"
+NOTEBOOK_EXTS = (".json", CONTAINER_EXT)
+
+def is_notebook_file(name: str) -> bool:
+    return name.lower().endswith(NOTEBOOK_EXTS)
+
+def count_written(n: int):
+    """Octets écrits par une sauvegarde (mesure "save.bytes" des diagnostics)."""
+    if diagnostics.ENABLED:
+        diagnostics.record("save.bytes", n)
+
+# ---------------------- Durabilité ----------------------
+# Les fichiers complets sont toujours écrits dans un fichier temporaire puis
+# renommés (os.replace): un arrêt du programme laisse l'ancienne ou la
+# nouvelle version. Le réglage "durability" décide de ce qui survit à une
+# coupure de courant:
+#   "paranoid": fsync du fichier avant de le rendre visible et de son dossier
+#               après; les pages d'un .fnb ne sont jamais réécrites en place.
+#   "batched" : fsync avant os.replace des réécritures complètes (rares); les
+#               ajouts au journal, les pages .fnb et les dossiers sont
+#               synchronisés en groupe, au plus "durability_window_ms" après.
+#   "fast"    : aucun fsync, le système écrit quand il veut.
+DURABILITY_MODES = ("paranoid", "batched", "fast")
+
+def durability_mode() -> str:
+    value = SETTINGS["durability"]
+    return value if value in DURABILITY_MODES else "batched"
+
+@timed("fsync")
+def _fsync(fd: int):
+    os.fsync(fd)
+
+def _fsync_path(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Fichier disparu entre-temps
+        return
+    try:
+        _fsync(fd)
+    finally:
+        os.close(fd)
+
+class SyncBatch:
+    """fsync différés du mode "batched": un seul passage par fenêtre de temps, sur un thread minuteur."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths: set[str] = set()
+        self._timer: threading.Timer | None = None
+
+    def add(self, path: str):
+        with self._lock:
+            self._paths.add(path)
+            if self._timer is None:
+                self._timer = threading.Timer(SETTINGS["durability_window_ms"] / 1000, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Synchronise tout ce qui est en attente (appelé aussi à la fermeture du stockage)."""
+        with self._lock:
+            paths, self._paths = self._paths, set()
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        # Fichiers avant leur dossier (chemin plus long d'abord)
+        for path in sorted(paths, key=len, reverse=True):
+            _fsync_path(path)
+
+SYNC_BATCH = SyncBatch()
+
+def sync_file(f, batch: bool = False):
+    """Rend durable ce qui vient d'être écrit dans le fichier ouvert `f`, selon le réglage "durability".
+
+    `batch`: en mode "batched", l'écriture peut attendre le prochain passage groupé.
+    """
+    mode = durability_mode()
+    if mode == "fast":
+        return
+    f.flush()
+    if mode == "batched" and batch:
+        SYNC_BATCH.add(os.path.abspath(f.name))
+    else:
+        _fsync(f.fileno())
+
+def sync_dir(path: str):
+    """Rend durable la création ou le renommage de `path` (fsync de son dossier, sauf sous Windows)."""
+    mode = durability_mode()
+    if mode == "fast" or sys.platform.startswith("win"):
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode == "batched":
+        SYNC_BATCH.add(directory)
+    else:
+        _fsync_path(directory)
+
+def record_write_latency(t0: float):
+    """Durée d'une écriture de carnet dans la mesure "save.write.<mode de durabilité>"."""
+    if diagnostics.ENABLED:
+        diagnostics.record(f"save.write.{durability_mode()}", (time.perf_counter() - t0) * 1000)
+
+def durable_replace(tmp: str, path: str):
+    """os.replace d'un fichier temporaire déjà synchronisé (sync_file), puis de son dossier."""
+    os.replace(tmp, path)
+    sync_dir(path)
+
+class NotebookContainer:
+    MAGIC = b"FOLESKNB"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIIIQQQ")
+    ENTRY = struct.Struct("<QII")
+    MIN_SLOT = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "r+b")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self.table_cap, self.meta_cap,
+         self.table_off, self.meta_off, meta_len) = self.HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError(f"{path}: conteneur de carnet invalide")
+        self.meta_len = meta_len
+        self.meta = json.loads(self._mm[self.meta_off:self.meta_off + meta_len].decode("utf-8"))
+
+    @classmethod
+    def _slot_size(cls, n: int) -> int:
+        return max(cls.MIN_SLOT, n + n // 4)
+
+    @classmethod
+    def create(cls, path: str, meta: dict, pages: list[str]) -> "NotebookContainer":
+        """Écrit un conteneur complet (fichier temporaire puis os.replace)."""
+        blobs = [p.encode("utf-8") for p in pages]
+        meta_blob = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        table_cap = max(16, len(blobs) * 2)
+        meta_cap = cls._slot_size(len(meta_blob))
+        table_off = cls.HEADER.size
+        meta_off = table_off + table_cap * cls.ENTRY.size
+        table = bytearray(table_cap * cls.ENTRY.size)
+        off = meta_off + meta_cap
+        for i, blob in enumerate(blobs):
+            cls.ENTRY.pack_into(table, i * cls.ENTRY.size, off, len(blob), len(blob))
+            off += len(blob)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(blobs), table_cap, meta_cap,
+                                    table_off, meta_off, len(meta_blob)))
+            f.write(table)
+            f.write(meta_blob.ljust(meta_cap, b"\0"))
+            for blob in blobs:
+                f.write(blob)
+            count_written(f.tell())
+            sync_file(f)
+        durable_replace(tmp, path)
+        return cls(path)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def read_table(self) -> list[list[int]]:
+        size = self.ENTRY.size
+        return [list(self.ENTRY.unpack_from(self._mm, self.table_off + i * size)) for i in range(self.count)]
+
+    def read_page(self, slot: list[int]) -> str:
+        off, length, _cap = slot
+        return self._mm[off:off + length].decode("utf-8")
+
+    def file_size(self) -> int:
+        return len(self._mm)
+
+    def wasted_bytes(self, slots: list[list[int]]) -> int:
+        live = (self.HEADER.size + self.table_cap * self.ENTRY.size + self.meta_cap
+                + sum(cap for _off, _len, cap in slots))
+        return max(0, self.file_size() - live)
+
+    def _append(self, blob: bytes, cap: int) -> int:
+        off = self._f.seek(0, os.SEEK_END)
+        self._f.write(blob.ljust(cap, b"\0"))
+        return off
+
+    def write(self, data: dict, pages: "LazyPages"):
+        """Écrit les pages modifiées, les métadonnées, puis la table et l'en-tête.
+
+        En mode "paranoid", pages et métadonnées vont toujours dans un nouvel
+        emplacement et sont synchronisées avant la table et l'en-tête: une
+        coupure laisse chaque page dans son ancienne ou sa nouvelle version.
+        """
+        f = self._f
+        size_before = self.file_size()
+        paranoid = durability_mode() == "paranoid"
+        written = 0
+        for i in sorted(pages.dirty):
+            blob = pages.raw(i).encode("utf-8")
+            written += len(blob)
+            slot = pages.slots[i]
+            if slot is not None and len(blob) <= slot[2] and not paranoid:
+                f.seek(slot[0])
+                f.write(blob)
+                slot[1] = len(blob)
+            else:
+                cap = self._slot_size(len(blob))
+                pages.slots[i] = [self._append(blob, cap), len(blob), cap]
+        meta_blob = json.dumps({k: v for k, v in data.items() if k != "pages"},
+                               ensure_ascii=False).encode("utf-8")
+        if len(meta_blob) <= self.meta_cap and not paranoid:
+            f.seek(self.meta_off)
+            f.write(meta_blob)
+        else:
+            self.meta_cap = self._slot_size(len(meta_blob))
+            self.meta_off = self._append(meta_blob, self.meta_cap)
+        self.meta_len = len(meta_blob)
+        # Table: entrées modifiées en place, ou table entière si la structure a changé
+        size = self.ENTRY.size
+        if len(pages.slots) > self.table_cap:
+            self.table_cap = len(pages.slots) * 2
+            self.table_off = self._append(b"", self.table_cap * size)
+            rows = range(len(pages.slots))
+        elif pages.resized:
+            rows = range(len(pages.slots))
+        else:
+            rows = sorted(pages.dirty)
+        if paranoid:
+            # Nouveaux emplacements sur disque avant que la table ne les désigne
+            sync_file(f)
+        for i in rows:
+            f.seek(self.table_off + i * size)
+            f.write(self.ENTRY.pack(*pages.slots[i]))
+        self.count = len(pages.slots)
+        count_written(written + len(meta_blob) + len(rows) * size + self.HEADER.size)
+        f.seek(0)
+        f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.count, self.table_cap, self.meta_cap,
+                                 self.table_off, self.meta_off, self.meta_len))
+        f.flush()
+        sync_file(f, batch=True)
+        if f.seek(0, os.SEEK_END) != size_before:
+            # Le fichier a grandi: remapper pour voir la nouvelle fin
+            self._mm.close()
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        pages.mark_saved()
+
+class LazyPages(MutableSequence):
+    """Liste de pages lues à la demande: une page n'est décodée que lorsqu'on la lit.
+
+    `slots` contient la référence de stockage de chaque page (entrée de table
+    d'un conteneur, rowid SQLite…) ou None pour une page pas encore écrite.
+    Le stockage consulte `dirty`, `resized` et `removed` pour n'écrire que
+    ce qui a changé.
+    """
+
+    def __init__(self, slots: list, read, items: list[str] | None = None):
+        self.slots: list = slots
+        self._read = read
+        self._items: list[str | None] = list(items) if items is not None else [None] * len(slots)
+        self.dirty: set[int] = set()
+        self.resized = False
+        self.removed: list = []
+
+    @classmethod
+    def from_container(cls, container: NotebookContainer, items: list[str] | None = None):
+        return cls(container.read_table(), container.read_page, items)
+
+    def raw(self, i: int) -> str:
+        item = self._items[i]
+        if item is None:
+            item = self._items[i] = self._read(self.slots[i])
+        return item
+
+    def stream(self):
+        """Parcourt les pages sans garder décodées celles qui ne l'étaient pas (export en flux)."""
+        for slot, item in zip(self.slots, self._items):
+            yield item if item is not None else self._read(slot)
+
+    def mark_saved(self):
+        self.dirty.clear()
+        self.resized = False
+        self.removed.clear()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.raw(j) for j in range(*i.indices(len(self)))]
+        return self.raw(range(len(self))[i])
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            raise TypeError("affectation par tranche non supportée")
+        i = range(len(self))[i]
+        self._items[i] = value
+        self.dirty.add(i)
+
+    def __delitem__(self, i):
+        idx = range(len(self))[i]
+        indices = [idx] if isinstance(idx, int) else sorted(idx, reverse=True)
+        for j in indices:
+            if self.slots[j] is not None:
+                self.removed.append(self.slots[j])
+            del self.slots[j]
+            del self._items[j]
+        # Les indices suivants ont glissé: la table entière sera réécrite
+        self.dirty = {d - sum(1 for j in indices if j < d) for d in self.dirty if d not in indices}
+        self.resized = True
+
+    def insert(self, i, value):
+        n = len(self)
+        i = min(max(n + i, 0) if i < 0 else i, n)
+        self.slots.insert(i, None)
+        self._items.insert(i, value)
+        self.dirty = {d + 1 if d >= i else d for d in self.dirty}
+        self.dirty.add(i)
+        self.resized = True
+
+# ---------------------- Modèle de données ----------------------
+# Format d'un carnet (JSON):
+# {
+#   "title": "Mon carnet",
+#   "created_at": "2025-08-26T12:00:00",
+#   "updated_at": "2025-08-26T12:34:56",
+#   "stats": {"pages": 2, "words": 5, "chars": 26},
+#   "pages": ["texte page 1", "texte page 2", ...]
+# }
+# "stats" (voir notebook_stats) est tenu à jour à chaque sauvegarde à partir des
+# seules pages modifiées; absent des carnets plus anciens, il est alors recalculé.
+
+# Journal d'édition (JSON lines, un enregistrement par sauvegarde), à côté du carnet:
+# {"updated_at": "...", "stats": {...}, "count": 12, "title": "...", "pages": {"3": "texte"}}
+# "count" et "title" ne sont présents que s'ils ont changé.
+JOURNAL_SUFFIX = ".journal"
+
+def slugify(name: str) -> str:
+    s = re.sub(r"[^a-zA-Z0-9_-]+", "-", name.strip()).strip("-")
+    return s or "carnet"
+
+def text_stats(text: str) -> tuple[int, int]:
+    """(mots, caractères) d'un texte; un mot est une suite de caractères sans blanc."""
+    return len(text.split()), len(text)
+
+def notebook_stats(pages) -> dict:
+    """Totaux d'un carnet, en lisant toutes ses pages (LazyPages compris)."""
+    words = chars = 0
+    for text in pages:
+        w, c = text_stats(text)
+        words += w
+        chars += c
+    return {"pages": len(pages), "words": words, "chars": chars}
+
+def stored_stats(data: dict) -> dict | None:
+    """Totaux enregistrés dans le carnet, s'ils correspondent encore à son nombre de pages."""
+    stats = data.get("stats")
+    pages = data.get("pages")
+    if (isinstance(stats, dict) and isinstance(pages, (list, LazyPages)) and stats.get("pages") == len(pages)
+            and isinstance(stats.get("words"), int) and isinstance(stats.get("chars"), int)):
+        return stats
+    return None
+
+def replay_journal(data: dict, journal_path: str) -> dict:
+    """Applique le journal d'un carnet à ses données. Les lignes tronquées sont ignorées."""
+    try:
+        f = open(journal_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return data
+    with f:
+        pages = data.setdefault("pages", [])
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "count" in rec:
+                del pages[rec["count"]:]
+                pages.extend([""] * (rec["count"] - len(pages)))
+            for i, text in rec.get("pages", {}).items():
+                i = int(i)
+                pages.extend([""] * (i + 1 - len(pages)))
+                pages[i] = text
+            if "title" in rec:
+                data["title"] = rec["title"]
+            if "updated_at" in rec:
+                data["updated_at"] = rec["updated_at"]
+            if "stats" in rec:
+                data["stats"] = rec["stats"]
+    return data
+
+# Un carnet compressé garde son extension .json: le format est reconnu à la
+# signature des premiers octets. Le journal reste en JSON lignes non compressé.
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+COMPRESSIONS = ("none", "gzip", "lzma")
+
+def notebook_compression() -> str:
+    """Compression des carnets JSON selon le réglage "compression"."""
+    value = SETTINGS["compression"]
+    return value if value in COMPRESSIONS else "none"
+
+def open_decompressed(f):
+    """Enveloppe un flux binaire (avec peek) pour le décompresser s'il est en gzip ou xz."""
+    head = f.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)]
+    if head.startswith(GZIP_MAGIC):
+        import gzip
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if head.startswith(XZ_MAGIC):
+        import lzma
+        return lzma.LZMAFile(f, "rb")
+    return f
+
+def encode_notebook(data: dict, compression: str = "none", minify: bool = False) -> bytes:
+    """JSON indenté sans compression (compact avec `minify`), JSON compact compressé sinon."""
+    if compression == "none" and not minify:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    blob = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compression == "none":
+        return blob
+    if compression == "gzip":
+        import gzip
+        return gzip.compress(blob, compresslevel=6, mtime=0)
+    import lzma
+    return lzma.compress(blob, preset=6)
+
+def write_json_atomic(path: str, data: dict, compression: str | None = None, minify: bool = False):
+    """Écrit un carnet JSON complet via un fichier temporaire puis os.replace, et supprime son journal."""
+    blob = encode_notebook(data, notebook_compression() if compression is None else compression, minify)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        sync_file(f)
+    count_written(len(blob))
+    durable_replace(tmp, path)
+    # Le journal ne contient que des valeurs absolues: le rejouer sur le
+    # JSON compacté est sans effet si on s'arrête entre les deux étapes.
+    try:
+        os.remove(path + JOURNAL_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+def append_journal(journal_path: str, records: list[dict]) -> int:
+    """Ajoute des enregistrements au journal en une seule écriture. Retourne sa nouvelle taille."""
+    chunk = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in records).encode("utf-8")
+    with open(journal_path, "a+b") as f:
+        # Après un crash en pleine écriture, repartir sur une ligne propre
+        created = f.seek(0, os.SEEK_END) == 0
+        if not created:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                chunk = b"\n" + chunk
+        f.write(chunk)
+        count_written(len(chunk))
+        # Une ligne perdue dans une coupure est ignorée au rejeu: l'ajout peut attendre le fsync groupé
+        sync_file(f, batch=True)
+        if created:
+            sync_dir(journal_path)
+        return f.tell()
+
+def disk_state(path: str) -> tuple | None:
+    """Empreinte d'un carnet sur disque (fichier et journal), None s'il n'existe pas."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    try:
+        js = os.stat(path + JOURNAL_SUFFIX)
+        journal = (js.st_mtime_ns, js.st_size)
+    except FileNotFoundError:
+        journal = None
+    return (st.st_ino, st.st_mtime_ns, st.st_size, journal)
+
+class NotebookConflict(OSError):
+    """Le fichier du carnet a été modifié hors de l'application depuis sa lecture."""
+
+def record_history(key: str, pages: dict[int, str], previous: dict[int, str] | None = None):
+    """Ajoute les pages sauvegardées à l'historique des versions, si le réglage "history" est actif."""
+    if not pages or not SETTINGS["history"]:
+        return
+    from .history import HISTORY
+    try:
+        HISTORY.record(key, pages, previous)
+    except OSError:
+        # L'historique est secondaire: il ne doit pas faire échouer la sauvegarde
+        pass
+
+def index_pages(key: str, pages: dict[int, str], count: int, before: tuple | None, after: tuple | None):
+    """Reporte les pages sauvegardées dans l'index de recherche (foleskine.search)."""
+    from .search import SEARCH
+    try:
+        SEARCH.update(key, pages, count, before, after)
+    except OSError:
+        # Index secondaire: le carnet sera réindexé à la prochaine recherche
+        pass
+
+def read_notebook_data(path: str) -> dict:
+    """Lit un carnet JSON (compressé ou non) et rejoue son journal éventuel."""
+    with open(path, "rb") as f:
+        data = json.load(open_decompressed(f))
+    return replay_journal(data, path + JOURNAL_SUFFIX)
+
+class Notebook:
+    def __init__(self, path: str, data: dict, container: NotebookContainer | None = None, store=None):
+        self.path = path
+        self.data = data
+        self.container = container
+        # Stockage externe (ex: SqliteStorage) qui prend en charge save(); None = fichier
+        self.store = store
+        if "pages" not in self.data:
+            self.data["pages"] = [""]
+        if not self.data["pages"]:
+            self.data["pages"].append("")
+        # Après un échec d'écriture en arrière-plan, la prochaine sauvegarde est complète
+        self._force_full = False
+        # (mots, caractères) de chaque page tels que comptés dans data["stats"]
+        self._page_stats: dict[int, tuple[int, int]] = {}
+        self._mark_saved()
+        # Empreinte disque après notre dernière écriture connue (voir changed_on_disk).
+        # _save_seq numérote les sauvegardes; tant que _disk_seq est en retard, une
+        # écriture en arrière-plan est en cours et l'empreinte n'est pas comparée.
+        self._disk: tuple | None = None
+        self._save_seq = 0
+        self._disk_seq = 0
+
+    @property
+    def title(self) -> str:
+        return self.data.get("title", os.path.splitext(os.path.basename(self.path))[0])
+
+    @property
+    def journal_path(self) -> str:
+        return self.path + JOURNAL_SUFFIX
+
+    def _mark_saved(self):
+        # Indices des pages modifiées depuis la dernière sauvegarde (voir set_page),
+        # et leur texte d'avant la modification (première version de l'historique)
+        self.dirty_pages: set[int] = set()
+        self._previous: dict[int, str] = {}
+        self._saved_count = len(self.data["pages"])
+        self._saved_title = self.data.get("title")
+
+    @property
+    def is_dirty(self) -> bool:
+        return (bool(self.dirty_pages) or self._force_full
+                or len(self.data["pages"]) != self._saved_count
+                or self.data.get("title") != self._saved_title)
+
+    def set_page(self, index: int, text: str):
+        """Remplace le texte d'une page (en ajoutant des pages vides si besoin) et la marque modifiée."""
+        pages = self.data["pages"]
+        while index >= len(pages):
+            self.append_page()
+        if pages[index] is not text:
+            if index not in self.dirty_pages:
+                self._previous[index] = pages[index]
+            pages[index] = text
+            self.dirty_pages.add(index)
+
+    def append_page(self, text: str = "") -> int:
+        pages = self.data["pages"]
+        pages.append(text)
+        self.dirty_pages.add(len(pages) - 1)
+        return len(pages) - 1
+
+    def page_stats(self, index: int) -> tuple[int, int]:
+        """(mots, caractères) d'une page; compté une seule fois tant que la page n'est pas modifiée."""
+        stats = self._page_stats.get(index)
+        if stats is None or index in self.dirty_pages:
+            stats = text_stats(self.data["pages"][index])
+            if index not in self.dirty_pages:
+                self._page_stats[index] = stats
+        return stats
+
+    @property
+    def stats(self) -> dict:
+        """Totaux du carnet (pages, mots, caractères) à la dernière sauvegarde."""
+        stats = stored_stats(self.data)
+        if stats is None:
+            self._count_all()
+            stats = self.data["stats"]
+        return stats
+
+    def _count_all(self):
+        # Carnet sans totaux (ancien format, modifié par un autre programme): comptage complet
+        per_page = self._page_stats = {i: text_stats(text) for i, text in enumerate(self.data["pages"])}
+        self.data["stats"] = {"pages": len(per_page), "words": sum(w for w, _ in per_page.values()),
+                              "chars": sum(c for _, c in per_page.values())}
+
+    def _update_stats(self):
+        # Totaux mis à jour par différence, sur les seules pages modifiées. _page_stats garde
+        # le compte déjà inclus dans les totaux: relancer après un échec ne compte rien deux fois.
+        pages = self.data["pages"]
+        stats = self.data.get("stats")
+        if not (isinstance(stats, dict) and stats.get("pages") == self._saved_count
+                and isinstance(stats.get("words"), int) and isinstance(stats.get("chars"), int)):
+            self._count_all()
+            return
+        words, chars = stats["words"], stats["chars"]
+        for i in self.dirty_pages:
+            if i >= len(pages):
+                continue
+            old = self._page_stats.get(i)
+            if old is None:
+                # Page ajoutée depuis la dernière sauvegarde: (0, 0)
+                old = text_stats(self._previous[i]) if i in self._previous else (0, 0)
+            new = self._page_stats[i] = text_stats(pages[i])
+            words += new[0] - old[0]
+            chars += new[1] - old[1]
+        self.data["stats"] = {"pages": len(pages), "words": words, "chars": chars}
+
+    def _changed_pages(self) -> dict[int, str]:
+        pages = self.data["pages"]
+        return {i: pages[i] for i in self.dirty_pages if i < len(pages)}
+
+    def _journal_record(self) -> dict:
+        pages = self.data["pages"]
+        rec = {"updated_at": self.data["updated_at"], "stats": self.data["stats"]}
+        if len(pages) != self._saved_count:
+            rec["count"] = len(pages)
+        # Seules les pages marquées par set_page/append_page sont écrites
+        changed = {str(i): pages[i] for i in sorted(self.dirty_pages) if i < len(pages)}
+        if changed:
+            rec["pages"] = changed
+        if self.data.get("title") != self._saved_title:
+            rec["title"] = self.data.get("title")
+        return rec
+
+    def changed_on_disk(self) -> bool:
+        """Vrai si le fichier a été modifié par un autre programme depuis notre dernière lecture/écriture."""
+        if self.store is not None or self._disk is None or self._disk_seq != self._save_seq:
+            return False
+        return disk_state(self.path) != self._disk
+
+    def _wrote(self):
+        # Écriture synchrone terminée: les résultats d'écritures plus anciennes seront ignorés
+        self._save_seq += 1
+        self._disk_seq = self._save_seq
+        self._disk = disk_state(self.path)
+
+    def write_done(self, job: "SaveJob"):
+        """Résultat d'une écriture en arrière-plan (à appeler depuis le thread principal)."""
+        if job.seq == self._save_seq:
+            self._disk_seq = job.seq
+            self._disk = job.disk
+
+    def overwrite_disk(self):
+        """Résout un conflit en faveur de la version en mémoire (réécriture complète)."""
+        self._disk = disk_state(self.path)
+        self._disk_seq = self._save_seq
+        self.compact()
+
+    @timed("notebook.save")
+    def save(self, writer: "SaveWorker | None" = None):
+        """Sauvegarde le carnet. Avec `writer`, l'écriture JSON/journal part sur le thread d'écriture.
+
+        Lève NotebookConflict si le fichier a changé sur disque depuis sa lecture.
+        """
+        if self.changed_on_disk():
+            raise NotebookConflict(f"{self.path}: modifié hors de l'application")
+        self.data["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        self._update_stats()
+        if self.store is not None:
+            t0 = time.perf_counter()
+            self.store.save_notebook(self)
+            record_write_latency(t0)
+            self._saved_history()
+            return
+        if self.container is not None:
+            # Écriture incrémentale (quelques emplacements): reste synchrone
+            t0 = time.perf_counter()
+            self.container.write(self.data, self.data["pages"])
+            record_write_latency(t0)
+            self._saved_history()
+            self._wrote()
+            LIBRARY.record(self)
+            return
+        job = self.prepare_save()
+        if writer is not None:
+            writer.submit(job)
+            return
+        job.run()
+        self.write_done(job)
+        LIBRARY.record(self)
+
+    def _saved_history(self):
+        # Écriture synchrone réussie: historique et index de recherche des pages modifiées
+        # (self._disk est encore l'empreinte d'avant l'écriture), puis état sauvegardé
+        changed = self._changed_pages()
+        record_history(self.path, changed, self._previous)
+        if self.store is None:
+            index_pages(self.path, changed, len(self.data["pages"]), self._disk, disk_state(self.path))
+        self._mark_saved()
+
+    def prepare_save(self) -> "SaveJob":
+        """Capture l'état à écrire (copie superficielle) et le marque comme sauvegardé."""
+        records = None
+        if SETTINGS["journal"] and not self._force_full:
+            # Mode journalisé: on n'ajoute que les pages modifiées
+            records = [self._journal_record()]
+        self._save_seq += 1
+        job = SaveJob(self, self.to_dict(), records, self._save_seq)
+        job.history = (self._changed_pages(), self._previous)
+        self._force_full = False
+        self._mark_saved()
+        return job
+
+    def save_failed(self):
+        self._force_full = True
+
+    def to_dict(self) -> dict:
+        """Données au schéma JSON d'origine (toutes les pages décodées)."""
+        return dict(self.data, pages=list(self.data["pages"]))
+
+    @timed("notebook.compact")
+    def compact(self):
+        """Réécrit le carnet complet: JSON canonique sans journal, ou conteneur sans espace perdu."""
+        if self.changed_on_disk():
+            raise NotebookConflict(f"{self.path}: modifié hors de l'application")
+        self._update_stats()
+        if self.store is not None:
+            self.store.save_notebook(self)
+            self._saved_history()
+            return
+        if self.path.lower().endswith(CONTAINER_EXT):
+            meta = {k: v for k, v in self.data.items() if k != "pages"}
+            pages = list(self.data["pages"])
+            if self.container is not None:
+                self.container.close()
+            self.container = NotebookContainer.create(self.path, meta, pages)
+            self.data["pages"] = LazyPages.from_container(self.container, pages)
+            self._saved_history()
+            self._wrote()
+            LIBRARY.record(self)
+            return
+        write_json_atomic(self.path, self.data)
+        self._force_full = False
+        self._saved_history()
+        self._wrote()
+        LIBRARY.record(self)
+
+    def has_journal(self) -> bool:
+        return os.path.exists(self.journal_path)
+
+    def needs_compaction(self) -> bool:
+        if self.store is not None:
+            return False
+        if self.container is not None:
+            wasted = self.container.wasted_bytes(self.data["pages"].slots)
+            return wasted > 64 * 1024 and wasted * 2 > self.container.file_size()
+        return self.has_journal()
+
+    def close(self):
+        """Libère le mmap d'un conteneur (nécessaire avant de renommer ou supprimer sous Windows)."""
+        if self.container is not None:
+            self.container.close()
+
+    def move(self, new_path: str):
+        """Renomme le fichier du carnet (et le rouvre s'il s'agit d'un conteneur)."""
+        if self.needs_compaction():
+            # Compacter d'abord pour ne pas laisser le journal derrière l'ancien nom
+            self.compact()
+        if self.container is not None:
+            self.container.write(self.data, self.data["pages"])
+        self.close()
+        os.replace(self.path, new_path)
+        from .history import HISTORY
+        from .search import SEARCH
+        HISTORY.rename(self.path, new_path)
+        SEARCH.rename(self.path, new_path)
+        LIBRARY.forget(self.path)
+        self.path = new_path
+        if self.container is not None:
+            self.container = NotebookContainer(new_path)
+            self.data["pages"] = LazyPages.from_container(self.container, self.data["pages"]._items)
+        self._wrote()
+
+    @staticmethod
+    def create_new(title: str):
+        fname = f"{slugify(title)}{notebook_ext()}"
+        path = os.path.join(LIB_DIR, fname)
+        ts = datetime.datetime.now().isoformat(timespec="seconds")
+        data = {
+            "title": title,
+            "created_at": ts,
+            "updated_at": ts,
+            "pages": [""]
+        }
+        return Notebook.write_new(path, data)
+
+    @staticmethod
+    def write_new(path: str, data: dict):
+        """Crée le fichier d'un carnet au format donné par l'extension de `path`."""
+        nb = Notebook(path, data)
+        nb.compact()
+        return nb
+
+    @staticmethod
+    @timed("notebook.load")
+    def load(path: str):
+        # Empreinte prise avant la lecture: une modification pendant la lecture sera vue comme un conflit
+        disk = disk_state(path)
+        if path.lower().endswith(CONTAINER_EXT):
+            container = NotebookContainer(path)
+            data = dict(container.meta, pages=LazyPages.from_container(container))
+            nb = Notebook(path, data, container)
+        else:
+            nb = Notebook(path, read_notebook_data(path))
+        nb._disk = disk
+        return nb
+
+def notebook_ext() -> str:
+    """Extension des nouveaux carnets selon le réglage "format"."""
+    return CONTAINER_EXT if SETTINGS["format"] == "fnb" else ".json"
+
+# ---------------------- Pools de processus ----------------------
+def process_pool(workers: int):
+    """ProcessPoolExecutor dont les processus ne sont pas des copies (fork) du programme appelant.
+
+    Un fork de l'application copierait les verrous tenus au même moment par ses
+    threads (écriture, fsync groupés, synchronisation, index) et le processus
+    fils pourrait s'y bloquer: "forkserver" quand il existe, "spawn" sinon.
+    """
+    # Imports différés: inutiles tant qu'aucune opération en masse ne démarre
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+
+# ---------------------- Écriture en arrière-plan ----------------------
+class SaveJob:
+    """Écriture d'un carnet JSON préparée sur le thread principal.
+
+    `snapshot` est l'état complet au moment de la sauvegarde; `records` les
+    enregistrements de journal à ajouter, ou None pour une réécriture complète.
+    `history` (pages modifiées, textes d'avant) part dans l'historique et
+    l'index de recherche après l'écriture.
+    """
+
+    def __init__(self, notebook: Notebook, snapshot: dict, records: list[dict] | None, seq: int = 0):
+        self.notebook = notebook
+        self.path = notebook.path
+        self.snapshot = snapshot
+        self.records = records
+        self.seq = seq
+        # Empreinte disque après l'écriture (voir Notebook.write_done)
+        self.disk = None
+        self.history: tuple[dict, dict] = ({}, {})
+
+    def merged_after(self, older: "SaveJob") -> "SaveJob":
+        """Fusionne avec une sauvegarde plus ancienne encore en attente du même carnet."""
+        records = None
+        if self.records is not None and older.records is not None:
+            records = older.records + self.records
+        job = SaveJob(self.notebook, self.snapshot, records, self.seq)
+        # Versions intermédiaires confondues; le texte d'avant reste le plus ancien
+        job.history = ({**older.history[0], **self.history[0]}, {**self.history[1], **older.history[1]})
+        return job
+
+    @timed("save.write")
+    def run(self):
+        # Les écritures d'un carnet se suivent sur ce thread: l'empreinte d'avant est celle de la précédente
+        before = disk_state(self.path)
+        t0 = time.perf_counter()
+        written = False
+        if self.records is not None and os.path.exists(self.path):
+            size = append_journal(self.path + JOURNAL_SUFFIX, self.records)
+            written = size <= SETTINGS["journal_max_bytes"]
+        if not written:
+            write_json_atomic(self.path, self.snapshot)
+        self.disk = disk_state(self.path)
+        record_write_latency(t0)
+        record_history(self.path, *self.history)
+        index_pages(self.path, self.history[0], len(self.snapshot["pages"]), before, self.disk)
+
+class SaveWorker(threading.Thread):
+    """Thread d'écriture des carnets.
+
+    Les sauvegardes en attente d'un même carnet sont fusionnées: seule la
+    plus récente est écrite (ou, en mode journal, tous les enregistrements
+    en une seule écriture). Les résultats `(job, erreur ou None)` sont déposés
+    dans `results`, à relever depuis le thread Tk.
+    """
+
+    def __init__(self):
+        super().__init__(name="foleskine-save", daemon=True)
+        self._cond = threading.Condition()
+        self._pending: dict[str, SaveJob] = {}
+        self._busy = False
+        self._stopping = False
+        self.results: queue.SimpleQueue = queue.SimpleQueue()
+
+    def submit(self, job: SaveJob):
+        with self._cond:
+            older = self._pending.pop(job.path, None)
+            if older is not None:
+                job = job.merged_after(older)
+            self._pending[job.path] = job
+            self._cond.notify_all()
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                job = self._pending.pop(next(iter(self._pending)))
+                self._busy = True
+            try:
+                job.run()
+                error = None
+            except Exception as e:
+                error = e
+            self.results.put((job, error))
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Attend que toutes les écritures en attente soient terminées."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def stop(self):
+        """Écrit tout ce qui reste puis arrête le thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self.join()
+
+# ---------------------- Carnets ouverts ----------------------
+def pages_size(pages) -> int:
+    """Caractères des pages chargées en mémoire (les pages d'un LazyPages non lues ne comptent pas)."""
+    items = pages._items if isinstance(pages, LazyPages) else pages
+    return sum(len(p) for p in items if p is not None)
+
+class CachedNotebook:
+    __slots__ = ("notebook", "page", "cursor", "size")
+
+    def __init__(self, notebook: Notebook, page: int, cursor: str, size: int):
+        self.notebook = notebook
+        self.page = page
+        self.cursor = cursor
+        self.size = size
+
+class NotebookCache:
+    """Carnets quittés récemment (LRU), bornés par la taille de leurs pages.
+
+    `take` rend un carnet encore à jour sans lecture disque (un stat suffit à
+    vérifier qu'il n'a pas changé), avec sa page et sa position de curseur.
+    Un carnet évincé est d'abord sauvegardé s'il a des modifications en
+    attente, puis compacté et fermé comme à la fermeture d'un carnet.
+    """
+
+    def __init__(self, writer: "SaveWorker | None" = None, max_bytes: int | None = None):
+        self.writer = writer
+        self.max_bytes = SETTINGS["notebook_cache_bytes"] if max_bytes is None else max_bytes
+        self._entries: OrderedDict[str, CachedNotebook] = OrderedDict()
+        self._size = 0
+        # Page et curseur des carnets déjà évincés (quelques octets par carnet)
+        self._positions: OrderedDict[str, tuple[int, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._entries
+
+    def position(self, path: str) -> tuple[int, str]:
+        """Dernière page et position du curseur connues d'un carnet ((0, "1.0") par défaut)."""
+        entry = self._entries.get(path)
+        if entry is not None:
+            return entry.page, entry.cursor
+        return self._positions.get(path, (0, "1.0"))
+
+    def put(self, nb: Notebook, page: int = 0, cursor: str = "1.0"):
+        """Garde un carnet quitté; évince les plus anciens au-delà de max_bytes."""
+        self.discard(nb.path)
+        entry = CachedNotebook(nb, page, cursor, pages_size(nb.data["pages"]))
+        self._entries[nb.path] = entry
+        self._size += entry.size
+        self._remember(nb.path, page, cursor)
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            self._evict(next(iter(self._entries)))
+        if entry.size > self.max_bytes:
+            # Trop gros pour le cache: fermé tout de suite
+            self._evict(nb.path)
+
+    def take(self, path: str) -> CachedNotebook | None:
+        """Retire et rend un carnet du cache, None s'il n'y est pas ou a changé sur disque."""
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return None
+        self._size -= entry.size
+        nb = entry.notebook
+        if nb.changed_on_disk() and not nb.is_dirty:
+            # Modifié hors de l'application: à relire
+            nb.close()
+            return None
+        return entry
+
+    def discard(self, path: str):
+        """Oublie un carnet du cache sans le sauvegarder (supprimé ou renommé)."""
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._size -= entry.size
+            entry.notebook.close()
+
+    def _remember(self, path: str, page: int, cursor: str):
+        self._positions[path] = (page, cursor)
+        self._positions.move_to_end(path)
+        while len(self._positions) > 1024:
+            self._positions.popitem(last=False)
+
+    def _evict(self, path: str):
+        entry = self._entries[path]
+        nb = entry.notebook
+        # Écritures en attente d'abord: la sauvegarde ou le compactage passent après
+        if self.writer is not None:
+            self.writer.flush()
+        if nb.is_dirty:
+            nb.save()
+        elif nb.needs_compaction() and not nb.changed_on_disk():
+            # Un carnet modifié hors de l'application est fermé sans compactage, comme dans take
+            nb.compact()
+        # Retiré seulement si tout est écrit: en cas d'erreur, le carnet reste en cache
+        del self._entries[path]
+        self._size -= entry.size
+        nb.close()
+
+    def clear(self):
+        """Évince tout (fermeture de l'application). Lève ensuite l'erreur de la première écriture impossible.
+
+        Les carnets qui n'ont pu être écrits restent en cache; les autres sont tous évincés.
+        """
+        error = None
+        for path in list(self._entries):
+            try:
+                self._evict(path)
+            except OSError as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+# ---------------------- Index de la bibliothèque ----------------------
+# Format du manifeste (JSON):
+# {
+#   "version": 3,
+#   "notebooks": {
+#     "mon-carnet.json": {"path": "...", "title": "Mon carnet", "updated_at": "2025-08-26T10:00:00",
+#                         "mtime": 1756200000000000000, "size": 1234, "pages": 3,
+#                         "words": 250, "chars": 1500, "journal": [1756200000000000000, 120]}
+#     (+ "error": "..." pour un fichier illisible, listé sous son nom)
+#   }
+# }
+
+class LibraryIndex:
+    """Manifeste persistant des carnets de LIB_DIR (titre, mtime, taille, statistiques).
+
+    Un rafraîchissement ne coûte qu'un `scandir` : seuls les fichiers dont le
+    mtime ou la taille (ou ceux de leur journal) ont changé sont relus. Les
+    statistiques viennent des totaux enregistrés dans chaque carnet.
+    """
+    VERSION = 3
+
+    def __init__(self, lib_dir: str, path: str):
+        self.lib_dir = lib_dir
+        self.path = path
+        self._entries: dict[str, dict] | None = None  # chargé à la première utilisation
+        self._dirty = False
+
+    @property
+    def entries(self) -> dict[str, dict]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return {}
+        return data.get("notebooks", {})
+
+    def flush(self):
+        """Écrit le manifeste sur disque s'il a changé."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "notebooks": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    @staticmethod
+    def _journal_stat(jst: os.stat_result | None) -> list[int] | None:
+        return [jst.st_mtime_ns, jst.st_size] if jst is not None else None
+
+    @classmethod
+    def _stale(cls, entry: dict | None, path: str, st: os.stat_result, jst: os.stat_result | None) -> bool:
+        return (entry is None or entry.get("path") != path or entry.get("mtime") != st.st_mtime_ns
+                or entry.get("size") != st.st_size or entry.get("journal") != cls._journal_stat(jst))
+
+    @classmethod
+    def _make_entry(cls, path: str, st: os.stat_result, data: dict | None, jst: os.stat_result | None = None) -> dict:
+        fallback = os.path.splitext(os.path.basename(path))[0]
+        updated_at = ""
+        stats = {"pages": 0, "words": 0, "chars": 0}
+        if isinstance(data, dict):
+            title = data.get("title") or fallback
+            updated_at = data.get("updated_at") or ""
+            if isinstance(data.get("pages"), (list, LazyPages)):
+                # Carnet écrit par un autre programme (ou plus ancien): comptage complet
+                stats = stored_stats(data) or notebook_stats(data["pages"])
+        else:
+            title = fallback
+        return {"path": path, "title": title, "updated_at": updated_at,
+                "mtime": st.st_mtime_ns, "size": st.st_size, "pages": stats["pages"],
+                "words": stats["words"], "chars": stats["chars"], "journal": cls._journal_stat(jst)}
+
+    def _read_entry(self, path: str, st: os.stat_result, jst: os.stat_result | None = None) -> dict:
+        nb = None
+        try:
+            nb = Notebook.load(path)
+            # Avant close: les totaux d'un ancien conteneur se comptent sur ses pages
+            return self._make_entry(path, st, nb.data, jst)
+        except Exception as e:
+            # Carnet illisible: listé sous son nom de fichier, avec l'erreur (voir foleskine.verify)
+            entry = self._make_entry(path, st, None, jst)
+            entry["error"] = str(e) or type(e).__name__
+            return entry
+        finally:
+            if nb is not None:
+                nb.close()
+
+    @staticmethod
+    def _stat_journal(path: str) -> os.stat_result | None:
+        try:
+            return os.stat(path + JOURNAL_SUFFIX)
+        except FileNotFoundError:
+            return None
+
+    @timed("library.refresh")
+    def refresh(self) -> list[dict]:
+        """Resynchronise l'index avec LIB_DIR et retourne les entrées triées par nom de fichier."""
+        self.scan(workers=1).step(None)
+        return self.sorted_entries()
+
+    def scan(self, workers: int | None = None) -> "LibraryScan":
+        """Resynchronisation progressive (voir LibraryScan); `workers=1` lit les carnets sans pool."""
+        return LibraryScan(self, workers)
+
+    def sorted_entries(self) -> list[dict]:
+        return [self.entries[name] for name in sorted(self.entries)]
+
+    def _owns(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.lib_dir)
+
+    def record(self, nb: "Notebook") -> dict | None:
+        """Met à jour l'entrée d'un carnet qui vient d'être écrit (sans relire le fichier) et la retourne."""
+        if not self._owns(nb.path):
+            return None
+        try:
+            st = os.stat(nb.path)
+        except OSError:
+            return None
+        entry = self.entries[os.path.basename(nb.path)] = self._make_entry(nb.path, st, nb.data,
+                                                                           self._stat_journal(nb.path))
+        self._dirty = True
+        return entry
+
+    def apply_changes(self, names: set[str]) -> tuple[list[dict], list[str]]:
+        """Met à jour les entrées des fichiers signalés par un watcher.
+
+        Retourne (entrées ajoutées ou modifiées, chemins supprimés). Un
+        fichier dont l'empreinte n'a pas changé (nos propres écritures, déjà
+        enregistrées par record) n'est pas relu.
+        """
+        updated, removed = [], []
+        bases = {name[:-len(JOURNAL_SUFFIX)] if name.endswith(JOURNAL_SUFFIX) else name for name in names}
+        for name in bases:
+            if not is_notebook_file(name):
+                continue
+            path = os.path.join(self.lib_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                if self.entries.pop(name, None) is not None:
+                    self._dirty = True
+                    removed.append(path)
+                continue
+            jst = self._stat_journal(path)
+            if self._stale(self.entries.get(name), path, st, jst):
+                entry = self.entries[name] = self._read_entry(path, st, jst)
+                self._dirty = True
+                updated.append(entry)
+        return updated, removed
+
+    def forget(self, path: str):
+        """Retire un carnet supprimé ou renommé de l'index."""
+        if self.entries.pop(os.path.basename(path), None) is not None:
+            self._dirty = True
+
+class LibraryScan:
+    """Resynchronisation de LibraryIndex par étapes, les carnets à relire étant lus par un pool de threads.
+
+    Le `scandir` est fait à la construction: `entries` donne tout de suite
+    une entrée par fichier, celle du manifeste, ou une entrée provisoire
+    (titre tiré du nom de fichier, sans "words") pour un carnet encore
+    jamais lu. `step(timeout)` installe les entrées lues dans l'index;
+    `take_ready()` retourne celles installées depuis l'appel précédent. Une
+    entrée remplacée entre-temps (sauvegarde, watcher) n'est pas écrasée.
+    """
+
+    def __init__(self, index: LibraryIndex, workers: int | None = None):
+        self.index = index
+        entries = index.entries
+        names, stale = set(), []
+        os.makedirs(index.lib_dir, exist_ok=True)
+        files, journals = [], {}
+        with os.scandir(index.lib_dir) as it:
+            for de in it:
+                if de.name.endswith(JOURNAL_SUFFIX):
+                    journals[de.name[:-len(JOURNAL_SUFFIX)]] = de.stat()
+                elif is_notebook_file(de.name) and de.is_file():
+                    files.append(de)
+        for de in files:
+            st, jst = de.stat(), journals.get(de.name)
+            names.add(de.name)
+            entry = entries.get(de.name)
+            if index._stale(entry, de.path, st, jst):
+                if entry is None or entry.get("path") != de.path:
+                    # Provisoire (mtime None: toujours à relire si le manifeste est écrit avant la fin)
+                    entry = entries[de.name] = {"path": de.path, "title": os.path.splitext(de.name)[0],
+                                                "updated_at": "", "mtime": None, "size": None, "pages": 0,
+                                                "journal": None}
+                stale.append((de.name, de.path, st, jst, entry))
+        for name in entries.keys() - names:
+            del entries[name]
+            index._dirty = True
+        self.entries = index.sorted_entries()
+        self.total = len(stale)
+        self.done = 0
+        self._ready: list[dict] = []
+        self._next = iter(stale)
+        self._pool = None
+        self._pending = {}
+        if workers != 1 and stale:
+            # Import différé: inutile (et coûteux à l'import du paquet) quand tout est à jour
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(workers or min(8, os.cpu_count() or 1))
+            self._pending = {self._pool.submit(index._read_entry, path, st, jst): (name, old)
+                             for name, path, st, jst, old in stale}
+
+    @property
+    def finished(self) -> bool:
+        return self.done == self.total
+
+    def _install(self, name: str, old: dict, entry: dict):
+        self.done += 1
+        if self.index.entries.get(name) is old:
+            self.index.entries[name] = entry
+            self.index._dirty = True
+            self._ready.append(entry)
+
+    def step(self, timeout: float | None = 0.05) -> bool:
+        """Installe les carnets lus pendant au plus `timeout` secondes (None: jusqu'à la fin)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if self._pool is None:
+                name, path, st, jst, old = next(self._next)
+                self._install(name, old, self.index._read_entry(path, st, jst))
+            else:
+                from concurrent.futures import FIRST_COMPLETED, wait
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _ = wait(self._pending, remaining, FIRST_COMPLETED)
+                for future in ready:
+                    name, old = self._pending.pop(future)
+                    self._install(name, old, future.result())
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if self.finished:
+            self.close()
+        return self.finished
+
+    def take_ready(self) -> list[dict]:
+        ready, self._ready = self._ready, []
+        return ready
+
+    def close(self):
+        """Arrête le pool; les carnets non lus gardent leur entrée provisoire (relus au prochain scan)."""
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        self._pool = None
+
+LIBRARY = LibraryIndex(LIB_DIR, INDEX_PATH)
+
+# ---------------------- Liste de la bibliothèque ----------------------
+def fold_text(text: str) -> str:
+    """Minuscules sans accents, pour comparer des titres ("Été" == "ete")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+class LibraryModel:
+    """Entrées de la bibliothèque indexées par chemin, triées et filtrées pour la barre latérale.
+
+    `rows` est la liste affichée. Un filtre qui prolonge le précédent (frappe
+    d'un caractère de plus) ne reparcourt que les lignes déjà retenues.
+    """
+    SORTS = ("title", "updated_at")
+
+    def __init__(self):
+        self.entries: dict[str, dict] = {}
+        self.sort = "title"
+        self.query = ""
+        self.rows: list[dict] = []
+        # Couples (titre replié, entrée): tri puis lignes retenues par le filtre
+        self._ordered: list[tuple[str, dict]] = []
+        self._matched: list[tuple[str, dict]] = []
+        self._folds: dict[str, str] = {}
+        self._positions: dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> dict:
+        return self.rows[i]
+
+    def _fold(self, title: str) -> str:
+        folded = self._folds.get(title)
+        if folded is None:
+            folded = self._folds[title] = fold_text(title)
+        return folded
+
+    def set_entries(self, entries: list[dict]):
+        self.entries = {e["path"]: e for e in entries}
+        self._reorder()
+
+    def apply(self, updated: list[dict], removed: list[str]):
+        """Applique des changements ponctuels (watcher) sans recharger toute la bibliothèque."""
+        for path in removed:
+            self.entries.pop(path, None)
+        for entry in updated:
+            self.entries[entry["path"]] = entry
+        if updated or removed:
+            self._reorder()
+
+    def update(self, path: str, **fields):
+        """Met à jour une entrée en place (statistiques après une sauvegarde); retrie seulement si l'ordre change."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return
+        key = "title" if self.sort == "title" else "updated_at"
+        reorder = key in fields and fields[key] != entry.get(key)
+        entry.update(fields)
+        if reorder:
+            self._reorder()
+
+    def totals(self) -> dict:
+        """Statistiques de toute la bibliothèque, d'après les entrées (aucun carnet n'est lu)."""
+        entries = self.entries.values()
+        return {"notebooks": len(self.entries), "pages": sum(e.get("pages", 0) for e in entries),
+                "words": sum(e.get("words", 0) for e in entries), "chars": sum(e.get("chars", 0) for e in entries)}
+
+    def set_sort(self, sort: str):
+        if sort not in self.SORTS:
+            raise ValueError(f"tri inconnu: {sort}")
+        if sort != self.sort:
+            self.sort = sort
+            self._reorder(self._ordered)
+
+    def set_filter(self, query: str):
+        query = fold_text(query.strip())
+        if query == self.query:
+            return
+        # "ab" ne retient que des titres déjà retenus par "a"
+        base = self._matched if self.query and query.startswith(self.query) else self._ordered
+        self.query = query
+        self._apply_filter(base)
+
+    def index_of(self, path: str) -> int | None:
+        if self._positions is None:
+            self._positions = {e["path"]: i for i, e in enumerate(self.rows)}
+        return self._positions.get(path)
+
+    def _reorder(self, pairs: list[tuple[str, dict]] | None = None):
+        if pairs is None:
+            pairs = [(self._fold(e["title"]), e) for e in self.entries.values()]
+        else:
+            pairs = list(pairs)
+        if self.sort == "updated_at":
+            # Plus récents d'abord
+            pairs.sort(key=lambda p: p[1].get("updated_at") or "", reverse=True)
+        else:
+            pairs.sort(key=itemgetter(0))
+        self._ordered = pairs
+        self._apply_filter(pairs)
+
+    def _apply_filter(self, base: list[tuple[str, dict]]):
+        # Un passage par terme: chaque passage réduit la liste du suivant
+        for term in self.query.split():
+            base = [p for p in base if term in p[0]]
+        self._matched = base
+        self.rows = [e for _, e in self._matched]
+        self._positions = None
+
+# ---------------------- Stockage ----------------------
+# L'application passe par un objet de stockage pour lister, créer, renommer,
+# supprimer, importer et rechercher les carnets:
+#   - FileStorage  : un fichier par carnet dans LIB_DIR (JSON, journal, .fnb),
+#                    index inversé pour la recherche (foleskine.search)
+#   - SqliteStorage: une base SQLite (WAL) avec index plein texte FTS5
+# Les entrées de `list_notebooks()` ont au moins "path" (clé du carnet),
+# "title", "updated_at", "pages", "words" et "chars"; les résultats de
+# `search()` ont "path", "title", "page" (index), "snippet" et "offset"
+# (position du texte trouvé dans la page). `reindex()` retourne la mise à
+# jour de l'index à avancer par étapes (ou None), `scan()` la relecture
+# progressive de la liste (LibraryScan, ou None: appeler list_notebooks).
+# `watch()` retourne un watcher des modifications externes (ou None) dont
+# les noms de fichiers se passent à `apply_changes()`.
+
+def snippet_at(text: str, pos: int, width: int = 60) -> str:
+    """Extrait de `width` caractères centré sur la position `pos`."""
+    start = max(0, pos - width // 2)
+    snippet = " ".join(text[start:start + width].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+
+class FileStorage:
+    """Un fichier par carnet dans `lib_dir`, listé via le manifeste LibraryIndex."""
+    name = "files"
+
+    def __init__(self, lib_dir: str, index: LibraryIndex):
+        self.lib_dir = lib_dir
+        self.index = index
+
+    def list_notebooks(self) -> list[dict]:
+        return self.index.refresh()
+
+    def flush(self):
+        self.index.flush()
+
+    def close(self):
+        self.flush()
+        # fsync groupés encore en attente (mode "batched")
+        SYNC_BATCH.flush()
+
+    def load(self, path: str) -> Notebook:
+        return Notebook.load(path)
+
+    def watch(self):
+        """Surveillance de lib_dir (voir foleskine.watch); None si le stockage n'en a pas."""
+        from .watch import open_watcher
+        return open_watcher(self.lib_dir)
+
+    def apply_changes(self, names: set[str]) -> tuple[list[dict], list[str]]:
+        return self.index.apply_changes(names)
+
+    def scan(self):
+        return self.index.scan()
+
+    def create(self, title: str) -> Notebook:
+        return Notebook.create_new(title)
+
+    def rename(self, nb: Notebook, title: str):
+        """Renomme le carnet et son fichier (slug). Lève FileExistsError en cas de conflit."""
+        ext = os.path.splitext(nb.path)[1]
+        new_path = os.path.join(self.lib_dir, f"{slugify(title)}{ext}")
+        if os.path.abspath(new_path) != os.path.abspath(nb.path):
+            if os.path.exists(new_path):
+                raise FileExistsError(new_path)
+            nb.move(new_path)
+        nb.data["title"] = title
+        nb.save()
+
+    def delete(self, nb: Notebook):
+        nb.close()
+        os.remove(nb.path)
+        if nb.has_journal():
+            os.remove(nb.journal_path)
+        self.index.forget(nb.path)
+        self.search_index.forget(nb.path)
+        from .history import HISTORY
+        HISTORY.forget(nb.path)
+
+    def import_data(self, data: dict, fallback_title: str) -> str:
+        title = data.get("title") or fallback_title
+        ext = notebook_ext()
+        dest = os.path.join(self.lib_dir, f"{slugify(title)}{ext}")
+        # éviter collision
+        base = os.path.splitext(dest)[0]
+        i = 1
+        while os.path.exists(dest):
+            dest = f"{base}-{i}{ext}"
+            i += 1
+        # Écrit au format de la bibliothèque (JSON ou conteneur .fnb)
+        Notebook.write_new(dest, data).close()
+        return dest
+
+    @property
+    def search_index(self):
+        from .search import index_for
+        return index_for(self.lib_dir)
+
+    def reindex(self, full: bool = False, workers: int | None = None):
+        """(Ré)indexation des carnets modifiés (tous avec `full`): IndexBuild, ou None si l'index est à jour."""
+        from .search import IndexBuild
+        index = self.search_index
+        paths = index.stale(self.index.refresh(), full)
+        if not paths and not full:
+            return None
+        return IndexBuild(index, paths, full, workers)
+
+    @timed("search")
+    def search(self, query: str, limit: int = 50) -> list[dict]:
+        # Index inversé (foleskine.search): seules les pages candidates sont relues
+        from .search import parse_query
+        terms = parse_query(query)
+        if not terms:
+            return []
+        build = self.reindex()
+        if build is not None:
+            build.step(None)
+        return self.search_index.search(terms, self.index.sorted_entries(), limit)
+
+# PRAGMA synchronous selon le réglage "durability"
+SQLITE_SYNCHRONOUS = {"paranoid": "FULL", "batched": "NORMAL", "fast": "OFF"}
+
+class SqliteStorage:
+    """Carnets et pages dans SQLite (mode WAL), recherche plein texte via FTS5.
+
+    Une page modifiée est un simple UPDATE d'une ligne; les triggers tiennent
+    l'index FTS5 à jour. Les clés de carnet sont de la forme "sqlite:<id>".
+    """
+    name = "sqlite"
+    KEY_PREFIX = "sqlite:"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS notebooks(
+            id INTEGER PRIMARY KEY,
+            slug TEXT NOT NULL,
+            title TEXT NOT NULL,
+            created_at TEXT,
+            updated_at TEXT,
+            meta TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS pages(
+            id INTEGER PRIMARY KEY,
+            notebook_id INTEGER NOT NULL REFERENCES notebooks(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            content TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS pages_by_notebook ON pages(notebook_id, idx);
+        CREATE TABLE IF NOT EXISTS properties(key TEXT PRIMARY KEY, value TEXT);
+    """
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+            content, content='pages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS pages_ai AFTER INSERT ON pages BEGIN
+            INSERT INTO pages_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS pages_ad AFTER DELETE ON pages BEGIN
+            INSERT INTO pages_fts(pages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS pages_au AFTER UPDATE OF content ON pages BEGIN
+            INSERT INTO pages_fts(pages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO pages_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        import sqlite3  # import différé: inutile tant que le stockage SQLite n'est pas utilisé
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL: NORMAL synchronise aux checkpoints (les dernières transactions peuvent
+        # être perdues sur coupure de courant, la base reste cohérente)
+        self.conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS[durability_mode()]}")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(self.SCHEMA)
+        try:
+            with self.conn:
+                self.conn.executescript(self.FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite compilé sans FTS5: recherche par LIKE
+            self.fts = False
+
+    def close(self):
+        self.conn.close()
+        # Historique des pages: ajouts dont le fsync groupé est encore en attente
+        SYNC_BATCH.flush()
+
+    @classmethod
+    def _id(cls, key: str) -> int:
+        if not key.startswith(cls.KEY_PREFIX):
+            raise KeyError(key)
+        return int(key[len(cls.KEY_PREFIX):])
+
+    @classmethod
+    def _key(cls, notebook_id: int) -> str:
+        return f"{cls.KEY_PREFIX}{notebook_id}"
+
+    def list_notebooks(self) -> list[dict]:
+        # Totaux enregistrés dans les métadonnées (voir Notebook.stats): aucune page n'est lue
+        rows = self.conn.execute("""
+            SELECT n.id, n.title, n.updated_at, count(p.id),
+                   json_extract(n.meta, '$.stats.words'), json_extract(n.meta, '$.stats.chars')
+            FROM notebooks n LEFT JOIN pages p ON p.notebook_id = n.id
+            GROUP BY n.id ORDER BY n.slug, n.id
+        """)
+        return [{"path": self._key(nid), "title": title, "updated_at": updated_at, "pages": n_pages,
+                 "words": words or 0, "chars": chars or 0}
+                for nid, title, updated_at, n_pages, words, chars in rows]
+
+    def flush(self):
+        pass
+
+    def watch(self):
+        # Une seule base, modifiée par l'application elle-même: rien à surveiller
+        return None
+
+    def scan(self):
+        # list_notebooks est une seule requête: rien à lire en arrière-plan
+        return None
+
+    def _read_page(self, page_id: int) -> str:
+        row = self.conn.execute("SELECT content FROM pages WHERE id = ?", (page_id,)).fetchone()
+        return row[0] if row else ""
+
+    def load(self, key: str) -> Notebook:
+        nid = self._id(key)
+        row = self.conn.execute("SELECT title, created_at, updated_at, meta FROM notebooks WHERE id = ?",
+                                (nid,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        title, created_at, updated_at, meta = row
+        data = json.loads(meta)
+        data.update(title=title, created_at=created_at, updated_at=updated_at)
+        page_ids = [pid for (pid,) in self.conn.execute(
+            "SELECT id FROM pages WHERE notebook_id = ? ORDER BY idx", (nid,))]
+        data["pages"] = LazyPages(page_ids, self._read_page)
+        return Notebook(key, data, store=self)
+
+    @timed("sqlite.save")
+    def save_notebook(self, nb: Notebook):
+        nid = self._id(nb.path)
+        pages = nb.data["pages"]
+        meta = {k: v for k, v in nb.data.items() if k not in ("pages", "title", "created_at", "updated_at")}
+        with self.conn:
+            self.conn.executemany("DELETE FROM pages WHERE id = ?", [(pid,) for pid in pages.removed])
+            for i in sorted(pages.dirty):
+                if pages.slots[i] is None:
+                    cur = self.conn.execute("INSERT INTO pages(notebook_id, idx, content) VALUES (?, ?, ?)",
+                                            (nid, i, pages.raw(i)))
+                    pages.slots[i] = cur.lastrowid
+                else:
+                    self.conn.execute("UPDATE pages SET content = ? WHERE id = ?", (pages.raw(i), pages.slots[i]))
+                if diagnostics.ENABLED:
+                    count_written(len(pages.raw(i).encode("utf-8")))
+            if pages.resized:
+                self.conn.executemany("UPDATE pages SET idx = ? WHERE id = ?",
+                                      [(i, pid) for i, pid in enumerate(pages.slots)])
+            self.conn.execute("UPDATE notebooks SET slug = ?, title = ?, updated_at = ?, meta = ? WHERE id = ?",
+                              (slugify(nb.title), nb.title, nb.data.get("updated_at"),
+                               json.dumps(meta, ensure_ascii=False), nid))
+        pages.mark_saved()
+
+    def _insert(self, data: dict, fallback_title: str) -> int:
+        title = data.get("title") or fallback_title
+        ts = datetime.datetime.now().isoformat(timespec="seconds")
+        pages = list(data.get("pages") or [""])
+        meta = {k: v for k, v in data.items() if k not in ("pages", "title", "created_at", "updated_at")}
+        meta["stats"] = notebook_stats(pages)
+        cur = self.conn.execute(
+            "INSERT INTO notebooks(slug, title, created_at, updated_at, meta) VALUES (?, ?, ?, ?, ?)",
+            (slugify(title), title, data.get("created_at", ts), data.get("updated_at", ts),
+             json.dumps(meta, ensure_ascii=False)))
+        nid = cur.lastrowid
+        self.conn.executemany("INSERT INTO pages(notebook_id, idx, content) VALUES (?, ?, ?)",
+                              [(nid, i, text) for i, text in enumerate(pages)])
+        return nid
+
+    def create(self, title: str) -> Notebook:
+        with self.conn:
+            nid = self._insert({"title": title, "pages": [""]}, title)
+        return self.load(self._key(nid))
+
+    def rename(self, nb: Notebook, title: str):
+        nb.data["title"] = title
+        nb.save()
+
+    def delete(self, nb: Notebook):
+        with self.conn:
+            self.conn.execute("DELETE FROM notebooks WHERE id = ?", (self._id(nb.path),))
+        from .history import HISTORY
+        HISTORY.forget(nb.path)
+
+    def import_data(self, data: dict, fallback_title: str) -> str:
+        with self.conn:
+            return self._key(self._insert(data, fallback_title))
+
+    @timed("search")
+    def search(self, query: str, limit: int = 50) -> list[dict]:
+        # Même syntaxe que FileStorage (mots, "expressions", préfixes*); FTS5 replie lui-même les accents
+        from .search import locate, parse_query
+        terms = parse_query(query)
+        if not terms:
+            return []
+        if self.fts:
+            # Chaque élément entre guillemets (pas de syntaxe FTS5 involontaire)
+            match = " ".join(f'"{" ".join(t.raw)}"' + ("*" if t.prefix else "") for t in terms)
+            # Classement dans FTS5, extrait calculé en Python: snippet() retokenise
+            # toute la page et coûte des secondes sur une page de plusieurs Mo.
+            rows = self.conn.execute("""
+                SELECT p.notebook_id, n.title, p.idx, p.content
+                FROM (SELECT rowid, rank FROM pages_fts WHERE pages_fts MATCH ? ORDER BY rank LIMIT ?) hit
+                JOIN pages p ON p.id = hit.rowid
+                JOIN notebooks n ON n.id = p.notebook_id
+                ORDER BY hit.rank
+            """, (match, limit))
+        else:
+            where = " AND ".join("lower(p.content) LIKE ?" for _ in terms)
+            rows = self.conn.execute(f"""
+                SELECT p.notebook_id, n.title, p.idx, p.content
+                FROM pages p JOIN notebooks n ON n.id = p.notebook_id
+                WHERE {where} LIMIT ?
+            """, [f"%{' '.join(t.raw)}%" for t in terms] + [limit])
+        hits = []
+        for nid, title, idx, content in rows:
+            pos = locate(content, terms) or 0
+            hits.append({"path": self._key(nid), "title": title, "page": idx,
+                         "snippet": snippet_at(content, pos), "offset": pos})
+        return hits
+
+    def reindex(self, full: bool = False, workers: int | None = None):
+        """L'index FTS5 est tenu à jour par des triggers; `full` le reconstruit (rien à faire par étapes)."""
+        if full and self.fts:
+            with self.conn:
+                self.conn.execute("INSERT INTO pages_fts(pages_fts) VALUES ('rebuild')")
+        return None
+
+    def migrate_from(self, lib_dir: str) -> int:
+        """Importe une seule fois les carnets fichiers de `lib_dir`. Retourne le nombre importé."""
+        done = self.conn.execute("SELECT value FROM properties WHERE key = 'migrated_from'").fetchone()
+        if done is not None:
+            return 0
+        count = 0
+        with self.conn:
+            for name in sorted(os.listdir(lib_dir)) if os.path.isdir(lib_dir) else []:
+                if not is_notebook_file(name):
+                    continue
+                try:
+                    nb = Notebook.load(os.path.join(lib_dir, name))
+                except Exception:
+                    continue
+                try:
+                    self._insert(nb.to_dict(), os.path.splitext(name)[0])
+                finally:
+                    nb.close()
+                count += 1
+            self.conn.execute("INSERT INTO properties(key, value) VALUES ('migrated_from', ?)", (lib_dir,))
+        return count
+
+def open_storage():
+    """Stockage choisi par le réglage "storage" ("files" ou "sqlite")."""
+    if SETTINGS["storage"] == "sqlite":
+        storage = SqliteStorage(DB_PATH)
+        storage.migrate_from(LIB_DIR)
+        return storage
+    return FileStorage(LIB_DIR, LIBRARY)
+
@@ -0,0 +1,112 @@
+"""Mesures de latence optionnelles.
+
+Activées par la variable d'environnement FOLESKINE_DIAGNOSTICS=1 au
+lancement. Désactivées, `timed` rend la fonction décorée telle quelle: les
+points de mesure ne coûtent rien. FOLESKINE_PROFILE=<fichier> enregistre en
+plus un profil cProfile de toute la session (lisible avec `pstats`).
+
+Chaque mesure garde une fenêtre glissante des WINDOW derniers échantillons
+(millisecondes, ou octets pour les noms en ".bytes").
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENABLED = os.environ.get("FOLESKINE_DIAGNOSTICS", "") not in ("", "0")
+PROFILE_PATH = os.environ.get("FOLESKINE_PROFILE") or None
+WINDOW = 2000
+
+_samples: dict[str, deque] = {}
+_lock = threading.Lock()
+_profiler = None
+
+def record(name: str, value: float):
+    """Ajoute un échantillon (appelé aussi depuis le thread d'écriture)."""
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=WINDOW)).append(value)
+
+def timed(name: str):
+    """Décorateur: durée de chaque appel dans la mesure `name`, si les diagnostics sont actifs."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - t0) * 1000)
+        return wrapper
+    return decorate
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def summary() -> dict[str, dict]:
+    """p50 / p95 / max / total par mesure, sur la fenêtre glissante."""
+    result = {}
+    # Copies prises sous le verrou: le thread d'écriture peut ajouter des échantillons pendant le tri
+    with _lock:
+        copies = {name: list(series) for name, series in _samples.items()}
+    for name in sorted(copies):
+        values = sorted(copies[name])
+        if not values:
+            continue
+        result[name] = {
+            "unit": "bytes" if name.endswith(".bytes") else "ms",
+            "count": len(values),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "max": values[-1],
+            "total": sum(values),
+        }
+    return result
+
+def histogram(name: str, buckets: int = 10) -> list[tuple[float, int]]:
+    """Répartition des échantillons d'une mesure en `buckets` intervalles (borne haute, effectif)."""
+    with _lock:
+        values = list(_samples.get(name, ()))
+    values.sort()
+    if not values:
+        return []
+    low, high = values[0], values[-1]
+    width = (high - low) / buckets or 1
+    counts = [0] * buckets
+    for v in values:
+        counts[min(buckets - 1, int((v - low) / width))] += 1
+    return [(low + width * (i + 1), c) for i, c in enumerate(counts)]
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+def dump(path: str):
+    """Écrit le résumé et les échantillons bruts en JSON."""
+    with _lock:
+        raw = {name: list(series) for name, series in _samples.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "summary": summary(), "samples": raw},
+                  f, ensure_ascii=False, indent=2)
+
+def start_profiler():
+    """Démarre cProfile si FOLESKINE_PROFILE est défini."""
+    global _profiler
+    if PROFILE_PATH is None or _profiler is not None:
+        return
+    import cProfile
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+def stop_profiler():
+    """Arrête cProfile et écrit le profil dans FOLESKINE_PROFILE."""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler.dump_stats(PROFILE_PATH)
+    _profiler = None
@@ -0,0 +1,381 @@
+"""Historique des versions de pages.
+
+Chaque carnet a son historique dans HISTORY_DIR/<empreinte du chemin>.pack,
+un fichier JSON lignes où l'on ne fait qu'ajouter:
+    {"o": "<hash>", "text": "..."}                          objet complet
+    {"o": "<hash>", "base": "<hash>", "d": 3, "c": 120, "ops": [...]}  objet delta
+    {"p": 2, "t": 1756200000, "h": "<hash>"}                 version d'une page
+Les objets sont adressés par le contenu (blake2b du texte): revenir à un
+texte déjà connu n'ajoute qu'une ligne de version. Un delta décrit le texte
+à partir du précédent de la même page, comparé par phrases et par lignes:
+[i, j] recopie les caractères i..j de la base, une chaîne est insérée telle
+quelle. "d" est la longueur de la chaîne de deltas et "c" la taille cumulée
+de ses insertions; au-delà de MAX_DEPTH ou d'une fraction DELTA_RATIO du
+texte, l'objet est stocké complet.
+
+Une sauvegarde coûte donc un diff de chaque page modifiée contre sa version
+précédente (borné par MAX_DIFF_PIECES) et une seule écriture. La rétention
+est appliquée quand le pack est réécrit (trop de versions ajoutées ou taille
+dépassée): toutes les versions de la dernière heure, puis une par heure sur
+un jour, puis une par jour; les plus anciennes sont abandonnées tant que le
+pack dépasse le réglage "history_max_bytes". La dernière version de chaque
+page est toujours gardée.
+"""
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import diagnostics
+from .diagnostics import timed
+from .core import DATA_DIR, SETTINGS, durable_replace, sync_dir, sync_file
+
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
+PACK_EXT = ".pack"
+# Longueur maximale d'une chaîne de deltas avant un objet complet (borne la reconstruction)
+MAX_DEPTH = 256
+# Nouvel objet complet quand les deltas de la chaîne cumulés dépassent cette fraction du texte
+DELTA_RATIO = 0.5
+# Au-delà de ce nombre de morceaux différents de part et d'autre, pas de diff fin
+MAX_DIFF_PIECES = 2000
+# Versions ajoutées depuis la dernière réécriture au-delà desquelles on applique la rétention
+PRUNE_EVERY = 200
+# Nombre de carnets dont l'historique reste chargé en mémoire
+OPEN_LOGS = 4
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _pieces(text: str) -> list[str]:
+    # Découpe en lignes et en phrases: un paragraphe modifié ne coûte que sa phrase
+    return [p for p in re.split(r"(?<=[\n.!?])", text) if p]
+
+def _common_prefix(a: str, b: str) -> int:
+    # Recherche dichotomique: les comparaisons de tranches se font en C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def make_delta(base: str, text: str) -> list:
+    """Opérations qui transforment `base` en `text`: [i, j] recopie base[i:j], une chaîne est insérée."""
+    # Préfixe et suffixe communs d'abord, ramenés à une fin de ligne ou de phrase:
+    # une retouche locale d'une grande page ne découpe que la zone modifiée
+    start = _common_prefix(base, text)
+    start = max(base.rfind(c, 0, start) for c in "\n.!?") + 1
+    end = _common_suffix(base, text, min(len(base), len(text)) - start)
+    cut = len(base) - end
+    if 0 < cut < len(base):
+        cut = min((i + 1 for i in (base.find(c, cut - 1) for c in "\n.!?") if 0 <= i < len(base) - 1),
+                  default=len(base))
+    end = len(base) - cut
+    ops = [[0, start]] if start else []
+    a, b = _pieces(base[start:cut]), _pieces(text[start:len(text) - end])
+    if len(a) <= MAX_DIFF_PIECES and len(b) <= MAX_DIFF_PIECES:
+        offsets = [start]
+        for piece in a:
+            offsets.append(offsets[-1] + len(piece))
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+            if tag == "equal":
+                ops.append([offsets[i1], offsets[i2]])
+            elif j2 > j1:
+                ops.append("".join(b[j1:j2]))
+    elif b:
+        # Réécriture étendue: le diff coûterait trop cher (quadratique), le milieu est stocké tel quel
+        ops.append("".join(b))
+    if end:
+        ops.append([cut, len(base)])
+    return ops
+
+def apply_delta(base: str, ops: list) -> str:
+    return "".join(base[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+def delta_size(ops: list) -> int:
+    return sum(len(op) if isinstance(op, str) else 8 for op in ops)
+
+def retained(versions: list[dict], now: float) -> list[dict]:
+    """Versions gardées par la rétention par tranches de temps (ordre chronologique conservé)."""
+    keep, seen = [], set()
+    for v in reversed(versions):
+        age = now - v["t"]
+        if age < HOUR:
+            bucket = None
+        elif age < DAY:
+            bucket = (v["p"], "h", int(v["t"] // HOUR))
+        else:
+            bucket = (v["p"], "d", int(v["t"] // DAY))
+        latest = (v["p"], "latest")
+        if latest not in seen:
+            # Dernière version de la page: toujours gardée
+            seen.add(latest)
+        elif bucket is not None:
+            # Versions plus récentes vues d'abord: on garde la dernière de chaque tranche
+            if bucket in seen:
+                continue
+            seen.add(bucket)
+        keep.append(v)
+    keep.reverse()
+    return keep
+
+class PageLog:
+    """Historique chargé d'un carnet: objets par hash et versions dans l'ordre d'écriture."""
+
+    def __init__(self, pack_path: str | None):
+        self.pack_path = pack_path
+        self.objects: dict[str, dict] = {}
+        self.versions: list[dict] = []
+        self.size = 0
+        self.appended = 0
+        # Dernier texte connu de chaque page (base du prochain delta)
+        self._last: dict[int, tuple[str, str]] = {}
+        if pack_path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            f = open(self.pack_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                self.size += len(line)
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Ligne tronquée par un arrêt en pleine écriture
+                    continue
+                if "o" in rec:
+                    self.objects[rec["o"]] = rec
+                elif rec.get("h") in self.objects:
+                    self.versions.append(rec)
+
+    def text(self, h: str, known: dict[str, str] | None = None) -> str:
+        """Texte d'un objet; la chaîne de deltas s'arrête au premier texte de `known`."""
+        chain = []
+        obj = self.objects[h]
+        while "text" not in obj and not (known and obj["o"] in known):
+            chain.append(obj["ops"])
+            obj = self.objects[obj["base"]]
+        text = obj["text"] if "text" in obj else known[obj["o"]]
+        for ops in reversed(chain):
+            text = apply_delta(text, ops)
+        return text
+
+    def latest(self, page: int) -> tuple[str, str] | None:
+        """(hash, texte) de la dernière version de `page`, None si elle n'en a pas."""
+        if page not in self._last:
+            h = next((v["h"] for v in reversed(self.versions) if v["p"] == page), None)
+            if h is None:
+                return None
+            self._last[page] = (h, self.text(h))
+        return self._last[page]
+
+    def encode(self, h: str, text: str, base: tuple[str, str] | None) -> dict:
+        """Objet pour `text`: delta contre `base` si la chaîne et la taille le permettent."""
+        if base is not None:
+            parent = self.objects[base[0]]
+            depth = parent.get("d", 0) + 1
+            if depth <= MAX_DEPTH:
+                ops = make_delta(base[1], text)
+                cost = parent.get("c", 0) + delta_size(ops)
+                if cost < DELTA_RATIO * len(text):
+                    return {"o": h, "base": base[0], "d": depth, "c": cost, "ops": ops}
+        return {"o": h, "text": text}
+
+    def add(self, pages: dict[int, str], now: float, previous: dict[int, str] | None = None) -> list[dict]:
+        """Enregistre les nouvelles versions en mémoire; retourne les lignes à ajouter au pack.
+
+        `previous` donne le texte d'avant la modification: il devient la première
+        version d'une page qui n'a pas encore d'historique.
+        """
+        records = []
+        for page, text in sorted(pages.items()):
+            if previous and previous.get(page) and self.latest(page) is None:
+                records += self.add({page: previous[page]}, now)
+            h = text_hash(text)
+            last = self.latest(page)
+            if last is not None and last[0] == h:
+                continue
+            if h not in self.objects:
+                obj = self.encode(h, text, last)
+                self.objects[h] = obj
+                records.append(obj)
+            version = {"p": page, "t": int(now), "h": h}
+            self.versions.append(version)
+            records.append(version)
+            self._last[page] = (h, text)
+        return records
+
+    def rebuild(self, now: float, max_bytes: int) -> list[dict]:
+        """Applique la rétention et réencode les versions gardées; retourne le contenu du pack."""
+        versions = retained(self.versions, now)
+        while True:
+            log = PageLog(None)
+            records = []
+            # Textes déjà reconstruits (le précédent de chaque page): les chaînes s'y arrêtent
+            known: dict[str, str] = {}
+            for v in versions:
+                last = log._last.get(v["p"])
+                text = self.text(v["h"], known)
+                if last is not None:
+                    known.pop(last[0], None)
+                known[v["h"]] = text
+                if v["h"] not in log.objects:
+                    obj = self.objects[v["h"]]
+                    if last is not None and obj.get("base") == last[0]:
+                        # Base toujours là: le delta est repris tel quel, sans refaire le diff
+                        parent = log.objects[last[0]]
+                        obj = dict(obj, d=parent.get("d", 0) + 1, c=parent.get("c", 0) + delta_size(obj["ops"]))
+                        if obj["d"] > MAX_DEPTH or obj["c"] >= DELTA_RATIO * len(text):
+                            obj = log.encode(v["h"], text, None)
+                    else:
+                        obj = log.encode(v["h"], text, last)
+                    log.objects[v["h"]] = obj
+                    records.append(obj)
+                log._last[v["p"]] = (v["h"], text)
+                records.append(v)
+            size = sum(len(json.dumps(r, ensure_ascii=False).encode("utf-8")) + 1 for r in records)
+            latest = {v["p"]: v for v in versions}
+            droppable = [v for v in versions if latest[v["p"]] is not v]
+            if size <= max_bytes or not droppable:
+                break
+            # Trop gros: abandonner le quart le plus ancien des versions non récentes
+            dropped = {id(v) for v in droppable[:max(1, len(droppable) // 4)]}
+            versions = [v for v in versions if id(v) not in dropped]
+        self.objects, self.versions = log.objects, versions
+        self._last = log._last
+        self.size = size
+        self.appended = 0
+        return records
+
+class PageHistory:
+    """Historique des pages de tous les carnets, sûr entre le thread Tk et le thread d'écriture."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._logs: OrderedDict[str, PageLog] = OrderedDict()
+
+    def pack_path(self, key: str) -> str:
+        name = hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+        return os.path.join(self.root, name + PACK_EXT)
+
+    def _log(self, key: str) -> PageLog:
+        log = self._logs.get(key)
+        if log is None:
+            log = self._logs[key] = PageLog(self.pack_path(key))
+            while len(self._logs) > OPEN_LOGS:
+                self._logs.popitem(last=False)
+        self._logs.move_to_end(key)
+        return log
+
+    @timed("history.record")
+    def record(self, key: str, pages: dict[int, str], previous: dict[int, str] | None = None,
+               now: float | None = None):
+        """Ajoute une version de chaque page de `pages` ({index: texte}) qui a changé (voir PageLog.add)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            log = self._log(key)
+            records = log.add(pages, now, previous)
+            if not records:
+                return
+            max_bytes = SETTINGS["history_max_bytes"]
+            log.appended += sum(1 for r in records if "p" in r)
+            if log.appended >= PRUNE_EVERY or log.size > max_bytes:
+                self._write(log, log.rebuild(now, max_bytes))
+            else:
+                log.size = self._append(log.pack_path, records)
+
+    def _append(self, pack_path: str, records: list[dict]) -> int:
+        chunk = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        os.makedirs(self.root, exist_ok=True)
+        with open(pack_path, "a+b") as f:
+            # Après un crash en pleine écriture, repartir sur une ligne propre
+            created = f.seek(0, os.SEEK_END) == 0
+            if not created:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    chunk = b"\n" + chunk
+            f.write(chunk)
+            if diagnostics.ENABLED:
+                diagnostics.record("history.bytes", len(chunk))
+            sync_file(f, batch=True)
+            if created:
+                sync_dir(pack_path)
+            return f.tell()
+
+    def _write(self, log: PageLog, records: list[dict]):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = log.pack_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            sync_file(f)
+        durable_replace(tmp, log.pack_path)
+
+    def compact(self, key: str, now: float | None = None):
+        """Applique tout de suite la rétention à l'historique d'un carnet."""
+        now = time.time() if now is None else now
+        with self._lock:
+            log = self._log(key)
+            if log.versions:
+                self._write(log, log.rebuild(now, SETTINGS["history_max_bytes"]))
+
+    def versions(self, key: str, page: int) -> list[dict]:
+        """Versions de `page`, de la plus récente à la plus ancienne: {"t", "h", "delta"}."""
+        with self._lock:
+            log = self._log(key)
+            result = []
+            for v in reversed([v for v in log.versions if v["p"] == page]):
+                obj = log.objects[v["h"]]
+                result.append({"t": v["t"], "h": v["h"], "delta": "base" in obj})
+            return result
+
+    def pages(self, key: str) -> list[int]:
+        with self._lock:
+            return sorted({v["p"] for v in self._log(key).versions})
+
+    def text(self, key: str, h: str) -> str:
+        with self._lock:
+            return self._log(key).text(h)
+
+    def rename(self, old_key: str, new_key: str):
+        """Suit le carnet renommé (l'historique est rangé par chemin)."""
+        with self._lock:
+            self._logs.pop(old_key, None)
+            self._logs.pop(new_key, None)
+            try:
+                os.replace(self.pack_path(old_key), self.pack_path(new_key))
+            except FileNotFoundError:
+                pass
+
+    def forget(self, key: str):
+        with self._lock:
+            self._logs.pop(key, None)
+            try:
+                os.remove(self.pack_path(key))
+            except FileNotFoundError:
+                pass
+
+HISTORY = PageHistory(HISTORY_DIR)
@@ -0,0 +1,719 @@
+"""Index de recherche plein texte des carnets fichiers, sans base de données.
+
+Index inversé sur disque, dans SEARCH_DIR:
+    index.json          en-tête: carnets indexés {chemin: [id, empreinte, nb de pages]},
+                        termes triés et position de leurs postings
+    postings-<n>.bin    postings de chaque terme, bout à bout: couples (id du carnet, page) en uint32
+    journal-<n>.jsonl   mises à jour depuis la dernière fusion, une ligne chacune:
+        {"d": chemin, "s": empreinte, "n": 12, "p": {"3": "mot mot ..."}}   pages remplacées
+        {"d": chemin, ..., "reset": true}   carnet réindexé en entier
+        {"forget": chemin}    {"mv": ancien, "to": nouveau}
+Les termes sont les mots repliés (minuscules, sans accents, œ → oe): "Été"
+et "ete" sont le même terme. Chaque sauvegarde ajoute au journal les pages
+modifiées (voir core.index_pages). Le journal est réécrit quand il ne
+contient plus guère que des pages remplacées depuis, et fusionné dans de
+nouveaux postings quand ses pages dépassent MERGE_BYTES: les fichiers de la
+génération suivante sont écrits à côté, l'en-tête est remplacé en dernier.
+
+L'empreinte d'un carnet (mtime, taille, journal) est celle du manifeste de
+la bibliothèque: un carnet modifié hors de l'application, importé ou jamais
+vu est réindexé avant la recherche (IndexBuild). Un journal tronqué ou un
+en-tête illisible ne coûtent donc qu'une réindexation; le journal n'est
+pas synchronisé sur le disque.
+
+Requêtes: des mots (tous requis), des "expressions exactes" et des
+préfixes* (un mot collé à une apostrophe, "l'été", est une expression). Les
+expressions sont vérifiées sur le texte des pages candidates.
+"""
+import bisect
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .diagnostics import timed
+from .core import (DATA_DIR, LIB_DIR, Notebook, disk_state, durable_replace, fold_text, process_pool, snippet_at,
+                   sync_file)
+
+SEARCH_DIR = os.path.join(DATA_DIR, "search")
+HEADER = "index.json"
+VERSION = 1
+# Journal réécrit au-delà de cette taille s'il fait plus du double de ses pages encore vivantes
+JOURNAL_MAX = 1024 * 1024
+# Termes des pages du journal au-delà desquels elles sont fusionnées dans les postings
+MERGE_BYTES = 4 * 1024 * 1024
+# Mots plus longs non indexés (empreintes, base64…)
+MAX_TERM = 64
+# En dessous de ce nombre de carnets à indexer, démarrer des processus coûte plus cher
+POOL_MIN = 16
+
+WORD = re.compile(r"\w+")
+QUERY = re.compile(r'"([^"]*)"?(\*?)|([^\s"]+)')
+# Ligatures repliées en deux lettres: "oeuvre" trouve "œuvre"
+LIGATURES = {"oe": "œ", "ae": "æ", "ss": "ß"}
+
+# ---------------------- Termes ----------------------
+def _nfc(text: str) -> str:
+    # Un texte décomposé (e + accent combinant) couperait les mots en deux
+    if text.isascii() or unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+@functools.lru_cache(maxsize=65536)
+def fold_word(word: str) -> str:
+    """Terme d'un mot: minuscules sans accents, ligatures développées."""
+    if word.isascii():
+        return word.lower()
+    return fold_text(word).replace("œ", "oe").replace("æ", "ae")
+
+def page_terms(text: str) -> frozenset[str]:
+    """Termes distincts d'une page (chaque mot distinct n'est replié qu'une fois)."""
+    # Découper d'abord aux blancs (split) est deux fois plus rapide qu'un findall sur toute la page:
+    # le texte naturel a peu de morceaux distincts, seuls ceux-là passent par la regex
+    words = set()
+    for chunk in set(_nfc(text).lower().split()):
+        words.update(WORD.findall(chunk))
+    return frozenset(fold_word(w) for w in words if len(w) <= MAX_TERM)
+
+@functools.lru_cache(maxsize=None)
+def _variants() -> dict[str, str]:
+    # Lettres latines accentuées regroupées par lettre repliée: {"e": "èéêëÈÉÊË…", …}
+    out: dict[str, str] = {}
+    for cp in range(0xC0, 0x250):
+        c = chr(cp)
+        folded = fold_word(c)
+        if len(folded) == 1 and folded != c:
+            out[folded] = out.get(folded, "") + c
+    return out
+
+def _char_pattern(c: str) -> str:
+    variants = _variants().get(c)
+    return f"[{re.escape(c)}{variants}]" if variants else re.escape(c)
+
+def _word_pattern(word: str) -> str:
+    out, i = [], 0
+    while i < len(word):
+        pair = word[i:i + 2]
+        if pair in LIGATURES:
+            out.append(f"(?:{LIGATURES[pair]}|{_char_pattern(pair[0])}{_char_pattern(pair[1])})")
+            i += 2
+        else:
+            out.append(_char_pattern(word[i]))
+            i += 1
+    return "".join(out)
+
+class Term:
+    """Élément d'une requête: un mot, une expression ou un préfixe (dernier mot suivi de *).
+
+    `words` sont les termes repliés cherchés dans l'index, `raw` les mots en
+    minuscules (pour FTS5); `pattern` retrouve l'élément dans le texte
+    d'origine, accents et ligatures compris.
+    """
+    __slots__ = ("raw", "words", "prefix", "pattern")
+
+    def __init__(self, words: list[str], prefix: bool = False):
+        self.raw = [w.lower() for w in words]
+        self.words = [fold_word(w) for w in self.raw]
+        self.prefix = prefix
+        body = r"\W+".join(_word_pattern(w) for w in self.words)
+        self.pattern = re.compile(r"(?<!\w)" + body + ("" if prefix else r"(?!\w)"), re.IGNORECASE)
+
+    @property
+    def exact(self) -> bool:
+        """Un seul mot: l'index suffit, le texte n'a pas à être vérifié."""
+        return len(self.words) == 1
+
+def parse_query(query: str) -> list[Term]:
+    terms = []
+    for m in QUERY.finditer(query):
+        chunk = m.group(1) if m.group(1) is not None else m.group(3)
+        words = WORD.findall(_nfc(chunk))
+        if words:
+            terms.append(Term(words, bool(m.group(2)) or chunk.rstrip().endswith("*")))
+    return terms
+
+def locate(text: str, terms: list[Term]) -> int | None:
+    """Position de la première occurrence trouvée, None si une expression manque dans le texte."""
+    text = _nfc(text)
+    first = None
+    for term in terms:
+        m = term.pattern.search(text)
+        if m is None:
+            if term.exact:
+                # Mot présent d'après l'index mais écrit autrement (ex: ligature "ﬁ")
+                continue
+            return None
+        if first is None or m.start() < first:
+            first = m.start()
+    return first or 0
+
+def notebook_sig(disk: tuple | None) -> list | None:
+    """Empreinte d'un carnet comparable au manifeste: [mtime, taille, journal]."""
+    if disk is None:
+        return None
+    return [disk[1], disk[2], list(disk[3]) if disk[3] is not None else None]
+
+def entry_sig(entry: dict) -> list:
+    return [entry.get("mtime"), entry.get("size"), entry.get("journal")]
+
+# ---------------------- Index ----------------------
+class _Doc:
+    """Carnet indexé: ses postings de base (par id) et ses pages réindexées depuis (journal)."""
+    __slots__ = ("path", "id", "sig", "count", "pages", "reset")
+
+    def __init__(self, path: str, doc_id: int, sig: list | None, count: int):
+        self.path = path
+        self.id = doc_id
+        self.sig = sig
+        self.count = count
+        self.pages: dict[int, frozenset[str]] = {}
+        # Vrai si toutes les pages de base sont remplacées (carnet réindexé en entier)
+        self.reset = False
+
+class SearchIndex:
+    """Index inversé des carnets de `lib_dir`, sûr entre le thread Tk et le thread d'écriture."""
+
+    def __init__(self, root: str, lib_dir: str):
+        self.root = root
+        self.lib_dir = os.path.abspath(lib_dir)
+        self._lock = threading.RLock()
+        self._loaded = False
+        # Reconstructions en cours: pas de fusion automatique pendant ce temps
+        self._building = 0
+
+    def _owns(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == self.lib_dir
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @property
+    def _postings_path(self) -> str:
+        return self._path(f"postings-{self._gen}.bin")
+
+    @property
+    def _journal_path(self) -> str:
+        return self._path(f"journal-{self._gen}.jsonl")
+
+    # -- chargement --
+    def _load(self):
+        if self._loaded:
+            return
+        self._docs: dict[str, _Doc] = {}
+        self._by_id: dict[int, _Doc] = {}
+        # État des postings de base: {id: (chemin, empreinte, nb de pages)}
+        self._base: dict[int, tuple[str, list | None, int]] = {}
+        self._terms: list[str] = []
+        self._offsets: list[int] = [0]
+        self._gen = 0
+        self._next_id = 0
+        # Postings des pages du journal: {terme: {(id, page)}}
+        self._live: dict[str, set[tuple[int, int]]] = {}
+        self._live_bytes = 0
+        self._journal_bytes = 0
+        try:
+            with open(self._path(HEADER), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            header = None
+        if isinstance(header, dict) and header.get("version") == VERSION:
+            self._gen = header["gen"]
+            self._next_id = header["next_id"]
+            self._terms = header["terms"]
+            self._offsets = header["offsets"]
+            for path, (doc_id, sig, count) in header["docs"].items():
+                self._base[doc_id] = (path, sig, count)
+                self._add_doc(path, doc_id, sig, count)
+        self._loaded = True
+        self._replay()
+        self._cleanup()
+
+    def _replay(self):
+        try:
+            with open(self._journal_path, "rb") as f:
+                for line in f:
+                    self._journal_bytes += len(line)
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        # Dernière ligne tronquée par un arrêt brutal
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def _cleanup(self):
+        # Fichiers d'une autre génération (fusion interrompue, ou ancienne génération)
+        keep = {HEADER, os.path.basename(self._postings_path), os.path.basename(self._journal_path)}
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name not in keep and (name.startswith(("postings-", "journal-")) or name.endswith(".tmp")):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    # -- état en mémoire --
+    def _add_doc(self, path: str, doc_id: int, sig: list | None, count: int) -> _Doc:
+        doc = self._docs[path] = self._by_id[doc_id] = _Doc(path, doc_id, sig, count)
+        return doc
+
+    def _put_page(self, doc: _Doc, page: int, terms: frozenset[str]):
+        old = doc.pages.get(page, frozenset())
+        ref = (doc.id, page)
+        for t in old - terms:
+            refs = self._live[t]
+            refs.discard(ref)
+            if not refs:
+                del self._live[t]
+            self._live_bytes -= len(t) + 1
+        for t in terms - old:
+            self._live.setdefault(t, set()).add(ref)
+            self._live_bytes += len(t) + 1
+        doc.pages[page] = terms
+
+    def _drop_page(self, doc: _Doc, page: int):
+        self._put_page(doc, page, frozenset())
+        del doc.pages[page]
+
+    def _set_pages(self, path: str, sig: list | None, count: int, pages: dict[int, frozenset[str]],
+                   reset: bool = False):
+        doc = self._docs.get(path)
+        if doc is None:
+            doc = self._add_doc(path, self._next_id, None, 0)
+            self._next_id += 1
+        if reset:
+            for page in list(doc.pages):
+                self._drop_page(doc, page)
+            doc.reset = True
+        for page, terms in pages.items():
+            if page < count:
+                self._put_page(doc, page, terms)
+        for page in [p for p in doc.pages if p >= count]:
+            self._drop_page(doc, page)
+        doc.count = count
+        doc.sig = sig
+
+    def _forget(self, path: str) -> bool:
+        doc = self._docs.pop(path, None)
+        if doc is None:
+            return False
+        for page in list(doc.pages):
+            self._drop_page(doc, page)
+        del self._by_id[doc.id]
+        return True
+
+    def _rename(self, old: str, new: str) -> bool:
+        doc = self._docs.pop(old, None)
+        if doc is None:
+            return False
+        self._forget(new)
+        doc.path = new
+        self._docs[new] = doc
+        return True
+
+    def _apply(self, rec: dict):
+        if "forget" in rec:
+            self._forget(rec["forget"])
+        elif "mv" in rec:
+            self._rename(rec["mv"], rec["to"])
+        else:
+            pages = {int(k): frozenset(v.split()) for k, v in rec.get("p", {}).items()}
+            self._set_pages(rec["d"], rec["s"], rec["n"], pages, rec.get("reset", False))
+
+    def _visible(self, doc_id: int, page: int) -> bool:
+        # Une page de base compte si son carnet existe encore et qu'elle n'a pas été réindexée
+        doc = self._by_id.get(doc_id)
+        return doc is not None and not doc.reset and page not in doc.pages and page < doc.count
+
+    def _masked_ids(self) -> set[int]:
+        """Ids dont certaines pages de base ne comptent plus (carnet oublié, réindexé, raccourci)."""
+        masked = set()
+        for doc_id, (_path, _sig, count) in self._base.items():
+            doc = self._by_id.get(doc_id)
+            if doc is None or doc.reset or doc.pages or doc.count < count:
+                masked.add(doc_id)
+        return masked
+
+    # -- journal --
+    def _log(self, rec: dict):
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        os.makedirs(self.root, exist_ok=True)
+        # Pas de fsync: un journal perdu ne coûte qu'une réindexation (voir l'en-tête du module)
+        with open(self._journal_path, "ab") as f:
+            f.write(line)
+        self._journal_bytes += len(line)
+
+    @staticmethod
+    def _pages_record(doc: _Doc) -> dict:
+        return {str(p): " ".join(sorted(terms)) for p, terms in doc.pages.items()}
+
+    def _rewrite_journal(self):
+        """Réécrit le journal avec le seul état courant (les versions remplacées disparaissent)."""
+        records, renamed = [], []
+        for doc_id, (path, _sig, _count) in self._base.items():
+            doc = self._by_id.get(doc_id)
+            if doc is None:
+                records.append({"forget": path})
+            elif doc.path != path:
+                renamed.append((path, doc.path, f"\0{doc_id}"))
+        # En deux temps: des renommages croisés ne doivent pas s'écraser
+        records += [{"mv": old, "to": tmp} for old, _new, tmp in renamed]
+        records += [{"mv": tmp, "to": new} for _old, new, tmp in renamed]
+        for doc in self._docs.values():
+            base = self._base.get(doc.id)
+            if (base is None or doc.reset or doc.pages or doc.sig != base[1] or doc.count != base[2]):
+                rec = {"d": doc.path, "s": doc.sig, "n": doc.count, "p": self._pages_record(doc)}
+                if doc.reset:
+                    rec["reset"] = True
+                records.append(rec)
+        tmp = self._journal_path + ".tmp"
+        with open(tmp, "wb") as f:
+            for rec in records:
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._journal_bytes = f.tell()
+        os.replace(tmp, self._journal_path)
+
+    def _base_refs(self, f, i: int) -> array:
+        refs = array("I")
+        f.seek(self._offsets[i])
+        refs.frombytes(f.read(self._offsets[i + 1] - self._offsets[i]))
+        if sys.byteorder == "big":
+            refs.byteswap()
+        return refs
+
+    @timed("search.merge")
+    def _merge(self):
+        """Fusionne le journal dans les postings d'une nouvelle génération."""
+        gen = self._gen + 1
+        postings = self._path(f"postings-{gen}.bin")
+        masked = self._masked_ids()
+        positions = {t: i for i, t in enumerate(self._terms)}
+        terms, offsets = [], [0]
+        os.makedirs(self.root, exist_ok=True)
+        src = open(self._postings_path, "rb") if self._terms else None
+        try:
+            with open(postings, "wb") as out:
+                for term in sorted(positions.keys() | self._live.keys()):
+                    refs = array("I")
+                    i = positions.get(term)
+                    if i is not None:
+                        base = self._base_refs(src, i)
+                        if masked.isdisjoint(base[0::2]):
+                            refs = base
+                        else:
+                            for doc_id, page in zip(base[0::2], base[1::2]):
+                                if doc_id not in masked or self._visible(doc_id, page):
+                                    refs.extend((doc_id, page))
+                    for doc_id, page in self._live.get(term, ()):
+                        refs.extend((doc_id, page))
+                    if not refs:
+                        continue
+                    if sys.byteorder == "big":
+                        refs.byteswap()
+                    out.write(refs.tobytes())
+                    terms.append(term)
+                    offsets.append(out.tell())
+                sync_file(out)
+        finally:
+            if src is not None:
+                src.close()
+        header = {"version": VERSION, "gen": gen, "next_id": self._next_id,
+                  "docs": {d.path: [d.id, d.sig, d.count] for d in self._docs.values()},
+                  "terms": terms, "offsets": offsets}
+        tmp = self._path(HEADER + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False)
+            sync_file(f)
+        durable_replace(tmp, self._path(HEADER))
+        old = (self._postings_path, self._journal_path)
+        self._gen, self._terms, self._offsets = gen, terms, offsets
+        self._base = {d.id: (d.path, d.sig, d.count) for d in self._docs.values()}
+        for doc in self._docs.values():
+            doc.pages.clear()
+            doc.reset = False
+        self._live.clear()
+        self._live_bytes = 0
+        self._journal_bytes = 0
+        for path in old:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _maintain(self):
+        if self._building:
+            return
+        if self._live_bytes > MERGE_BYTES:
+            self._merge()
+        elif self._journal_bytes > max(JOURNAL_MAX, 2 * self._live_bytes):
+            self._rewrite_journal()
+
+    # -- mises à jour --
+    @timed("search.update")
+    def update(self, path: str, pages: dict[int, str], count: int, before: tuple | None, after: tuple | None):
+        """Pages `pages` ({index: texte}) d'un carnet qui vient d'être écrit, de `before` à `after` (disk_state).
+
+        L'empreinte n'est reprise que si l'index était à jour avant l'écriture;
+        sinon le carnet sera réindexé en entier à la prochaine recherche.
+        """
+        if after is None or not self._owns(path):
+            return
+        # Découpage en termes hors du verrou: c'est le plus long
+        terms = {i: page_terms(text) for i, text in pages.items()}
+        with self._lock:
+            self._load()
+            doc = self._docs.get(path)
+            fresh = doc is not None and doc.sig is not None and doc.sig == notebook_sig(before)
+            sig = notebook_sig(after) if fresh else None
+            self._set_pages(path, sig, count, terms)
+            self._log({"d": path, "s": sig, "n": count,
+                       "p": {str(i): " ".join(sorted(t)) for i, t in terms.items()}})
+            self._maintain()
+
+    def reindexed(self, path: str, sig: list | None, count: int, pages: dict[int, str], log: bool = True):
+        """Résultat d'une réindexation complète (voir IndexBuild): termes de chaque page non vide."""
+        with self._lock:
+            self._load()
+            if sig is None:
+                # Carnet disparu pendant la réindexation
+                if self._forget(path) and log:
+                    self._log({"forget": path})
+                return
+            self._set_pages(path, sig, count, {i: frozenset(s.split()) for i, s in pages.items()}, reset=True)
+            if log:
+                self._log({"d": path, "s": sig, "n": count, "p": {str(i): s for i, s in pages.items()},
+                           "reset": True})
+
+    def rename(self, old: str, new: str):
+        with self._lock:
+            self._load()
+            if not self._owns(new):
+                self.forget(old)
+            elif self._rename(old, new):
+                self._log({"mv": old, "to": new})
+
+    def forget(self, path: str):
+        with self._lock:
+            self._load()
+            if self._forget(path):
+                self._log({"forget": path})
+
+    def stale(self, entries: list[dict], full: bool = False) -> list[str]:
+        """Chemins à (ré)indexer pour que l'index corresponde au manifeste; les carnets disparus sont oubliés."""
+        with self._lock:
+            self._load()
+            paths = {e["path"] for e in entries}
+            for path in [p for p in self._docs if p not in paths]:
+                self.forget(path)
+            if full:
+                return [e["path"] for e in entries]
+            return [e["path"] for e in entries
+                    if e["path"] not in self._docs or self._docs[e["path"]].sig != entry_sig(e)]
+
+    def begin_build(self):
+        with self._lock:
+            self._building += 1
+
+    def end_build(self, full: bool):
+        with self._lock:
+            self._building -= 1
+            if full:
+                # Reconstruction complète: rien n'a été journalisé, tout part dans une nouvelle génération
+                self._merge()
+            else:
+                self._maintain()
+
+    # -- requêtes --
+    def _word_refs(self, f, word: str, prefix: bool, masked: set[int]) -> set[tuple[int, int]]:
+        lo = bisect.bisect_left(self._terms, word)
+        if prefix:
+            hi = bisect.bisect_left(self._terms, word + "\U0010ffff", lo)
+        else:
+            hi = lo + 1 if lo < len(self._terms) and self._terms[lo] == word else lo
+        refs: set[tuple[int, int]] = set()
+        for i in range(lo, hi):
+            base = self._base_refs(f, i)
+            pairs = zip(base[0::2], base[1::2])
+            if masked.isdisjoint(base[0::2]):
+                refs.update(pairs)
+            else:
+                refs.update(r for r in pairs if r[0] not in masked or self._visible(*r))
+        if prefix:
+            for t, live in self._live.items():
+                if t.startswith(word):
+                    refs |= live
+        else:
+            refs |= self._live.get(word, set())
+        return refs
+
+    def candidates(self, terms: list[Term]) -> dict[str, list[int]]:
+        """Pages contenant tous les mots de la requête: {chemin: [pages]} (expressions non vérifiées)."""
+        words: dict[str, bool] = {}
+        for term in terms:
+            for k, word in enumerate(term.words):
+                prefix = term.prefix and k == len(term.words) - 1
+                words[word] = words.get(word, False) or prefix
+        with self._lock:
+            self._load()
+            masked = self._masked_ids()
+            hits = None
+            f = open(self._postings_path, "rb") if self._terms else None
+            try:
+                for word, prefix in words.items():
+                    refs = self._word_refs(f, word, prefix, masked)
+                    hits = refs if hits is None else hits & refs
+                    if not hits:
+                        return {}
+            finally:
+                if f is not None:
+                    f.close()
+            found: dict[str, list[int]] = {}
+            for doc_id, page in hits:
+                found.setdefault(self._by_id[doc_id].path, []).append(page)
+        return found
+
+    @timed("search.query")
+    def search(self, terms: list[Term], entries: list[dict], limit: int = 50) -> list[dict]:
+        """Résultats au format de FileStorage.search, carnets modifiés le plus récemment d'abord."""
+        found = self.candidates(terms)
+        order = sorted((e for e in entries if e["path"] in found), key=lambda e: e.get("updated_at") or "",
+                       reverse=True)
+        hits = []
+        for entry in order:
+            try:
+                nb = Notebook.load(entry["path"])
+            except Exception:
+                continue
+            try:
+                pages = nb.data["pages"]
+                for page in sorted(found[entry["path"]]):
+                    if page >= len(pages):
+                        continue
+                    text = pages[page]
+                    pos = locate(text, terms)
+                    if pos is None:
+                        continue
+                    hits.append({"path": nb.path, "title": nb.title, "page": page,
+                                 "snippet": snippet_at(text, pos), "offset": pos})
+                    if len(hits) >= limit:
+                        return hits
+            finally:
+                nb.close()
+        return hits
+
+SEARCH = SearchIndex(SEARCH_DIR, LIB_DIR)
+_INDEXES: dict[str, SearchIndex] = {}
+
+def index_for(lib_dir: str) -> SearchIndex:
+    """Index d'un dossier de carnets: SEARCH pour LIB_DIR, sinon un index rangé à côté du dossier."""
+    lib_dir = os.path.abspath(lib_dir)
+    if lib_dir == SEARCH.lib_dir:
+        return SEARCH
+    index = _INDEXES.get(lib_dir)
+    if index is None:
+        index = _INDEXES[lib_dir] = SearchIndex(lib_dir + ".search", lib_dir)
+    return index
+
+# ---------------------- Réindexation ----------------------
+def _index_notebook(path: str):
+    """Termes de chaque page non vide d'un carnet (exécuté dans un processus du pool)."""
+    sig = notebook_sig(disk_state(path))
+    try:
+        nb = Notebook.load(path)
+    except Exception as e:
+        return path, sig, 0, {}, str(e)
+    try:
+        pages = nb.data["pages"]
+        terms = {i: " ".join(sorted(page_terms(text))) for i, text in enumerate(pages) if text}
+        return path, sig, len(pages), terms, None
+    finally:
+        nb.close()
+
+class IndexBuild:
+    """(Ré)indexe des carnets par étapes, via un pool de processus au-delà de POOL_MIN carnets.
+
+    Même protocole que transfer.BulkImport (`step`, `done`, `total`, `close`):
+    l'interface l'avance depuis `after` avec une barre de progression. Une
+    reconstruction complète (`full`) n'écrit rien avant la fin, où tout est
+    fusionné en une seule génération.
+    """
+
+    def __init__(self, index: SearchIndex, paths: list[str], full: bool = False, workers: int | None = None):
+        self.index = index
+        self.paths = list(paths)
+        self.full = full
+        self.total = len(self.paths)
+        self.done = 0
+        self.errors: list[tuple[str, str]] = []
+        self._next = iter(self.paths)
+        self._pool = None
+        self._pending = {}
+        self._open = True
+        index.begin_build()
+        if workers != 1 and self.total >= POOL_MIN:
+            workers = workers or os.cpu_count() or 1
+            self._pool = process_pool(workers)
+            self._max_pending = 4 * workers
+            self._fill()
+
+    @property
+    def finished(self) -> bool:
+        return self.done == self.total
+
+    def _fill(self):
+        while len(self._pending) < self._max_pending:
+            path = next(self._next, None)
+            if path is None:
+                return
+            self._pending[self._pool.submit(_index_notebook, path)] = path
+
+    def _finish(self, result):
+        path, sig, count, pages, error = result
+        self.done += 1
+        if error is not None:
+            # Illisible: retenu avec son empreinte pour ne pas être relu à chaque recherche
+            self.errors.append((path, error))
+        self.index.reindexed(path, sig, count, pages, log=not self.full)
+
+    def step(self, timeout: float | None = 0.05) -> bool:
+        """Indexe des carnets pendant au plus `timeout` secondes (None: jusqu'à la fin)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if self._pool is None:
+                self._finish(_index_notebook(next(self._next)))
+            else:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _ = wait(self._pending, remaining, FIRST_COMPLETED)
+                for future in ready:
+                    path = self._pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = (path, None, 0, {}, str(e))
+                    self._finish(result)
+                self._fill()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if self.finished:
+            self.close()
+        return self.finished
+
+    def close(self):
+        """Arrête le pool; une fois tout indexé, écrit l'index (fusion ou journal)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pending.clear()
+            self._pool = None
+        if self._open:
+            self._open = False
+            # Interrompue, une reconstruction complète n'est pas fusionnée: l'index reste valable
+            self.index.end_build(self.full and self.finished)
@@ -0,0 +1,745 @@
+"""Synchronisation des carnets entre plusieurs machines, page par page, via un petit serveur HTTP.
+
+Le serveur (SyncServer, `python -m foleskine sync-server`) ne garde que des
+manifestes de carnets et des pages adressées par leur contenu (history.text_hash):
+    {"rev": 12, "title": "...", "created_at": "...", "updated_at": "...", "pages": ["<hash>", ...]}
+    (+ "deleted": true pour un carnet supprimé)
+Chaque requête est un POST JSON (compressé en gzip au-delà de GZIP_MIN octets):
+    /v1/changes {"since": r, "keys": [...]}       -> {"rev": R, "notebooks": {clé: manifeste}}
+                                                     (révisés après r, plus ceux de "keys")
+    /v1/objects {"hashes": [...]}                  -> {"objects": {hash: texte}}
+    /v1/missing {"hashes": [...]}                  -> {"missing": [hash, ...]} (pages inconnues du serveur)
+    /v1/push    {"objects": {hash: texte}, "notebooks": {clé: manifeste sans "rev", + "base": r}}
+                -> {"rev": R, "applied": {clé: rev}, "conflicts": {clé: manifeste courant}}
+Un manifeste poussé n'est accepté que si "base" est la révision courante du
+carnet sur le serveur (0: carnet nouveau); sinon le client refusionne au tour suivant.
+
+Côté client (LibrarySync), la clé d'un carnet est son nom de fichier sans
+extension; si le même nom existe en .json et en .fnb, le second garde son
+extension dans sa clé. SYNC_DIR garde, pour chaque carnet, la révision du
+serveur, l'empreinte du fichier et le texte des pages à la dernière
+synchronisation: l'empreinte (disk_state) évite de relire les carnets
+inchangés, le texte sert de base aux fusions à trois voies (merge3, par
+lignes, page par page) quand un carnet a changé des deux côtés. "updated_at"
+départage les titres modifiés des deux côtés. Seules les pages que l'autre
+côté n'a pas voyagent, par lots bornés (BATCH_BYTES, HASHES_PER_REQUEST,
+NOTEBOOKS_PER_REQUEST), sur une connexion gardée ouverte. Un carnet supprimé
+d'un côté est supprimé de l'autre s'il n'y a pas changé depuis (le fichier
+part dans SYNC_DIR/trash), sinon il est recréé.
+"""
+import gzip
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .core import (CONTAINER_EXT, DATA_DIR, JOURNAL_SUFFIX, NotebookContainer, disk_state, durable_replace,
+                   index_pages, is_notebook_file, notebook_ext, notebook_stats, read_notebook_data, record_history,
+                   sync_file, write_json_atomic)
+from .history import text_hash
+from .search import notebook_sig
+from .transfer import validate_notebook
+
+SYNC_DIR = os.path.join(DATA_DIR, "sync")
+SERVER_DIR = os.path.join(DATA_DIR, "sync-server")
+DEFAULT_PORT = 8765
+# Lots: octets de pages par requête d'envoi, empreintes par requête, manifestes par requête
+BATCH_BYTES = 1024 * 1024
+HASHES_PER_REQUEST = 1000
+NOTEBOOKS_PER_REQUEST = 200
+# Corps de requête ou de réponse compressés au-delà de cette taille
+GZIP_MIN = 1024
+# Tours de synchronisation au plus quand un autre client pousse en même temps
+MAX_ROUNDS = 3
+_KEY_RE = re.compile(r"[\w-][\w.-]{0,199}")
+# Empreinte de page (history.text_hash): blake2b sur 16 octets, en hexadécimal
+_HASH_RE = re.compile(r"[0-9a-f]{32}")
+
+class SyncError(OSError):
+    """Serveur de synchronisation injoignable ou réponse invalide."""
+
+def valid_key(key) -> bool:
+    return isinstance(key, str) and _KEY_RE.fullmatch(key) is not None
+
+def valid_hash(h) -> bool:
+    return isinstance(h, str) and _HASH_RE.fullmatch(h) is not None
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        sync_file(f)
+    durable_replace(tmp, path)
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+# ---------------------- Fusion ----------------------
+# Une région modifiée différemment des deux côtés garde les deux versions entre ces marqueurs
+CONFLICT_MARKERS = ("<<<<<<< {}\n", "=======\n", ">>>>>>> {}\n")
+
+def _changes(base: list[str], other: list[str]) -> list[tuple[int, int, list[str]]]:
+    # Régions de la base remplacées dans l'autre version: (début, fin, nouvelles lignes)
+    from difflib import SequenceMatcher
+    matcher = SequenceMatcher(None, base, other, autojunk=False)
+    return [(i1, i2, other[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+def _apply(base: list[str], start: int, end: int, changes: list) -> list[str]:
+    out, pos = [], start
+    for i1, i2, lines in changes:
+        out += base[pos:i1] + lines
+        pos = i2
+    return out + base[pos:end]
+
+def _block(lines: list[str]) -> str:
+    text = "".join(lines)
+    return text if not text or text.endswith("\n") else text + "\n"
+
+def merge3(base: str, local: str, remote: str, labels: tuple[str, str] = ("local", "serveur")) -> tuple[str, bool]:
+    """Fusion à trois voies d'une page, par lignes. Retourne (texte, conflit).
+
+    Les régions modifiées d'un seul côté sont reprises telles quelles; une
+    région modifiée différemment des deux côtés garde les deux versions entre
+    CONFLICT_MARKERS, nommées par `labels`.
+    """
+    if local == remote or remote == base:
+        return local, False
+    if local == base:
+        return remote, False
+    b = base.splitlines(keepends=True)
+    changes = sorted([(*c, 0) for c in _changes(b, local.splitlines(keepends=True))]
+                     + [(*c, 1) for c in _changes(b, remote.splitlines(keepends=True))],
+                     key=lambda c: (c[0], c[1]))
+    out, pos, conflict, k = [], 0, False, 0
+    while k < len(changes):
+        # Groupe de changements qui se chevauchent ou se touchent
+        start, end = changes[k][0], changes[k][1]
+        group = [changes[k]]
+        k += 1
+        while k < len(changes) and changes[k][0] <= end:
+            end = max(end, changes[k][1])
+            group.append(changes[k])
+            k += 1
+        out += b[pos:start]
+        pos = end
+        sides = [[c[:3] for c in group if c[3] == side] for side in (0, 1)]
+        if not sides[1]:
+            out += _apply(b, start, end, sides[0])
+            continue
+        if not sides[0]:
+            out += _apply(b, start, end, sides[1])
+            continue
+        mine, theirs = _apply(b, start, end, sides[0]), _apply(b, start, end, sides[1])
+        if mine == theirs:
+            out += mine
+            continue
+        conflict = True
+        start_mark, sep, end_mark = CONFLICT_MARKERS
+        out.append(start_mark.format(labels[0]) + _block(mine) + sep + _block(theirs) + end_mark.format(labels[1]))
+    out += b[pos:]
+    return "".join(out), conflict
+
+def merge_notebook(base: dict | None, local: dict, remote: dict,
+                   labels: tuple[str, str] = ("local", "serveur")) -> tuple[dict, int]:
+    """Fusionne deux versions d'un carnet page par page. Retourne (carnet, nombre de pages en conflit).
+
+    Sans base (même nom créé des deux côtés avant la première synchronisation),
+    deux pages différentes au même rang sont en conflit. Les pages ajoutées des
+    deux côtés sont gardées: celles de cette machine d'abord.
+    """
+    lp, rp = local["pages"], remote["pages"]
+    bp = base["pages"] if base is not None else [""] * min(len(lp), len(rp))
+    n = len(bp)
+    pages, conflicts = [], 0
+    for i in range(min(n, max(len(lp), len(rp)))):
+        text, conflict = merge3(bp[i], lp[i] if i < len(lp) else bp[i], rp[i] if i < len(rp) else bp[i], labels)
+        pages.append(text)
+        conflicts += conflict
+    mine, theirs = lp[n:], rp[n:]
+    if mine[:len(theirs)] == theirs:
+        pages += mine
+    elif theirs[:len(mine)] == mine:
+        pages += theirs
+    else:
+        pages += mine + theirs
+    base_title = base.get("title") if base is not None else None
+    title = local["title"]
+    if title != remote["title"] and (title == base_title
+                                     or remote["title"] != base_title and remote["updated_at"] > local["updated_at"]):
+        # Renommé d'un seul côté, ou des deux: le plus récent l'emporte
+        title = remote["title"]
+    merged = dict(local, title=title, created_at=min(local["created_at"], remote["created_at"]),
+                  updated_at=max(local["updated_at"], remote["updated_at"]), pages=pages or [""])
+    return merged, conflicts
+
+# ---------------------- Serveur ----------------------
+class SyncStore:
+    """Données du serveur: manifestes dans state.json, pages dans objects/<2 caractères>/<hash>."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.state_path = os.path.join(root, "state.json")
+        self._lock = threading.Lock()
+        state = _read_json(self.state_path, {})
+        self.rev = state.get("rev", 0)
+        self.notebooks: dict[str, dict] = state.get("notebooks", {})
+
+    def _object_path(self, h: str) -> str:
+        # Empreintes venues du réseau: jamais de chemin arbitraire sous root
+        if not valid_hash(h):
+            raise ValueError(f"empreinte invalide: {h!r}")
+        return os.path.join(self.root, "objects", h[:2], h)
+
+    def _has(self, h: str) -> bool:
+        return os.path.exists(self._object_path(h))
+
+    def changes(self, since: int, keys: list[str] = ()) -> dict:
+        with self._lock:
+            found = {k: m for k, m in self.notebooks.items() if m["rev"] > since}
+            found.update((k, self.notebooks[k]) for k in keys if k in self.notebooks)
+            return {"rev": self.rev, "notebooks": found}
+
+    def objects(self, hashes: list[str]) -> dict:
+        found = {}
+        for h in hashes:
+            path = self._object_path(h)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    found[h] = f.read()
+            except (OSError, ValueError):
+                continue
+        return {"objects": found}
+
+    def missing(self, hashes: list[str]) -> dict:
+        return {"missing": [h for h in hashes if not self._has(h)]}
+
+    def _put(self, h: str, text: str):
+        if text_hash(text) != h:
+            raise ValueError(f"page {h}: empreinte incorrecte")
+        path = self._object_path(h)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            sync_file(f)
+        durable_replace(tmp, path)
+
+    def push(self, objects: dict[str, str], notebooks: dict[str, dict]) -> dict:
+        # Pages d'abord: un manifeste accepté ne désigne que des pages déjà sur disque
+        for h, text in objects.items():
+            self._put(h, text)
+        applied, conflicts = {}, {}
+        with self._lock:
+            for key, manifest in notebooks.items():
+                if not valid_key(key):
+                    raise ValueError(f"clé de carnet invalide: {key!r}")
+                current = self.notebooks.get(key)
+                if manifest.get("base", 0) != (current["rev"] if current else 0):
+                    conflicts[key] = current
+                    continue
+                if manifest.get("deleted"):
+                    entry = {"deleted": True, "pages": []}
+                else:
+                    pages = manifest["pages"]
+                    if not isinstance(pages, list) or not all(valid_hash(h) for h in pages):
+                        raise ValueError(f"{key}: 'pages' doit être une liste d'empreintes")
+                    missing = [h for h in pages if not self._has(h)]
+                    if missing:
+                        raise ValueError(f"{key}: {len(missing)} page(s) inconnue(s)")
+                    entry = {k: str(manifest.get(k, "")) for k in ("title", "created_at", "updated_at")}
+                    entry["pages"] = pages
+                self.rev += 1
+                entry["rev"] = applied[key] = self.rev
+                self.notebooks[key] = entry
+            if applied:
+                _write_json(self.state_path, {"rev": self.rev, "notebooks": self.notebooks})
+            return {"rev": self.rev, "applied": applied, "conflicts": conflicts}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FoleskineSync/1"
+    # En-têtes et corps écrits séparément: sans TCP_NODELAY, chaque réponse attendrait l'ACK retardé (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        store = self.server.store
+        routes = {
+            "/v1/changes": lambda p: store.changes(int(p.get("since", 0)), list(p.get("keys", []))),
+            "/v1/objects": lambda p: store.objects(list(p["hashes"])),
+            "/v1/missing": lambda p: store.missing(list(p["hashes"])),
+            "/v1/push": lambda p: store.push(dict(p.get("objects", {})), dict(p.get("notebooks", {}))),
+        }
+        route = routes.get(self.path)
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if route is None:
+                self._reply(404, {"error": f"inconnu: {self.path}"})
+                return
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            answer = route(json.loads(body))
+        except (ValueError, TypeError, KeyError, AttributeError, EOFError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self._reply(200, answer)
+
+    def _reply(self, status: int, answer: dict):
+        blob = json.dumps(answer, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if len(blob) > GZIP_MIN and "gzip" in self.headers.get("Accept-Encoding", ""):
+            blob = gzip.compress(blob, compresslevel=6, mtime=0)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(blob)))
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class SyncServer(ThreadingHTTPServer):
+    """Serveur de référence (tests, réseau local): `SyncServer(("127.0.0.1", 8765)).serve_forever()`."""
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], root: str = SERVER_DIR, verbose: bool = False):
+        self.store = SyncStore(root)
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+# ---------------------- Client ----------------------
+class SyncClient:
+    """Requêtes JSON vers le serveur sur une connexion HTTP gardée ouverte."""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        parts = urllib.parse.urlsplit(self.url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"adresse de serveur invalide: {url!r}")
+        self._parts = parts
+        self.timeout = timeout
+        self._conn = None
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self._parts.scheme == "https" else http.client.HTTPConnection
+        return cls(self._parts.hostname, self._parts.port, timeout=self.timeout)
+
+    def call(self, name: str, payload: dict) -> dict:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if len(body) > GZIP_MIN:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+        path = f"{self._parts.path}/v1/{name}"
+        for attempt in (0, 1):
+            reused = self._conn is not None
+            if not reused:
+                self._conn = self._connect()
+            try:
+                self._conn.request("POST", path, body, headers)
+                resp = self._conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                # Connexion gardée ouverte puis fermée par le serveur: une seule nouvelle tentative
+                self.close()
+                if not reused or attempt:
+                    raise SyncError(f"serveur injoignable ({self.url}): {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                raise SyncError(f"serveur injoignable ({self.url}): {e}") from e
+        self.requests += 1
+        self.bytes_sent += len(body)
+        self.bytes_received += len(data)
+        try:
+            if resp.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            answer = json.loads(data)
+        except (OSError, ValueError) as e:
+            raise SyncError(f"{name}: réponse invalide du serveur ({resp.status})") from e
+        if resp.status != 200:
+            raise SyncError(f"{name}: {answer.get('error', resp.reason) if isinstance(answer, dict) else resp.reason}")
+        return answer
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# ---------------------- Carnets locaux ----------------------
+def read_local(path: str) -> dict:
+    """Lit un carnet (JSON et journal, ou conteneur .fnb) sous sa forme normalisée."""
+    if path.endswith(CONTAINER_EXT):
+        container = NotebookContainer(path)
+        try:
+            data = dict(container.meta, pages=[container.read_page(s) for s in container.read_table()])
+        finally:
+            container.close()
+    else:
+        data = read_notebook_data(path)
+    return validate_notebook(data, os.path.splitext(os.path.basename(path))[0])
+
+def write_local(path: str, data: dict):
+    if path.endswith(CONTAINER_EXT):
+        NotebookContainer.create(path, {k: v for k, v in data.items() if k != "pages"}, data["pages"]).close()
+    else:
+        write_json_atomic(path, data)
+
+class _Local:
+    """Un carnet de la bibliothèque: fichier, empreinte au moment du parcours, contenu lu à la demande."""
+
+    def __init__(self, path: str, disk: tuple):
+        self.path = path
+        self.disk = disk
+        self.sig = notebook_sig(disk)
+        self._data = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = read_local(self.path)
+        return self._data
+
+class LibrarySync:
+    """Une synchronisation de la bibliothèque `lib_dir` avec le serveur de `client`.
+
+    `run()` enchaîne jusqu'à MAX_ROUNDS tours (parcours, changements du
+    serveur, pages manquantes, fusions et écritures locales, envoi) et
+    retourne le résumé. N'utilise ni l'index de la bibliothèque ni les
+    réglages de l'interface: peut tourner sur un thread à part, les
+    changements locaux étant vus par le watcher de l'application. Un carnet
+    modifié sur disque pendant le tour est laissé pour la fois suivante.
+    """
+
+    def __init__(self, lib_dir: str, client: SyncClient, state_dir: str = SYNC_DIR):
+        self.lib_dir = lib_dir
+        self.client = client
+        self.state_dir = state_dir
+        self.state_path = os.path.join(state_dir, "state.json")
+        state = _read_json(self.state_path, {})
+        if state.get("server") != client.url:
+            # Autre serveur: tout est comparé comme à la première synchronisation
+            state = {}
+        self.cursor = state.get("cursor", 0)
+        self.known: dict[str, dict] = state.get("notebooks", {})
+        # Carnets laissés de côté à la dernière synchronisation (voir _skip)
+        self.pending: set[str] = set(state.get("pending", []))
+        self.summary = {"pushed": 0, "pulled": 0, "merged": 0, "deleted": 0, "conflicts": 0,
+                        "pages_sent": 0, "pages_received": 0, "errors": []}
+
+    # --- État local ---
+    def _base_path(self, key: str) -> str:
+        return os.path.join(self.state_dir, "base", key + ".json")
+
+    def _base(self, key: str) -> dict | None:
+        base = _read_json(self._base_path(key), None)
+        return base if isinstance(base, dict) and isinstance(base.get("pages"), list) else None
+
+    def _remember(self, key: str, rev: int, path: str, data: dict):
+        self.known[key] = {"rev": rev, "file": os.path.basename(path), "sig": notebook_sig(disk_state(path)),
+                           "pages": [text_hash(p) for p in data["pages"]]}
+        _write_json(self._base_path(key), {"title": data["title"], "pages": data["pages"]})
+
+    def _forget(self, key: str):
+        self.known.pop(key, None)
+        try:
+            os.remove(self._base_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _save_state(self):
+        _write_json(self.state_path, {"server": self.client.url, "cursor": self.cursor, "pending": sorted(self.pending),
+                                       "notebooks": self.known})
+
+    def _scan(self) -> dict[str, _Local]:
+        local = {}
+        try:
+            names = sorted(os.listdir(self.lib_dir))
+        except FileNotFoundError:
+            return local
+        for name in names:
+            if not is_notebook_file(name):
+                continue
+            key = os.path.splitext(name)[0]
+            path = os.path.join(self.lib_dir, name)
+            disk = disk_state(path)
+            if disk is None:
+                continue
+            if key in local:
+                # Même nom sous deux formats (.json et .fnb): le second garde son extension dans sa clé
+                key = name
+            if not valid_key(key):
+                self.summary["errors"].append((name, "nom de fichier non synchronisable"))
+                continue
+            local[key] = _Local(path, disk)
+        return local
+
+    # --- Réseau, par lots ---
+    def _fetch(self, hashes: set[str]) -> dict[str, str]:
+        found = {}
+        for batch in _chunks(sorted(hashes), HASHES_PER_REQUEST):
+            for h, text in self.client.call("objects", {"hashes": batch})["objects"].items():
+                if h in hashes and text_hash(text) == h:
+                    found[h] = text
+        self.summary["pages_received"] += len(found)
+        missing = hashes - found.keys()
+        if missing:
+            raise SyncError(f"{len(missing)} page(s) introuvable(s) sur le serveur")
+        return found
+
+    def _upload(self, texts: dict[str, str]):
+        missing = []
+        for batch in _chunks(sorted(texts), HASHES_PER_REQUEST):
+            missing += self.client.call("missing", {"hashes": batch})["missing"]
+        objects, size = {}, 0
+        for h in missing:
+            objects[h] = texts[h]
+            size += len(texts[h])
+            if size >= BATCH_BYTES:
+                self.client.call("push", {"objects": objects})
+                objects, size = {}, 0
+        if objects:
+            self.client.call("push", {"objects": objects})
+        self.summary["pages_sent"] += len(missing)
+
+    def _push(self, manifests: dict[str, dict]) -> tuple[dict[str, int], set[str]]:
+        applied, conflicts = {}, set()
+        for batch in _chunks(list(manifests.items()), NOTEBOOKS_PER_REQUEST):
+            answer = self.client.call("push", {"notebooks": dict(batch)})
+            applied.update(answer["applied"])
+            conflicts.update(answer["conflicts"])
+        return applied, conflicts
+
+    # --- Un tour ---
+    def _plan(self, local: dict[str, _Local], remote: dict[str, dict], retry: set[str]):
+        """Répartit les carnets: (reçus, fusionnés, envoyés avec leur révision de base, suppressions)."""
+        pulls, merges, pushes, tombstones = [], [], [], []
+        for key in sorted(local.keys() | self.known.keys() | remote.keys()):
+            known, loc, rem = self.known.get(key), local.get(key), remote.get(key)
+            local_changed = loc is not None and (known is None or loc.sig != known["sig"])
+            remote_changed = rem is not None and (known is None or rem["rev"] != known["rev"])
+            if not remote_changed:
+                # Refusé au tour précédent sans être sur le serveur: il y a été effacé
+                gone = rem is None and key in retry
+                if local_changed:
+                    pushes.append((key, 0 if gone or known is None else known["rev"]))
+                elif loc is None and known is not None:
+                    if gone:
+                        self._forget(key)
+                    else:
+                        tombstones.append(key)
+            elif rem.get("deleted"):
+                if loc is None:
+                    self._forget(key)
+                elif local_changed:
+                    # Modifié ici après la suppression ailleurs: le carnet est recréé sur le serveur
+                    pushes.append((key, rem["rev"]))
+                else:
+                    self._trash(key, loc)
+            elif local_changed:
+                merges.append(key)
+            else:
+                pulls.append(key)
+        return pulls, merges, pushes, tombstones
+
+    def _round(self, retry: set[str]) -> set[str]:
+        local = self._scan()
+        answer = self.client.call("changes", {"since": self.cursor, "keys": sorted(retry | self.pending)})
+        if answer["rev"] < self.cursor:
+            # Serveur réinitialisé: tout est comparé comme à la première synchronisation
+            self.cursor, self.known = 0, {}
+            answer = self.client.call("changes", {"since": 0})
+        remote = {k: m for k, m in answer["notebooks"].items() if valid_key(k)}
+        self.pending = set()
+        pulls, merges, pushes, tombstones = self._plan(local, remote, retry)
+
+        # Pages du serveur qu'on n'a pas déjà, dans le carnet local ou dans la base
+        texts: dict[str, str] = {}
+        incoming = []
+        for key in pulls + merges:
+            loc = local.get(key)
+            mine = self._read(key, loc) if loc is not None else None
+            if loc is not None and mine is None:
+                continue
+            base = self._base(key) if key in self.known else None
+            for text in (base["pages"] if base else []) + (mine["pages"] if mine else []):
+                texts.setdefault(text_hash(text), text)
+            incoming.append((key, loc, mine, base))
+        texts.update(self._fetch({h for key, *_ in incoming for h in remote[key]["pages"] if h not in texts}))
+
+        manifests: dict[str, dict] = {}
+        outgoing: dict[str, str] = {}
+        written: dict[str, tuple[str, dict]] = {}
+        for key, loc, mine, base in incoming:
+            rem = remote[key]
+            theirs = {"title": rem["title"], "created_at": rem["created_at"], "updated_at": rem["updated_at"],
+                      "pages": [texts[h] for h in rem["pages"]]}
+            if key in merges:
+                # Marqueurs nommés d'après cette machine: lisibles aussi une fois la page reçue ailleurs
+                data, conflicts = merge_notebook(base, mine, theirs, (socket.gethostname() or "local", "serveur"))
+                self.summary["conflicts"] += conflicts
+            else:
+                data = dict(mine or {}, **theirs)
+            data["stats"] = notebook_stats(data["pages"])
+            if loc is not None:
+                path = loc.path
+            else:
+                path = os.path.join(self.lib_dir, key if is_notebook_file(key) else key + notebook_ext())
+            if not self._write(key, path, loc, data):
+                continue
+            manifest = self._manifest(data, rem["rev"], outgoing)
+            if manifest["pages"] != rem["pages"] or manifest["title"] != rem["title"]:
+                # La fusion garde des changements d'ici: ils repartent vers le serveur
+                manifests[key] = manifest
+                written[key] = (path, data)
+            else:
+                self._remember(key, rem["rev"], path, data)
+                self.summary["merged" if key in merges else "pulled"] += 1
+
+        for key, base_rev in pushes:
+            loc = local[key]
+            data = self._read(key, loc)
+            if data is None:
+                continue
+            if disk_state(loc.path) != loc.disk:
+                self._skip(key, "modifié pendant la synchronisation")
+                continue
+            manifests[key] = self._manifest(data, base_rev, outgoing)
+            written[key] = (loc.path, data)
+        for key in tombstones:
+            manifests[key] = {"deleted": True, "base": self.known[key]["rev"]}
+
+        # Pages déjà sur le serveur à la dernière synchronisation: pas même demandées
+        for key in manifests:
+            for h in (self.known.get(key) or {}).get("pages", []) + (remote.get(key) or {}).get("pages", []):
+                outgoing.pop(h, None)
+        self._upload(outgoing)
+        applied, conflicts = self._push(manifests)
+        for key, rev in applied.items():
+            if key in written:
+                self._remember(key, rev, *written[key])
+                self.summary["merged" if key in merges else "pushed"] += 1
+            else:
+                self._forget(key)
+                self.summary["deleted"] += 1
+        self.cursor = answer["rev"]
+        self._save_state()
+        return conflicts
+
+    def _skip(self, key: str, reason: str):
+        # Laissé pour la prochaine synchronisation: redemandé au serveur même si sa révision n'a pas bougé
+        self.pending.add(key)
+        self.summary["errors"].append((key, reason))
+
+    def _read(self, key: str, loc: _Local) -> dict | None:
+        try:
+            return loc.data
+        except Exception as e:
+            self._skip(key, f"illisible: {e}")
+            return None
+
+    def _manifest(self, data: dict, base_rev: int, outgoing: dict[str, str]) -> dict:
+        hashes = []
+        for text in data["pages"]:
+            h = text_hash(text)
+            outgoing[h] = text
+            hashes.append(h)
+        return {"title": data["title"], "created_at": data["created_at"], "updated_at": data["updated_at"],
+                "pages": hashes, "base": base_rev}
+
+    def _write(self, key: str, path: str, loc: _Local | None, data: dict) -> bool:
+        """Écrit la version reçue ou fusionnée, sauf si le fichier a changé depuis le parcours."""
+        before = loc.disk if loc is not None else None
+        if disk_state(path) != before:
+            self._skip(key, "modifié pendant la synchronisation")
+            return False
+        previous = loc.data["pages"] if loc is not None else []
+        changed = {i: p for i, p in enumerate(data["pages"]) if i >= len(previous) or previous[i] != p}
+        write_local(path, data)
+        # Les versions remplacées restent dans l'historique, comme après une sauvegarde
+        record_history(path, changed, {i: previous[i] for i in changed if i < len(previous)})
+        index_pages(path, changed, len(data["pages"]), before, disk_state(path))
+        return True
+
+    def _trash(self, key: str, loc: _Local):
+        """Supprimé sur une autre machine: le fichier local part dans SYNC_DIR/trash."""
+        if disk_state(loc.path) != loc.disk:
+            return
+        trash = os.path.join(self.state_dir, "trash")
+        os.makedirs(trash, exist_ok=True)
+        name = os.path.basename(loc.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        os.replace(loc.path, os.path.join(trash, f"{stamp}-{name}"))
+        if os.path.exists(loc.path + JOURNAL_SUFFIX):
+            os.replace(loc.path + JOURNAL_SUFFIX, os.path.join(trash, f"{stamp}-{name}{JOURNAL_SUFFIX}"))
+        self._forget(key)
+        self.summary["deleted"] += 1
+
+    def run(self) -> dict:
+        t0 = time.perf_counter()
+        try:
+            retry: set[str] = set()
+            for _ in range(MAX_ROUNDS):
+                retry = self._round(retry)
+                if not retry:
+                    break
+            else:
+                for key in sorted(retry):
+                    self._skip(key, "modifié ailleurs pendant la synchronisation")
+                self._save_state()
+        finally:
+            self.client.close()
+        self.summary.update(requests=self.client.requests, bytes_sent=self.client.bytes_sent,
+                            bytes_received=self.client.bytes_received, seconds=time.perf_counter() - t0)
+        return self.summary
+
+def summary_text(summary: dict) -> str:
+    parts = [f"{summary['pulled']} reçu(s)", f"{summary['pushed']} envoyé(s)", f"{summary['merged']} fusionné(s)"]
+    if summary["deleted"]:
+        parts.append(f"{summary['deleted']} supprimé(s)")
+    text = (f"{', '.join(parts)} — {summary['pages_sent']} page(s) envoyée(s), "
+            f"{summary['pages_received']} reçue(s) en {summary['requests']} requête(s)")
+    if summary["conflicts"]:
+        text += f"; {summary['conflicts']} page(s) en conflit (marquées <<<<<<<)"
+    return text
+
+# ---------------------- Arrière-plan ----------------------
+class BackgroundSync(threading.Thread):
+    """Une synchronisation sur un thread à part; `summary` ou `error` sont remplis une fois terminée."""
+
+    def __init__(self, lib_dir: str, url: str):
+        super().__init__(name="foleskine-sync", daemon=True)
+        self.lib_dir = lib_dir
+        self.url = url
+        self.summary: dict | None = None
+        self.error: Exception | None = None
+
+    def run(self):
+        try:
+            self.summary = LibrarySync(self.lib_dir, SyncClient(self.url)).run()
+        except Exception as e:
+            self.error = e
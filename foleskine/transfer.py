@@ -0,0 +1,458 @@
+"""Import et export en masse: dossiers, archives .zip et bibliothèque entière.
+
+Les deux opérations avancent par étapes (`step`) appelées depuis le thread
+qui possède le stockage: la ligne de commande boucle jusqu'à la fin,
+l'interface Tk appelle `step(0)` depuis `after` et met à jour une barre de
+progression entre deux étapes.
+
+L'export écrit un carnet en JSON, en Markdown, en HTML autonome ou en texte
+(EXPORT_FORMATS), en flux: une page à la fois, sans construire le document
+en mémoire.
+"""
+import datetime
+import html
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .core import (CONTAINER_EXT, SYNC_BATCH, FileStorage, LazyPages, Notebook, NotebookContainer, durable_replace,
+                   notebook_compression, notebook_ext, notebook_stats, open_decompressed, process_pool, slugify,
+                   sync_file, write_json_atomic)
+
+# En dessous de ce nombre de fichiers, démarrer des processus coûte plus cher que l'import
+POOL_MIN = 16
+# Fichiers importables: JSON, éventuellement compressé (le contenu est reconnu à la signature)
+IMPORT_EXTS = (".json", ".json.gz", ".json.xz")
+
+# ---------------------- Validation ----------------------
+def validate_notebook(data, fallback_title: str) -> dict:
+    """Vérifie le schéma d'un carnet importé et retourne une copie normalisée. Lève ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("le fichier ne contient pas un objet JSON")
+    pages = data.get("pages", [""])
+    if not isinstance(pages, list) or not all(isinstance(p, str) for p in pages):
+        raise ValueError("'pages' doit être une liste de textes")
+    title = data.get("title") or fallback_title
+    if not isinstance(title, str):
+        raise ValueError("'title' doit être un texte")
+    ts = datetime.datetime.now().isoformat(timespec="seconds")
+    pages = pages or [""]
+    # Totaux recalculés: ceux d'un fichier importé ne sont pas fiables
+    return dict(data, title=title, created_at=data.get("created_at", ts),
+                updated_at=data.get("updated_at", ts), stats=notebook_stats(pages), pages=pages)
+
+def iter_pages(pages):
+    """Pages d'un carnet une à une; celles d'un LazyPages ne restent pas en mémoire après leur passage."""
+    return pages.stream() if isinstance(pages, LazyPages) else iter(pages)
+
+def iter_notebook_json(data: dict):
+    """Sérialise un carnet morceau par morceau: une page décodée à la fois (LazyPages compris)."""
+    yield "{"
+    for key, value in data.items():
+        if key != "pages":
+            yield f"\n  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},"
+    yield '\n  "pages": ['
+    for i, text in enumerate(iter_pages(data["pages"])):
+        yield ("," if i else "") + "\n    " + json.dumps(text, ensure_ascii=False)
+    yield "\n  ]\n}\n"
+
+def _date(value) -> str:
+    return str(value or "").replace("T", " ")
+
+def iter_notebook_markdown(data: dict):
+    """Markdown: titre, dates, puis une section « Page N » par page, texte tel quel."""
+    yield f"# {' '.join(data['title'].split())}\n\n"
+    yield f"_Créé le {_date(data.get('created_at'))} · modifié le {_date(data.get('updated_at'))}_\n"
+    for i, text in enumerate(iter_pages(data["pages"]), 1):
+        yield f"\n## Page {i}\n\n"
+        yield text if text.endswith("\n") or not text else text + "\n"
+
+HTML_STYLE = ("body{background:#f4ecd8;color:#3b2f1e;font-family:Georgia,serif;max-width:46em;margin:2em auto;"
+              "padding:0 1em;line-height:1.5}h1{margin-bottom:.2em}.dates{color:#8a7f6a;font-size:.9em}"
+              ".page{border-top:1px solid #d8cbb0;margin-top:2em}h2{font-size:1.1em;color:#8a7f6a}"
+              ".text{white-space:pre-wrap}")
+
+def iter_notebook_html(data: dict):
+    """Page HTML autonome (style intégré): une section par page, texte échappé, retours à la ligne gardés."""
+    title = html.escape(data["title"])
+    yield (f'<!DOCTYPE html>\n<html lang="fr">\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+           f"<style>{HTML_STYLE}</style>\n</head>\n<body>\n<h1>{title}</h1>\n"
+           f'<p class="dates">Créé le {html.escape(_date(data.get("created_at")))} · '
+           f'modifié le {html.escape(_date(data.get("updated_at")))}</p>\n')
+    for i, text in enumerate(iter_pages(data["pages"]), 1):
+        yield f'<section class="page" id="page-{i}">\n<h2>Page {i}</h2>\n<div class="text">'
+        yield html.escape(text, quote=False)
+        yield "</div>\n</section>\n"
+    yield "</body>\n</html>\n"
+
+def iter_notebook_text(data: dict):
+    """Texte brut: titre souligné, puis les pages séparées par une ligne « ----- Page N / total ----- »."""
+    title = " ".join(data["title"].split())
+    yield f"{title}\n{'=' * len(title)}\n"
+    pages = data["pages"]
+    for i, text in enumerate(iter_pages(pages), 1):
+        yield f"\n----- Page {i} / {len(pages)} -----\n\n"
+        yield text if text.endswith("\n") or not text else text + "\n"
+
+# Format d'export: (extension, rendu morceau par morceau). Les rendus attendent un titre dans data["title"]:
+# les appelants passent dict(nb.data, title=nb.title), résolu d'après le nom du fichier à défaut.
+EXPORT_FORMATS = {
+    "json": (".json", iter_notebook_json),
+    "md": (".md", iter_notebook_markdown),
+    "html": (".html", iter_notebook_html),
+    "txt": (".txt", iter_notebook_text),
+}
+
+def export_format(path: str) -> str:
+    """Format d'export d'après l'extension du fichier (.json, .md, .html, .txt). Lève ValueError."""
+    ext = os.path.splitext(path)[1].lower()
+    ext = {".markdown": ".md", ".htm": ".html"}.get(ext, ext)
+    for fmt, (fmt_ext, _render) in EXPORT_FORMATS.items():
+        if ext == fmt_ext:
+            return fmt
+    raise ValueError(f"format d'export inconnu: '{ext}' (extensions possibles: .json, .md, .html, .txt)")
+
+def library_export_format(zip_path: str) -> str:
+    """Format des carnets d'une archive: « bibliotheque.md.zip » pour Markdown, JSON par défaut."""
+    try:
+        return export_format(zip_path[:-4] if zip_path.lower().endswith(".zip") else zip_path)
+    except ValueError:
+        return "json"
+
+def export_notebook(data: dict, path: str, fmt: str | None = None):
+    """Exporte un carnet en flux (format d'après l'extension par défaut), via un fichier temporaire renommé."""
+    render = EXPORT_FORMATS[fmt or export_format(path)][1]
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(render(data))
+            sync_file(f)
+        durable_replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# ---------------------- Sources ----------------------
+# Une source est un couple (archive, nom): archive None pour un fichier ordinaire.
+
+def collect_sources(paths: list[str]) -> list[tuple[str | None, str]]:
+    """Fichiers JSON à importer depuis des fichiers, des dossiers (récursivement) ou des .zip."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                sources += [(None, os.path.join(root, f)) for f in sorted(files) if f.lower().endswith(IMPORT_EXTS)]
+        elif path.lower().endswith(".zip"):
+            with zipfile.ZipFile(path) as zf:
+                sources += [(path, info.filename) for info in zf.infolist()
+                            if not info.is_dir() and info.filename.lower().endswith(IMPORT_EXTS)
+                            and not info.filename.startswith("__MACOSX/")]
+        else:
+            sources.append((None, path))
+    return sources
+
+def source_label(source: tuple[str | None, str]) -> str:
+    archive, name = source
+    return name if archive is None else f"{archive}:{name}"
+
+# Archives ouvertes par processus: relire le répertoire central pour chaque membre coûterait O(n²)
+_ARCHIVES: dict[str, zipfile.ZipFile] = {}
+
+def _open_source(source: tuple[str | None, str]):
+    archive, name = source
+    if archive is None:
+        return open(name, "rb")
+    zf = _ARCHIVES.get(archive)
+    if zf is None:
+        zf = _ARCHIVES[archive] = zipfile.ZipFile(archive)
+    # Décompression au fil de la lecture, sans extraire l'archive
+    return zf.open(name)
+
+def _import_one(source: tuple[str | None, str], tmp_dir: str | None, ext: str, compression: str = "none"):
+    """Lit et valide une source; écrit le carnet dans un fichier temporaire de `tmp_dir` si donné.
+
+    Exécuté dans un processus du pool: ne touche ni à l'index ni aux réglages.
+    """
+    name = os.path.basename(source[1])
+    fallback = next((name[:-len(e)] for e in IMPORT_EXTS[::-1] if name.lower().endswith(e)), os.path.splitext(name)[0])
+    with _open_source(source) as f:
+        data = validate_notebook(json.load(open_decompressed(f)), fallback)
+    if tmp_dir is None:
+        return data
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, prefix=".import-", suffix=".tmp")
+    os.close(fd)
+    try:
+        if ext == CONTAINER_EXT:
+            meta = {k: v for k, v in data.items() if k != "pages"}
+            NotebookContainer.create(tmp, meta, data["pages"]).close()
+        else:
+            write_json_atomic(tmp, data, compression)
+        # Le processus du pool peut s'arrêter avant le minuteur du mode "batched": fsync maintenant
+        SYNC_BATCH.flush()
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return data["title"], tmp
+
+# ---------------------- Import ----------------------
+class BulkImport:
+    """Importe des sources via un pool de processus; les noms de fichiers sont attribués ici.
+
+    Avec FileStorage, chaque processus écrit le carnet final dans un fichier
+    temporaire de la bibliothèque; il ne reste qu'un os.replace vers le nom
+    choisi contre l'ensemble des noms déjà pris (aucun os.path.exists). Avec
+    un autre stockage, les processus ne font que lire et valider.
+    """
+
+    def __init__(self, storage, sources: list[tuple[str | None, str]], workers: int | None = None):
+        self.storage = storage
+        self.sources = list(sources)
+        self.total = len(self.sources)
+        self.done = 0
+        self.imported: list[tuple[str, str]] = []
+        self.errors: list[tuple[str, str]] = []
+        self._next = iter(self.sources)
+        self._ext = notebook_ext()
+        self._compression = notebook_compression()
+        self._tmp_dir = None
+        if isinstance(storage, FileStorage):
+            self._tmp_dir = storage.lib_dir
+            os.makedirs(storage.lib_dir, exist_ok=True)
+            self._taken = {name.lower() for name in os.listdir(storage.lib_dir)}
+            self._suffix: dict[str, int] = {}
+        self._pool = None
+        self._pending = {}
+        if workers != 1 and self.total >= POOL_MIN:
+            workers = workers or os.cpu_count() or 1
+            self._pool = process_pool(workers)
+            # Nombre borné de carnets en vol: la mémoire ne dépend pas de la taille de l'archive
+            self._max_pending = 4 * workers
+            self._fill()
+
+    @property
+    def finished(self) -> bool:
+        return self.done == self.total
+
+    def _fill(self):
+        while len(self._pending) < self._max_pending:
+            source = next(self._next, None)
+            if source is None:
+                return
+            self._pending[self._pool.submit(_import_one, source, self._tmp_dir, self._ext,
+                                            self._compression)] = source
+
+    def _claim(self, title: str) -> str:
+        slug = slugify(title)
+        name = f"{slug}{self._ext}"
+        i = self._suffix.get(slug, 1)
+        while name.lower() in self._taken:
+            name = f"{slug}-{i}{self._ext}"
+            i += 1
+        self._suffix[slug] = i
+        self._taken.add(name.lower())
+        return os.path.join(self._tmp_dir, name)
+
+    def _finish(self, source, result=None, error: Exception | None = None):
+        self.done += 1
+        label = source_label(source)
+        if error is None:
+            try:
+                if self._tmp_dir is None:
+                    dest = self.storage.import_data(result, result["title"])
+                else:
+                    title, tmp = result
+                    dest = self._claim(title)
+                    try:
+                        durable_replace(tmp, dest)
+                    except OSError:
+                        os.remove(tmp)
+                        raise
+                self.imported.append((label, dest))
+                return
+            except Exception as e:
+                error = e
+        self.errors.append((label, str(error)))
+
+    def step(self, timeout: float | None = 0.05) -> bool:
+        """Traite les carnets prêts pendant au plus `timeout` secondes (None: jusqu'à la fin)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if self._pool is None:
+                source = next(self._next)
+                try:
+                    self._finish(source, _import_one(source, self._tmp_dir, self._ext, self._compression))
+                except Exception as e:
+                    self._finish(source, error=e)
+            else:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _ = wait(self._pending, remaining, FIRST_COMPLETED)
+                for future in ready:
+                    source = self._pending.pop(future)
+                    error = future.exception()
+                    self._finish(source, None if error else future.result(), error)
+                self._fill()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if self.finished:
+            self.close()
+        return self.finished
+
+    def close(self):
+        """Arrête le pool; les fichiers temporaires des carnets non importés sont supprimés."""
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        for future in self._pending:
+            if self._tmp_dir is not None and not future.cancelled() and future.exception() is None:
+                os.remove(future.result()[1])
+        self._pending.clear()
+        self._pool = None
+
+# ---------------------- Export ----------------------
+def _render_one(path: str, fmt: str, tmp_dir: str) -> tuple[str, str]:
+    """Rend un carnet dans un fichier temporaire de `tmp_dir`. Exécuté dans un processus du pool."""
+    nb = Notebook.load(path)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, prefix=".export-", suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            # Conteneur .fnb: les pages sont décodées une à une au fil de l'écriture
+            f.writelines(EXPORT_FORMATS[fmt][1](dict(nb.data, title=nb.title)))
+        return nb.title, tmp
+    except BaseException:
+        os.remove(tmp)
+        raise
+    finally:
+        nb.close()
+
+class BulkExport:
+    """Exporte la bibliothèque dans une archive .zip, un carnet par membre, au format `fmt` (EXPORT_FORMATS).
+
+    Avec FileStorage et au moins POOL_MIN carnets, un pool de processus rend
+    les carnets dans des fichiers temporaires (à côté de l'archive), recopiés
+    dans l'archive par ce thread à mesure qu'ils arrivent: seul l'ajout à
+    l'archive reste séquentiel. Sinon, chaque carnet est écrit directement
+    dans son membre, une page à la fois.
+    """
+
+    def __init__(self, storage, zip_path: str, entries: list[dict] | None = None, fmt: str = "json",
+                 workers: int | None = None):
+        self.storage = storage
+        self.zip_path = zip_path
+        self.fmt = fmt
+        self.entries = storage.list_notebooks() if entries is None else list(entries)
+        self.total = len(self.entries)
+        self.done = 0
+        self.errors: list[tuple[str, str]] = []
+        self._ext, self._render = EXPORT_FORMATS[fmt]
+        self._names: set[str] = set()
+        self._tmp = zip_path + ".tmp"
+        self._file = open(self._tmp, "wb")
+        self._zip = zipfile.ZipFile(self._file, "w", compression=zipfile.ZIP_DEFLATED)
+        self._pool = None
+        self._pending = {}
+        if workers != 1 and self.total >= POOL_MIN and isinstance(storage, FileStorage):
+            workers = workers or os.cpu_count() or 1
+            self._tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(os.path.abspath(zip_path)))
+            self._pool = process_pool(workers)
+            # Nombre borné de carnets rendus en attente: l'espace temporaire ne dépend pas de la bibliothèque
+            self._max_pending = 4 * workers
+            self._next = iter(self.entries)
+            self._fill()
+
+    @property
+    def finished(self) -> bool:
+        return self.done == self.total
+
+    def _fill(self):
+        while len(self._pending) < self._max_pending:
+            entry = next(self._next, None)
+            if entry is None:
+                return
+            self._pending[self._pool.submit(_render_one, entry["path"], self.fmt, self._tmp_dir)] = entry
+
+    def _member_name(self, title: str) -> str:
+        slug = slugify(title)
+        name, i = f"{slug}{self._ext}", 1
+        while name in self._names:
+            name = f"{slug}-{i}{self._ext}"
+            i += 1
+        self._names.add(name)
+        return name
+
+    def _export_one(self, entry: dict):
+        nb = self.storage.load(entry["path"])
+        try:
+            with self._zip.open(self._member_name(nb.title), "w") as f:
+                for chunk in self._render(dict(nb.data, title=nb.title)):
+                    f.write(chunk.encode("utf-8"))
+        finally:
+            nb.close()
+
+    def _add_rendered(self, future):
+        entry = self._pending.pop(future)
+        self.done += 1
+        error = future.exception()
+        if error is not None:
+            self.errors.append((entry["path"], str(error)))
+            return
+        title, tmp = future.result()
+        try:
+            # Recopie en flux depuis le fichier temporaire
+            self._zip.write(tmp, self._member_name(title))
+        except Exception as e:
+            self.errors.append((entry["path"], str(e)))
+        finally:
+            os.remove(tmp)
+
+    def step(self, timeout: float | None = 0.05) -> bool:
+        """Exporte des carnets pendant au plus `timeout` secondes (None: jusqu'à la fin)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if self._pool is None:
+                entry = self.entries[self.done]
+                try:
+                    self._export_one(entry)
+                except Exception as e:
+                    self.errors.append((entry["path"], str(e)))
+                self.done += 1
+            else:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _ = wait(self._pending, remaining, FIRST_COMPLETED)
+                for future in ready:
+                    self._add_rendered(future)
+                self._fill()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if self.finished and self._zip is not None:
+            self._stop_pool()
+            self._zip.close()
+            self._zip = None
+            sync_file(self._file)
+            self._file.close()
+            durable_replace(self._tmp, self.zip_path)
+        return self.finished
+
+    def _stop_pool(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        for future in self._pending:
+            if not future.cancelled() and future.exception() is None:
+                os.remove(future.result()[1])
+        self._pending.clear()
+        os.rmdir(self._tmp_dir)
+
+    def close(self):
+        """Abandonne l'export en cours (l'archive partielle et les fichiers temporaires sont supprimés)."""
+        self._stop_pool()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            self._file.close()
+            os.remove(self._tmp)
@@ -0,0 +1,390 @@
+"""Vérification et maintenance de la bibliothèque: schéma, doublons, normalisation, réparation.
+
+`LibraryCheck` vérifie les carnets d'un dossier dans un pool de processus
+(par lots, étapes `step` comme l'import en masse), puis compare les titres
+entre eux. `report()` donne un rapport JSON: un élément par carnet (erreurs,
+avertissements, action effectuée), les titres en double et les titres qui
+donnent le même nom de fichier.
+
+Modes:
+  - "check"    : lecture seule
+  - "normalize": réécrit les carnets valides sous leur forme canonique (journal
+                 intégré, champs manquants, statistiques recalculées, conteneur
+                 sans espace perdu), seulement s'ils en diffèrent
+  - "minify"   : comme "normalize", JSON compact sans indentation
+
+Avec `repair`, un carnet illisible (JSON tronqué, conteneur dont des pages
+débordent du fichier) est réécrit avec les pages entières qu'on a pu en
+relire; l'original est gardé à côté, en `<fichier>.corrupt`.
+"""
+import datetime
+import io
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .core import (CONTAINER_EXT, JOURNAL_SUFFIX, SYNC_BATCH, NotebookContainer, encode_notebook, fold_text,
+                   is_notebook_file, notebook_compression, notebook_stats, open_decompressed, process_pool,
+                   replay_journal, slugify, stored_stats, write_json_atomic)
+from .transfer import POOL_MIN, validate_notebook
+
+MODES = ("check", "normalize", "minify")
+# Carnets par tâche du pool: les petits carnets coûtent moins à lire qu'à transmettre un par un
+BATCH = 32
+REPORT_VERSION = 1
+DATE_FIELDS = ("created_at", "updated_at")
+
+# ---------------------- Récupération ----------------------
+def read_salvageable(path: str) -> bytes:
+    """Contenu (décompressé) d'un fichier, jusqu'au premier octet illisible."""
+    chunks = []
+    with open(path, "rb") as raw:
+        f = open_decompressed(raw)
+        try:
+            # read1: ce qui a déjà été décompressé est rendu avant l'erreur de fin de flux
+            while chunk := f.read1(1 << 16):
+                chunks.append(chunk)
+        except Exception:
+            # Fin tronquée ou corrompue (EOFError, BadGzipFile, LZMAError…): on garde le début
+            pass
+    return b"".join(chunks)
+
+def _skip(text: str, pos: int) -> int:
+    # Blancs et virgules entre deux éléments
+    while pos < len(text) and text[pos] in " \t\r\n,":
+        pos += 1
+    return pos
+
+def salvage_notebook(text: str) -> dict:
+    """Relit le début valide d'un carnet JSON: clés complètes et, dans "pages", chaque page entière.
+
+    Lève ValueError si le texte ne commence même pas par un objet JSON.
+    """
+    decoder = json.JSONDecoder()
+    pos = _skip(text, 0)
+    if not text.startswith("{", pos):
+        raise ValueError("aucun objet JSON à récupérer")
+    data, pos = {}, pos + 1
+    while True:
+        pos = _skip(text, pos)
+        if pos >= len(text) or text[pos] == "}":
+            break
+        try:
+            key, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        pos = _skip(text, pos)
+        if not text.startswith(":", pos) or not isinstance(key, str):
+            break
+        pos = _skip(text, pos + 1)
+        if key == "pages" and text.startswith("[", pos):
+            pages = data["pages"] = []
+            pos += 1
+            while True:
+                pos = _skip(text, pos)
+                if text.startswith("]", pos):
+                    pos += 1
+                    break
+                try:
+                    page, pos = decoder.raw_decode(text, pos)
+                except ValueError:
+                    # Page tronquée: les suivantes sont perdues
+                    return data
+                if isinstance(page, str):
+                    pages.append(page)
+            continue
+        try:
+            data[key], pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+    return data
+
+def _backup(path: str) -> str:
+    """Copie l'original d'un carnet réparé en `.corrupt` (sans écraser une copie précédente)."""
+    dest, i = path + ".corrupt", 1
+    while os.path.exists(dest):
+        dest = f"{path}.{i}.corrupt"
+        i += 1
+    shutil.copy2(path, dest)
+    return dest
+
+# ---------------------- Vérification d'un carnet ----------------------
+def _valid_date(value) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def check_schema(data, result: dict) -> bool:
+    """Ajoute au résultat les problèmes de schéma d'un carnet. Retourne False s'il est inutilisable."""
+    if not isinstance(data, dict):
+        result["errors"].append("le fichier ne contient pas un objet JSON")
+        return False
+    pages = data.get("pages", [])
+    if not isinstance(pages, list):
+        result["errors"].append("'pages' n'est pas une liste")
+        return False
+    if not all(isinstance(p, str) for p in pages):
+        result["errors"].append("'pages' contient autre chose que du texte")
+        return False
+    if not pages:
+        result["warnings"].append("aucune page")
+    title = data.get("title")
+    if not isinstance(title, str) or not title:
+        result["warnings"].append("titre absent ou invalide")
+    for field in DATE_FIELDS:
+        if not _valid_date(data.get(field)):
+            result["warnings"].append(f"'{field}' absent ou invalide")
+    if stored_stats(data) != notebook_stats(pages):
+        result["warnings"].append("statistiques absentes ou périmées")
+    return True
+
+def canonical(data: dict, fallback_title: str, mtime: float) -> dict:
+    """Carnet au schéma complet: dates invalides remplacées par la date du fichier, statistiques recalculées."""
+    data = dict(data)
+    if not isinstance(data.get("title"), str):
+        data.pop("title", None)
+    ts = datetime.datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+    for field in DATE_FIELDS:
+        if not _valid_date(data.get(field)):
+            data[field] = ts
+    return validate_notebook(data, fallback_title)
+
+def _new_result(path: str) -> dict:
+    fmt = "fnb" if path.lower().endswith(CONTAINER_EXT) else "json"
+    return {"path": path, "format": fmt, "title": None, "pages": 0, "errors": [], "warnings": [], "action": None}
+
+def _check_json(path: str, mode: str, repair: bool, compression: str) -> dict:
+    result = _new_result(path)
+    fallback = os.path.splitext(os.path.basename(path))[0]
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = None
+    try:
+        data = json.load(open_decompressed(io.BufferedReader(io.BytesIO(raw))))
+    except Exception as e:
+        result["errors"].append(f"JSON illisible: {e}")
+    journal = path + JOURNAL_SUFFIX
+    has_journal = os.path.exists(journal)
+    if has_journal:
+        with open(journal, "rb") as f:
+            bad = 0
+            for line in f:
+                try:
+                    json.loads(line)
+                except ValueError:
+                    bad += 1
+        if bad:
+            result["warnings"].append(f"journal: {bad} ligne(s) illisible(s) ignorée(s)")
+    if isinstance(data, dict) and isinstance(data.get("pages", []), list):
+        replay_journal(data, journal)
+    usable = data is not None and check_schema(data, result)
+
+    if not usable:
+        if not repair:
+            return result
+        try:
+            data = salvage_notebook(read_salvageable(path).decode("utf-8", errors="replace"))
+        except ValueError as e:
+            result["errors"].append(f"irrécupérable: {e}")
+            return result
+        if not isinstance(data.get("pages"), list):
+            data["pages"] = []
+        replay_journal(data, journal)
+        data = canonical(data, fallback, st.st_mtime)
+        result["backup"] = _backup(path)
+        write_json_atomic(path, data, compression)
+        result["action"] = "repaired"
+    elif mode != "check":
+        data = canonical(data, fallback, st.st_mtime)
+        minify = mode == "minify"
+        if has_journal or encode_notebook(data, compression, minify) != raw:
+            write_json_atomic(path, data, compression, minify)
+            result["action"] = "minified" if minify else "normalized"
+    result["title"] = data.get("title") or fallback
+    result["pages"] = len(data["pages"])
+    return result
+
+def _check_container(path: str, mode: str, repair: bool) -> dict:
+    result = _new_result(path)
+    fallback = os.path.splitext(os.path.basename(path))[0]
+    st = os.stat(path)
+    try:
+        container = NotebookContainer(path)
+    except Exception as e:
+        # Sans en-tête ni métadonnées lisibles, la table des pages est introuvable
+        result["errors"].append(f"conteneur illisible (irrécupérable): {e}")
+        return result
+    pages, broken = [], 0
+    try:
+        size = container.file_size()
+        meta = container.meta
+        try:
+            slots = container.read_table()
+        except Exception as e:
+            result["errors"].append(f"table des pages illisible: {e}")
+            slots = []
+        for off, length, cap in slots:
+            if off + length > size or length > cap:
+                broken += 1
+                continue
+            try:
+                pages.append(container.read_page([off, length, cap]))
+            except UnicodeDecodeError:
+                broken += 1
+        wasted = container.wasted_bytes(slots) if not broken else 0
+    finally:
+        container.close()
+    if broken:
+        result["errors"].append(f"{broken} page(s) illisible(s) sur {broken + len(pages)}")
+    data = dict(meta if isinstance(meta, dict) else {}, pages=pages)
+    check_schema(data, result)
+    if wasted:
+        result["warnings"].append(f"{wasted} octets perdus")
+    action = None
+    if result["errors"]:
+        if repair:
+            action = "repaired"
+            result["backup"] = _backup(path)
+    elif mode != "check" and result["warnings"]:
+        action = "normalized"
+    if action is not None:
+        data = canonical(data, fallback, st.st_mtime)
+        NotebookContainer.create(path, {k: v for k, v in data.items() if k != "pages"}, data["pages"]).close()
+        result["action"] = action
+    result["title"] = data.get("title") or fallback
+    result["pages"] = len(data["pages"])
+    return result
+
+def check_notebook(path: str, mode: str = "check", repair: bool = False, compression: str = "none") -> dict:
+    """Vérifie (et selon le mode, normalise ou répare) un carnet. Ne lève pas: les erreurs vont dans le résultat."""
+    try:
+        if path.lower().endswith(CONTAINER_EXT):
+            return _check_container(path, mode, repair)
+        return _check_json(path, mode, repair, compression)
+    except Exception as e:
+        result = _new_result(path)
+        result["errors"].append(f"{type(e).__name__}: {e}")
+        return result
+
+def _check_batch(paths: list[str], mode: str, repair: bool, compression: str) -> list[dict]:
+    # Exécuté dans un processus du pool, qui peut s'arrêter avant le minuteur du mode "batched":
+    # les réécritures (normalisation, réparation) sont synchronisées avant de rendre le lot
+    results = [check_notebook(path, mode, repair, compression) for path in paths]
+    SYNC_BATCH.flush()
+    return results
+
+# ---------------------- Bibliothèque ----------------------
+class LibraryCheck:
+    """Vérifie tous les carnets de `lib_dir`, par lots, dans un pool de processus."""
+
+    def __init__(self, lib_dir: str, mode: str = "check", repair: bool = False, workers: int | None = None):
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu: {mode}")
+        self.lib_dir = lib_dir
+        self.mode = mode
+        self.repair = repair
+        with os.scandir(lib_dir) as it:
+            paths = sorted(de.path for de in it if is_notebook_file(de.name) and de.is_file())
+        self.total = len(paths)
+        self.done = 0
+        self.results: list[dict] = []
+        self._t0 = time.perf_counter()
+        self._compression = notebook_compression()
+        self._batches = iter([paths[i:i + BATCH] for i in range(0, len(paths), BATCH)])
+        self._pool = None
+        self._pending = {}
+        if workers != 1 and self.total >= POOL_MIN:
+            workers = workers or os.cpu_count() or 1
+            self._pool = process_pool(workers)
+            self._max_pending = 2 * workers
+            self._fill()
+
+    @property
+    def finished(self) -> bool:
+        return self.done == self.total
+
+    def _fill(self):
+        while len(self._pending) < self._max_pending:
+            batch = next(self._batches, None)
+            if batch is None:
+                return
+            self._pending[self._pool.submit(_check_batch, batch, self.mode, self.repair,
+                                            self._compression)] = batch
+
+    def _finish(self, results: list[dict]):
+        self.results += results
+        self.done += len(results)
+
+    def step(self, timeout: float | None = 0.05) -> bool:
+        """Vérifie des carnets pendant au plus `timeout` secondes (None: jusqu'à la fin)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if self._pool is None:
+                self._finish(_check_batch(next(self._batches), self.mode, self.repair, self._compression))
+            else:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _ = wait(self._pending, remaining, FIRST_COMPLETED)
+                for future in ready:
+                    batch = self._pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self._finish(future.result())
+                    else:
+                        # Processus perdu (mémoire…): chaque carnet du lot est signalé
+                        self._finish([dict(_new_result(p), errors=[f"vérification interrompue: {error}"])
+                                      for p in batch])
+                self._fill()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        if self.finished:
+            self.close()
+        return self.finished
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        self._pool = None
+
+    def report(self) -> dict:
+        """Rapport JSON de la vérification (à appeler une fois `finished`)."""
+        results = sorted(self.results, key=lambda r: r["path"])
+        by_title: dict[str, list[str]] = {}
+        by_slug: dict[str, list[dict]] = {}
+        for r in results:
+            if r["title"] is None:
+                continue
+            by_title.setdefault(fold_text(r["title"]), []).append(r["path"])
+            by_slug.setdefault(slugify(r["title"]).casefold(), []).append(r)
+        # Titres différents qui donnent le même nom de fichier (renommer l'un vers l'autre échouerait)
+        collisions = [{"slug": slug, "titles": sorted({r["title"] for r in group}),
+                       "paths": [r["path"] for r in group]}
+                      for slug, group in sorted(by_slug.items())
+                      if len({fold_text(r["title"]) for r in group}) > 1]
+        return {
+            "version": REPORT_VERSION,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "library": self.lib_dir,
+            "mode": self.mode,
+            "repair": self.repair,
+            "summary": {
+                "notebooks": len(results),
+                "ok": sum(1 for r in results if not r["errors"] and not r["warnings"]),
+                "errors": sum(1 for r in results if r["errors"] and r["action"] != "repaired"),
+                "warnings": sum(1 for r in results if r["warnings"] and not r["errors"]),
+                "normalized": sum(1 for r in results if r["action"] in ("normalized", "minified")),
+                "repaired": sum(1 for r in results if r["action"] == "repaired"),
+                "seconds": round(time.perf_counter() - self._t0, 3),
+            },
+            "notebooks": results,
+            "duplicate_titles": [paths for _, paths in sorted(by_title.items()) if len(paths) > 1],
+            "slug_collisions": collisions,
+        }
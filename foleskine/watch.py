@@ -0,0 +1,132 @@
+"""Surveillance du dossier des carnets (modifications faites hors de l'application).
+
+`open_watcher(lib_dir)` retourne un watcher dont `poll()` donne, sans
+bloquer, l'ensemble des noms de fichiers modifiés depuis l'appel
+précédent, ou None quand il faut tout relire (file d'événements débordée,
+dossier recréé). Sous Linux, les événements viennent d'inotify (via
+ctypes); ailleurs, un scandir compare mtime et taille à chaque appel.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+class PollingWatcher:
+    """Repli portable: un scandir par appel, comparé au précédent."""
+    INTERVAL_MS = 2000
+
+    def __init__(self, lib_dir: str):
+        self.lib_dir = lib_dir
+        self._state = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        state = {}
+        try:
+            with os.scandir(self.lib_dir) as it:
+                for de in it:
+                    try:
+                        st = de.stat()
+                    except FileNotFoundError:
+                        continue
+                    state[de.name] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass
+        return state
+
+    def poll(self) -> set[str] | None:
+        old, new = self._state, self._scan()
+        self._state = new
+        changed = {name for name, st in new.items() if old.get(name) != st}
+        changed.update(old.keys() - new.keys())
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """Événements inotify du dossier, lus sans bloquer (IN_NONBLOCK)."""
+    INTERVAL_MS = 500
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    # struct inotify_event { int wd; uint32_t mask, cookie, len; char name[len]; }
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, lib_dir: str):
+        self.lib_dir = lib_dir
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._fd = fd
+        self._wd = -1
+        try:
+            os.makedirs(lib_dir, exist_ok=True)
+            self._add_watch()
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(self.lib_dir), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch", self.lib_dir)
+        self._wd = wd
+
+    def poll(self) -> set[str] | None:
+        changed: set[str] | None = set()
+        lost = False
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _cookie, length = self.EVENT.unpack_from(buf, offset)
+                offset += self.EVENT.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED):
+                    # Dossier supprimé ou déplacé (les événements d'un ancien watch sont ignorés)
+                    if wd == self._wd:
+                        lost, changed = True, None
+                elif mask & self.IN_Q_OVERFLOW:
+                    # Événements perdus: relecture complète
+                    changed = None
+                elif changed is not None and name:
+                    changed.add(os.fsdecode(name))
+        if lost:
+            self._libc.inotify_rm_watch(self._fd, self._wd)
+            self._wd = -1
+        if self._wd < 0 and os.path.isdir(self.lib_dir):
+            # Dossier recréé: surveiller le nouveau
+            self._add_watch()
+            changed = None
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def open_watcher(lib_dir: str):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(lib_dir)
+        except (OSError, AttributeError):
+            # Pas de libc ou limite de watches atteinte (fs.inotify.max_user_watches)
+            pass
+    return PollingWatcher(lib_dir)
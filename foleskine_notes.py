@@ -1,12 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, simpledialog, messagebox
-import json
+import multiprocessing
 import os
+import queue
 import sys
-import re
-import datetime
+import time
 
-APP_NAME = "FoleskineNotes"
+from foleskine import diagnostics
+from foleskine.core import (LIBRARY, SETTINGS, FileStorage, LibraryModel, Notebook, NotebookCache, NotebookConflict,
+                            SaveWorker, load_session, open_storage, save_session, slugify)
+from foleskine.diagnostics import timed
+from foleskine.history import HISTORY
+from foleskine.search import POOL_MIN as INDEX_STEPS_MIN
+from foleskine.transfer import BulkExport, BulkImport, collect_sources, export_notebook, library_export_format
 
 def get_icon_path():
     """Get the path to the icon file, works both in development and when compiled with PyInstaller"""
@@ -19,87 +25,301 @@ def get_icon_path():
     
     return os.path.join(base_path, "icons/icon.ico")
 
-# ---------------------- Utilitaires chemins & fichiers ----------------------
-def get_data_dir():
-    """Retourne un dossier de données par-OS, ex:
-    - Windows: %APPDATA%/FoleskineNotes
-    - macOS: ~/Library/Application Support/FoleskineNotes
-    - Linux: ~/.local/share/FoleskineNotes
-    """
-    home = os.path.expanduser("~")
-    if sys.platform.startswith("win"):
-        base = os.environ.get("APPDATA", os.path.join(home, "AppData", "Roaming"))
-        return os.path.join(base, APP_NAME)
-    elif sys.platform == "darwin":
-        return os.path.join(home, "Library", "Application Support", APP_NAME)
-    else:
-        # linux / autres UNIX
-        return os.path.join(home, ".local", "share", APP_NAME)
-
-DATA_DIR = get_data_dir()
-LIB_DIR = os.path.join(DATA_DIR, "notebooks")
-
-os.makedirs(LIB_DIR, exist_ok=True)
-
-# ---------------------- Modèle de données ----------------------
-# Format d'un carnet (JSON):
-# {
-#   "title": "Mon carnet",
-#   "created_at": "2025-08-26T12:00:00",
-#   "updated_at": "2025-08-26T12:34:56",
-#   "pages": ["texte page 1", "texte page 2", ...]
-# }
-
-def slugify(name: str) -> str:
-    s = re.sub(r"[^a-zA-Z0-9_-]+", "-", name.strip()).strip("-")
-    return s or "carnet"
-
-class Notebook:
-    def __init__(self, path: str, data: dict):
-        self.path = path
-        self.data = data
-        if "pages" not in self.data:
-            self.data["pages"] = [""]
-        if not self.data["pages"]:
-            self.data["pages"].append("")
-
-    @property
-    def title(self) -> str:
-        return self.data.get("title", os.path.splitext(os.path.basename(self.path))[0])
-
-    def save(self):
-        self.data["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    @staticmethod
-    def create_new(title: str):
-        fname = f"{slugify(title)}.json"
-        path = os.path.join(LIB_DIR, fname)
-        ts = datetime.datetime.now().isoformat(timespec="seconds")
-        data = {
-            "title": title,
-            "created_at": ts,
-            "updated_at": ts,
-            "pages": [""]
-        }
-        nb = Notebook(path, data)
-        nb.save()
-        return nb
-
-    @staticmethod
-    def load(path: str):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return Notebook(path, data)
+# Formats d'export (foleskine.transfer.EXPORT_FORMATS), reconnus à l'extension
+EXPORT_FILETYPES = [("JSON", "*.json"), ("Markdown", "*.md"), ("HTML", "*.html"), ("Texte", "*.txt")]
+LIBRARY_EXPORT_FILETYPES = [("Archive ZIP (JSON)", "*.zip"), ("Archive ZIP (Markdown)", "*.md.zip"),
+                            ("Archive ZIP (HTML)", "*.html.zip"), ("Archive ZIP (texte)", "*.txt.zip")]
+
+# Pages plus longues (en caractères): insérées par morceaux depuis `after`
+LOAD_FIRST_CHARS = 32_000
+LOAD_CHUNK_CHARS = 64_000
+# Durée maximale d'insertion par passage dans la boucle Tk
+LOAD_SLICE_S = 0.015
+# Fin de la partie déjà insérée d'une page en cours de chargement
+LOAD_MARK = "foleskine_load"
+
+def chunk_end(content: str, start: int, size: int) -> int:
+    """Fin d'un morceau de `content` commençant à `start`: de préférence juste après un saut de ligne."""
+    end = start + size
+    if end >= len(content):
+        return len(content)
+    # Couper une ligne obligerait Tk à remettre en page toute la ligne au morceau suivant
+    newline = content.rfind("\n", start, end)
+    return newline + 1 if newline >= 0 else end
 
 # ---------------------- UI Application ----------------------
+def format_count(n: int) -> str:
+    """Nombre avec séparateur de milliers à la française (espace fine insécable)."""
+    return f"{n:,}".replace(",", "\u202f")
+
+def format_date(iso: str, with_time: bool = False) -> str:
+    """Date ISO ("2025-08-26T12:34:56") en "26/08/2025", suivie de l'heure si demandé."""
+    if len(iso) < 16:
+        return iso
+    date = f"{iso[8:10]}/{iso[5:7]}/{iso[:4]}"
+    return f"{date} à {iso[11:16]}" if with_time else date
+
+def is_text_index(value) -> bool:
+    """Vrai pour un index Tk de la forme "ligne.colonne" (valeurs relues d'un fichier de session)."""
+    if not isinstance(value, str):
+        return False
+    line, dot, col = value.partition(".")
+    return bool(dot) and line.isdigit() and col.isdigit()
+
+class TextPeer(tk.Text):
+    """Widget Text qui partage le contenu (et l'historique d'annulation) d'un autre (Tk `peer create`).
+
+    Une frappe dans le pair modifie directement le tampon du widget source:
+    aucune copie n'est nécessaire pour garder les deux vues synchronisées.
+    """
+
+    def __init__(self, master, source: tk.Text, **kw):
+        self.widgetName = "text"
+        self._setup(master, {})
+        self._tclCommands = []
+        source.peer_create(self._w, kw)
+
+class VirtualList(tk.Frame):
+    """Liste de carnets qui ne dessine que les lignes visibles d'un LibraryModel.
+
+    Le défilement se fait ligne par ligne (`top` = première ligne affichée):
+    le coût d'un rafraîchissement dépend de la hauteur de la fenêtre, pas du
+    nombre de carnets. La sélection est mémorisée par chemin. Chaque ligne
+    montre aussi les statistiques de l'entrée (pages, mots, date de
+    modification), tenues à jour par les sauvegardes: rien n'est relu.
+    """
+    ROW_HEIGHT = 34
+
+    def __init__(self, master, model: LibraryModel, on_select=None, on_type=None):
+        super().__init__(master, bg="#f7f2e7")
+        self.model = model
+        self.on_select = on_select
+        self.on_type = on_type
+        self.top = 0
+        self.selected_path: str | None = None
+        self.canvas = tk.Canvas(self, bg="white", highlightthickness=1, highlightbackground="#d9d0bd",
+                                takefocus=True, height=13 * self.ROW_HEIGHT)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.canvas.bind("<Up>", lambda e: self.move_selection(-1))
+        self.canvas.bind("<Down>", lambda e: self.move_selection(1))
+        self.canvas.bind("<Prior>", lambda e: self.move_selection(-self.visible_rows()))
+        self.canvas.bind("<Next>", lambda e: self.move_selection(self.visible_rows()))
+        self.canvas.bind("<Key>", self.on_key)
+
+    def visible_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT)
+
+    def redraw(self):
+        n, visible = len(self.model), self.visible_rows()
+        self.top = max(0, min(self.top, n - visible))
+        self.canvas.delete("all")
+        width = self.canvas.winfo_width()
+        for i in range(self.top, min(n, self.top + visible + 1)):
+            entry = self.model[i]
+            y = (i - self.top) * self.ROW_HEIGHT
+            selected = entry["path"] == self.selected_path
+            if selected:
+                self.canvas.create_rectangle(0, y, width, y + self.ROW_HEIGHT, fill="#e8dcc2", width=0)
+            self.canvas.create_text(8, y + 11, anchor="w", text=entry["title"],
+                                    fill="#333", font=("Georgia", 11, "bold" if selected else "normal"))
+            if entry.get("error"):
+                details = "⚠️ illisible (python -m foleskine verify --repair)"
+            elif "words" not in entry:
+                # Entrée provisoire: carnet pas encore lu (LibraryScan)
+                details = "…"
+            else:
+                details = f"{entry['pages']} p. · {format_count(entry['words'])} mots"
+                if entry.get("updated_at"):
+                    details += f" · {format_date(entry['updated_at'])}"
+            self.canvas.create_text(8, y + 25, anchor="w", text=details, fill="#8a7f6a", font=("Georgia", 8))
+        if n:
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + visible) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, *args):
+        n, visible = len(self.model), self.visible_rows()
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * n)
+        elif args[0] == "scroll":
+            step = visible if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.redraw()
+
+    def see(self, index: int):
+        visible = self.visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + visible:
+            self.top = index - visible + 1
+        self.redraw()
+
+    def select(self, path: str | None, notify: bool = False):
+        self.selected_path = path
+        index = self.model.index_of(path) if path is not None else None
+        if index is not None:
+            self.see(index)
+        else:
+            self.redraw()
+        if notify and path is not None and self.on_select:
+            self.on_select(path)
+
+    def on_click(self, event):
+        self.canvas.focus_set()
+        index = self.top + event.y // self.ROW_HEIGHT
+        if index < len(self.model):
+            self.select(self.model[index]["path"], notify=True)
+
+    def move_selection(self, delta: int):
+        if not len(self.model):
+            return
+        index = self.model.index_of(self.selected_path) if self.selected_path else None
+        index = 0 if index is None else max(0, min(len(self.model) - 1, index + delta))
+        self.select(self.model[index]["path"], notify=True)
+
+    def on_key(self, event):
+        # Une lettre tapée dans la liste part dans le champ de filtre
+        if event.char and event.char.isprintable() and self.on_type:
+            self.on_type(event.char)
+
+class DiagnosticsWindow(tk.Toplevel):
+    """Latences mesurées (p50 / p95 / max) sur la fenêtre glissante de foleskine.diagnostics."""
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Diagnostics")
+        self.geometry("560x360")
+        self.configure(bg="#f7f2e7")
+
+        if not diagnostics.ENABLED:
+            ttk.Label(self, text="Mesures désactivées.\nRelancez avec FOLESKINE_DIAGNOSTICS=1 pour les activer.",
+                      justify="left").pack(anchor="w", padx=12, pady=12)
+            return
+
+        columns = ("count", "p50", "p95", "max", "unit")
+        self.tree = ttk.Treeview(self, columns=columns, height=12)
+        self.tree.heading("#0", text="Mesure")
+        self.tree.column("#0", width=190)
+        for col, label in zip(columns, ("n", "p50", "p95", "max", "unité")):
+            self.tree.heading(col, text=label)
+            self.tree.column(col, width=70, anchor="e")
+        self.tree.pack(fill="both", expand=True, padx=10, pady=(10, 6))
+
+        btns = ttk.Frame(self)
+        btns.pack(fill="x", padx=10, pady=(0, 10))
+        ttk.Button(btns, text="Exporter…", command=self.export).grid(row=0, column=0, padx=2)
+        ttk.Button(btns, text="Réinitialiser", command=self.reset).grid(row=0, column=1, padx=2)
+        self.refresh()
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for name, stats in diagnostics.summary().items():
+            fmt = "{:.0f}" if stats["unit"] == "bytes" else "{:.2f}"
+            self.tree.insert("", tk.END, text=name, values=(
+                stats["count"], fmt.format(stats["p50"]), fmt.format(stats["p95"]),
+                fmt.format(stats["max"]), "o" if stats["unit"] == "bytes" else "ms"))
+        self.after(self.REFRESH_MS, self.refresh)
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json", filetypes=[("JSON", "*.json")],
+                                            initialfile="foleskine-diagnostics.json")
+        if not path:
+            return
+        try:
+            diagnostics.dump(path)
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Export impossible:\n{e}", parent=self)
+
+    def reset(self):
+        diagnostics.reset()
+        self.tree.delete(*self.tree.get_children())
+
+class HistoryWindow(tk.Toplevel):
+    """Versions enregistrées d'une page (foleskine.history), avec aperçu et restauration."""
+
+    def __init__(self, master, nb: Notebook, page: int):
+        super().__init__(master)
+        self.app = master
+        self.path = nb.path
+        self.page = page
+        self.title(f"Historique — {nb.title}, page {page + 1}")
+        self.geometry("760x460")
+        self.configure(bg="#f7f2e7")
+        self.columnconfigure(1, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self, columns=("kind",), height=16, selectmode="browse")
+        self.tree.heading("#0", text="Date")
+        self.tree.column("#0", width=150)
+        self.tree.heading("kind", text="Stockage")
+        self.tree.column("kind", width=70)
+        self.tree.grid(row=0, column=0, sticky="ns", padx=(10, 4), pady=10)
+        self.tree.bind("<<TreeviewSelect>>", self.show_version)
+
+        self.preview = tk.Text(self, wrap="word", font=("Georgia", 12), bg="#f3ebd9", relief="flat")
+        self.preview.grid(row=0, column=1, sticky="nsew", padx=(4, 10), pady=10)
+        self.preview.configure(state="disabled")
+
+        btns = ttk.Frame(self)
+        btns.grid(row=1, column=0, columnspan=2, sticky="e", padx=10, pady=(0, 10))
+        ttk.Button(btns, text="Restaurer cette version", command=self.restore).grid(row=0, column=0, padx=2)
+        ttk.Button(btns, text="Fermer", command=self.destroy).grid(row=0, column=1, padx=2)
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        # Rang de la version comme identifiant: un même texte peut revenir dans la même seconde
+        self._hashes: dict[str, str] = {}
+        for i, v in enumerate(HISTORY.versions(self.path, self.page)):
+            date = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(v["t"]))
+            self._hashes[str(i)] = v["h"]
+            self.tree.insert("", tk.END, iid=str(i), text=date, values=("delta" if v["delta"] else "complet",))
+        if not self.tree.get_children():
+            self.tree.insert("", tk.END, text="(aucune version)")
+
+    def selected_hash(self) -> str | None:
+        sel = self.tree.selection()
+        return self._hashes.get(sel[0]) if sel else None
+
+    def show_version(self, event=None):
+        h = self.selected_hash()
+        self.preview.configure(state="normal")
+        self.preview.delete("1.0", tk.END)
+        if h is not None:
+            self.preview.insert("1.0", HISTORY.text(self.path, h))
+        self.preview.configure(state="disabled")
+
+    def restore(self):
+        h = self.selected_hash()
+        if h is None:
+            return
+        if not self.app.restore_page_version(self.path, self.page, HISTORY.text(self.path, h)):
+            messagebox.showerror("Erreur", "Le carnet de cette page n'est plus ouvert.", parent=self)
+            return
+        self.refresh()
+
 class App(tk.Tk):
     def __init__(self):
+        # Origine de la mesure du premier affichage (ui.first_paint)
+        self._started = time.perf_counter()
         super().__init__()
+        # Session précédente lue avant tout le reste: taille de fenêtre, puis carnet et page (restore_session)
+        session = load_session()
         self.title("Carnets")
-        self.geometry("1000x650")
+        try:
+            self.geometry(session.get("geometry") or "1000x650")
+        except tk.TclError:
+            self.geometry("1000x650")
         
         # Set window icon (replace "path/to/your/icon.ico" with your actual path)
         try:
@@ -126,8 +346,35 @@ class App(tk.Tk):
         self.current_notebook: Notebook | None = None
         self.current_page_index = 0
         self._autosave_after_id = None
+        # Chargement progressif d'une grande page: texte, position, after, début
+        self._load_content: str | None = None
+        self._load_pos = 0
+        self._load_after_id = None
+        self._load_t0 = 0.0
+        # Curseur et première ligne visible à placer une fois la page entièrement chargée
+        self._load_cursor: tuple[str, str | None] | None = None
         self.is_fullscreen = False
         self.fullscreen_window = None
+        self.fullscreen_text = None
+        self.diagnostics_window = None
+        self.history_window = None
+        self.library = LibraryModel()
+        # Relecture progressive de la bibliothèque en cours (LibraryScan) et son début
+        self._scan = None
+        self._scan_t0 = 0.0
+        self._transfer = None
+        # Synchronisation en cours sur son thread (foleskine.sync.BackgroundSync)
+        self._sync = None
+        self._resolving_conflict = False
+        # Dernier état de session écrit (pour ne pas réécrire un fichier identique)
+        self._session: dict | None = None
+        self._restore_fullscreen = False
+        self.storage = open_storage()
+        # Les écritures de fichiers se font hors de la boucle Tk
+        self.writer = SaveWorker()
+        self.writer.start()
+        # Carnets quittés, gardés ouverts pour y revenir sans relire le disque
+        self.cache = NotebookCache(self.writer)
 
         # Layout principal: sidebar (bibliothèque) + zone d'édition
         self.columnconfigure(1, weight=1)
@@ -145,10 +392,20 @@ class App(tk.Tk):
         self._build_sidebar()
         self._build_main()
 
-        self.refresh_library()
+        # Dernière page éditable tout de suite; la bibliothèque est lue une fois la fenêtre affichée
+        self.restore_session(session)
+        self.bind("<Map>", self._on_first_map)
 
         # Autosave périodique (toutes les 30s)
         self.after(30_000, self.periodic_autosave)
+        self.after(200, self.poll_save_results)
+        # Modifications faites hors de l'application (synchronisation, CLI, autre instance)
+        self.watcher = self.storage.watch()
+        if self.watcher is not None:
+            self.after(self.watcher.INTERVAL_MS, self.poll_library_changes)
+        # Synchronisation automatique avec le serveur du réglage "sync_url"
+        if SETTINGS["sync_url"] and SETTINGS["sync_interval_s"] > 0:
+            self.after(5_000, self.periodic_sync)
 
     # ---------------------- Sidebar: Bibliothèque ----------------------
     def _build_sidebar(self):
@@ -161,71 +418,183 @@ class App(tk.Tk):
         ttk.Button(btns, text="Renommer", command=self.rename_notebook).grid(row=0, column=1, padx=2, pady=4)
         ttk.Button(btns, text="Supprimer", command=self.delete_notebook).grid(row=0, column=2, padx=2, pady=4)
 
-        self.listbox = tk.Listbox(self.sidebar, activestyle="dotbox", height=20)
-        self.listbox.pack(fill="both", expand=True, padx=10, pady=(6, 10))
-        self.listbox.bind("<<ListboxSelect>>", self.on_select_notebook)
+        # Recherche plein texte dans tous les carnets
+        self.search_var = tk.StringVar()
+        search = ttk.Entry(self.sidebar, textvariable=self.search_var)
+        search.pack(fill="x", padx=10, pady=(6, 0))
+        search.bind("<Return>", self.run_search)
+        search.bind("<Escape>", self.clear_search)
+        self.search_results = tk.Listbox(self.sidebar, activestyle="dotbox", height=8)
+        self.search_results.bind("<<ListboxSelect>>", self.on_select_search_hit)
+        self._search_hits: list[dict] = []
+
+        # Filtre sur les titres (à la frappe) et tri de la liste
+        filter_row = ttk.Frame(self.sidebar)
+        filter_row.pack(fill="x", padx=10, pady=(6, 0))
+        self.filter_var = tk.StringVar()
+        self.filter_entry = ttk.Entry(filter_row, textvariable=self.filter_var, width=14)
+        self.filter_entry.pack(side="left", fill="x", expand=True)
+        self.filter_var.trace_add("write", lambda *_: self.apply_filter())
+        self.filter_entry.bind("<Escape>", lambda e: self.filter_var.set(""))
+        self.filter_entry.bind("<Down>", lambda e: self.notebook_list.canvas.focus_set())
+        self.sort_var = tk.StringVar(value="Titre")
+        sort = ttk.Combobox(filter_row, textvariable=self.sort_var, values=("Titre", "Récents"),
+                            state="readonly", width=8)
+        sort.pack(side="left", padx=(4, 0))
+        sort.bind("<<ComboboxSelected>>", self.apply_sort)
+
+        self.notebook_list = VirtualList(self.sidebar, self.library, on_select=self.on_select_notebook,
+                                         on_type=self.type_to_filter)
+        self.notebook_list.pack(fill="both", expand=True, padx=10, pady=(6, 0))
+        # Totaux de la bibliothèque, calculés à partir des entrées de la liste
+        self.library_stats_var = tk.StringVar(value="")
+        ttk.Label(self.sidebar, textvariable=self.library_stats_var, foreground="#8a7f6a",
+                  font=("Georgia", 9)).pack(anchor="w", padx=12, pady=(2, 8))
 
         foot = ttk.Frame(self.sidebar)
         foot.pack(fill="x", padx=10, pady=(0,10))
         ttk.Button(foot, text="Importer…", command=self.import_notebook).grid(row=0, column=0, padx=2)
-        ttk.Button(foot, text="Exporter…", command=self.export_notebook).grid(row=0, column=1, padx=2)
+        ttk.Button(foot, text="Dossier…", command=self.import_folder).grid(row=0, column=1, padx=2)
+        ttk.Button(foot, text="Exporter…", command=self.export_notebook).grid(row=0, column=2, padx=2)
+        ttk.Button(foot, text="Tout exporter…", command=self.export_library).grid(row=1, column=0, columnspan=2,
+                                                                                sticky="w", padx=2, pady=(4, 0))
+        ttk.Button(foot, text="Compacter", command=self.compact_notebook).grid(row=1, column=2, padx=2, pady=(4, 0))
+        ttk.Button(foot, text="📊 Diagnostics", command=self.show_diagnostics).grid(row=2, column=0, columnspan=2,
+                                                                                  sticky="w", padx=2, pady=(4, 0))
+        ttk.Button(foot, text="Réindexer", command=self.rebuild_search_index).grid(row=2, column=2, padx=2,
+                                                                                 pady=(4, 0))
+        ttk.Button(foot, text="🔄 Synchroniser", command=self.start_sync).grid(row=3, column=0, columnspan=2,
+                                                                             sticky="w", padx=2, pady=(4, 0))
+
+    def _on_first_map(self, event):
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        self.after_idle(self._first_paint)
+
+    def _first_paint(self):
+        self.update_idletasks()
+        if diagnostics.ENABLED:
+            diagnostics.record("ui.first_paint", (time.perf_counter() - self._started) * 1000)
+        self.refresh_library()
+        if self._restore_fullscreen and self.current_notebook:
+            self.enter_fullscreen()
 
+    @timed("ui.refresh_library")
     def refresh_library(self):
-        items = []
-        for name in sorted(os.listdir(LIB_DIR)):
-            if name.lower().endswith(".json"):
-                items.append(os.path.join(LIB_DIR, name))
-        self.listbox.delete(0, tk.END)
-        for p in items:
-            try:
-                with open(p, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    title = data.get("title") or os.path.splitext(os.path.basename(p))[0]
-            except Exception:
-                title = os.path.splitext(os.path.basename(p))[0]
-            self.listbox.insert(tk.END, title)
-            self.listbox.itemconfig(tk.END, foreground="#333")
-        # Sélectionner le premier élément si rien d'ouvert
-        if items and not self.current_notebook:
-            self.listbox.selection_set(0)
-            self.open_notebook_by_index(0)
+        # FileStorage: un seul scandir; les carnets connus s'affichent tout de suite, ceux à relire
+        # avec un titre provisoire, remplacé à mesure que le pool de threads les lit (_library_scan_step)
+        if self._scan is not None:
+            self._scan.close()
+            self._scan = None
+        scan = self.storage.scan()
+        self.library.set_entries(self.storage.list_notebooks() if scan is None else scan.entries)
+        # Seules les lignes visibles sont redessinées
+        self.notebook_list.redraw()
+        self.update_library_stats()
+        # Ouvrir le premier carnet si rien d'ouvert (sans attendre la fin de la lecture)
+        if len(self.library) and not self.current_notebook:
+            self.notebook_list.select(self.library[0]["path"], notify=True)
+        elif self.current_notebook:
+            # Carnet rouvert par restore_session avant la lecture de la bibliothèque
+            self.select_current_in_list()
+        if scan is None:
+            self.storage.flush()
+            return
+        self._scan = scan
+        self._scan_t0 = time.perf_counter()
+        self._library_scan_step()
+
+    def _library_scan_step(self):
+        scan = self._scan
+        if scan is None:
+            return
+        finished = scan.step(0.02)
+        ready = scan.take_ready()
+        if ready:
+            # Pas de select_current_in_list: la liste ne doit pas sauter vers la sélection à chaque lot
+            self.library.apply(ready, [])
+            self.notebook_list.redraw()
+            self.update_library_stats()
+        if not finished:
+            self.status_var.set(f"⏳ Lecture de la bibliothèque… {scan.done} / {scan.total}")
+            self.after(1, self._library_scan_step)
+            return
+        self._scan = None
+        self.storage.flush()
+        if scan.total:
+            self.status_var.set("")
+        if diagnostics.ENABLED:
+            diagnostics.record("ui.library_scan", (time.perf_counter() - self._scan_t0) * 1000)
 
     def lib_paths(self):
-        paths = []
-        for name in os.listdir(LIB_DIR):
-            if name.lower().endswith(".json"):
-                paths.append(os.path.join(LIB_DIR, name))
-        return sorted(paths)
-
-    def on_select_notebook(self, event=None):
-        idxs = self.listbox.curselection()
-        if not idxs:
+        # Chemins dans l'ordre affiché (tri et filtre courants)
+        return [entry["path"] for entry in self.library.rows]
+
+    def on_select_notebook(self, path: str):
+        if self.current_notebook and self.current_notebook.path == path:
             return
-        self.open_notebook_by_index(idxs[0])
+        self.open_notebook(path)
+        # Si l'ouverture est annulée, la sélection revient au carnet courant
+        self.select_current_in_list()
+
+    def apply_filter(self):
+        self.library.set_filter(self.filter_var.get())
+        self.notebook_list.top = 0
+        self.select_current_in_list()
 
-    def open_notebook_by_index(self, idx: int):
-        paths = self.lib_paths()
-        if 0 <= idx < len(paths):
-            self.open_notebook(paths[idx])
+    def apply_sort(self, event=None):
+        self.library.set_sort("updated_at" if self.sort_var.get() == "Récents" else "title")
+        self.select_current_in_list()
+
+    def type_to_filter(self, char: str):
+        self.filter_entry.focus_set()
+        self.filter_entry.insert(tk.END, char)
 
-    def open_notebook(self, path: str):
+    def open_notebook(self, path: str, page_index: int | None = None):
+        """Ouvre un carnet à `page_index`, ou à la page et au curseur où on l'avait quitté."""
         if not self.confirm_save_changes():
             return
-        try:
-            nb = Notebook.load(path)
-        except Exception as e:
-            messagebox.showerror("Erreur", f"Impossible d'ouvrir le carnet:\n{e}")
-            return
+        self.stash_current_notebook()
+        entry = self.cache.take(path)
+        if entry is not None:
+            nb, page, cursor = entry.notebook, entry.page, entry.cursor
+        else:
+            page, cursor = self.cache.position(path)
+            try:
+                nb = self.storage.load(path)
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Impossible d'ouvrir le carnet:\n{e}")
+                self.update_title()
+                self.clear_editor()
+                return
+        if page_index is not None:
+            page, cursor = page_index, "1.0"
         self.current_notebook = nb
-        self.current_page_index = 0
+        self.current_page_index = min(page, len(nb.data["pages"]) - 1)
         self.update_title()
         self.load_page()
+        self.restore_cursor(cursor)
+
+    def stash_current_notebook(self):
+        """Quitte le carnet courant: il reste en cache (NotebookCache) avec sa page et son curseur."""
+        nb = self.current_notebook
+        if not nb:
+            return
+        self.current_notebook = None
+        try:
+            # Peut évincer un carnet plus ancien (sauvegardé et compacté avant d'être fermé)
+            self.cache.put(nb, self.current_page_index, self.text.index("insert"))
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Sauvegarde impossible:\n{e}")
 
     def new_notebook(self):
         title = simpledialog.askstring("Nouveau carnet", "Titre du carnet:")
         if not title:
             return
-        nb = Notebook.create_new(title)
+        self.ensure_page_saved()
+        self.stash_current_notebook()
+        nb = self.storage.create(title)
         self.current_notebook = nb
         self.current_page_index = 0
         self.refresh_library()
@@ -239,20 +608,15 @@ class App(tk.Tk):
         title = simpledialog.askstring("Renommer", "Nouveau titre:", initialvalue=self.current_notebook.title)
         if not title:
             return
-        # renommer le fichier aussi (slug)
-        new_path = os.path.join(LIB_DIR, f"{slugify(title)}.json")
-        if os.path.abspath(new_path) != os.path.abspath(self.current_notebook.path):
-            if os.path.exists(new_path):
-                messagebox.showerror("Conflit", "Un carnet avec ce nom existe déjà.")
-                return
-            try:
-                os.replace(self.current_notebook.path, new_path)
-            except Exception as e:
-                messagebox.showerror("Erreur", f"Impossible de renommer:\n{e}")
-                return
-            self.current_notebook.path = new_path
-        self.current_notebook.data["title"] = title
-        self.current_notebook.save()
+        try:
+            self.writer.flush()
+            self.storage.rename(self.current_notebook, title)
+        except FileExistsError:
+            messagebox.showerror("Conflit", "Un carnet avec ce nom existe déjà.")
+            return
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Impossible de renommer:\n{e}")
+            return
         self.refresh_library()
         self.select_current_in_list()
         self.update_title()
@@ -263,7 +627,8 @@ class App(tk.Tk):
         if not messagebox.askyesno("Supprimer", f"Supprimer définitivement '{self.current_notebook.title}' ?"):
             return
         try:
-            os.remove(self.current_notebook.path)
+            self.writer.flush()
+            self.storage.delete(self.current_notebook)
         except Exception as e:
             messagebox.showerror("Erreur", f"Suppression impossible:\n{e}")
             return
@@ -273,61 +638,284 @@ class App(tk.Tk):
         self.update_title()
         self.clear_editor()
 
+    def compact_current(self, force: bool = False):
+        if not self.current_notebook:
+            return
+        # Les écritures en attente doivent passer avant la réécriture complète
+        self.writer.flush()
+        if force or self.current_notebook.needs_compaction():
+            try:
+                self.current_notebook.compact()
+            except OSError as e:
+                messagebox.showerror("Erreur", f"Compactage impossible:\n{e}")
+
+    def compact_notebook(self):
+        if not self.current_notebook:
+            return
+        self.ensure_page_saved()
+        self.compact_current(force=True)
+        self.status_var.set("✅ Carnet compacté")
+
+    def show_diagnostics(self):
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        self.diagnostics_window = DiagnosticsWindow(self)
+
+    def show_history(self):
+        if not self.current_notebook:
+            return
+        # La version en cours d'édition fait partie de l'historique affiché
+        self.ensure_page_saved()
+        self.writer.flush()
+        self.handle_save_results()
+        if self.history_window is not None and self.history_window.winfo_exists():
+            self.history_window.destroy()
+        self.history_window = HistoryWindow(self, self.current_notebook, self.current_page_index)
+
+    def restore_page_version(self, path: str, page: int, content: str) -> bool:
+        """Remplace le texte d'une page du carnet ouvert par une version de l'historique."""
+        nb = self.current_notebook
+        if nb is None or nb.path != path or page >= len(nb.data["pages"]):
+            return False
+        if page != self.current_page_index:
+            self.ensure_page_saved()
+            self.current_page_index = page
+            self.load_page()
+        # Restauration annulable (Ctrl+Z) et elle-même enregistrée comme nouvelle version
+        self.text.edit_separator()
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", content)
+        self.text.edit_separator()
+        self.ensure_page_saved()
+        self.writer.flush()
+        self.handle_save_results()
+        self.status_var.set(f"🕓 Page {page + 1} restaurée")
+        return True
+
     def export_notebook(self):
         if not self.current_notebook:
             return
-        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")],
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=EXPORT_FILETYPES,
                                             initialfile=f"{slugify(self.current_notebook.title)}.json")
         if not path:
             return
         try:
             self.ensure_page_saved()
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.current_notebook.data, f, ensure_ascii=False, indent=2)
+            # Format d'après l'extension choisie; écrit page par page
+            nb = self.current_notebook
+            export_notebook(dict(nb.data, title=nb.title), path)
             messagebox.showinfo("Export", "Carnet exporté ✅")
         except Exception as e:
             messagebox.showerror("Erreur", f"Export impossible:\n{e}")
 
     def import_notebook(self):
-        path = filedialog.askopenfilename(filetypes=[("JSON", "*.json")])
-        if not path:
+        paths = filedialog.askopenfilenames(filetypes=[("Carnets JSON ou archive", "*.json *.gz *.xz *.zip"),
+                                                       ("JSON", "*.json *.gz *.xz"), ("Archive ZIP", "*.zip")])
+        if paths:
+            self.start_import(list(paths))
+
+    def import_folder(self):
+        path = filedialog.askdirectory(title="Importer tous les carnets JSON d'un dossier")
+        if path:
+            self.start_import([path])
+
+    def start_import(self, paths: list[str]):
+        if self._transfer is not None:
+            messagebox.showwarning("Attention", "Un import ou un export est déjà en cours.")
             return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            title = data.get("title") or os.path.splitext(os.path.basename(path))[0]
-            dest = os.path.join(LIB_DIR, f"{slugify(title)}.json")
-            # éviter collision
-            base = os.path.splitext(dest)[0]
-            i = 1
-            while os.path.exists(dest):
-                dest = f"{base}-{i}.json"
-                i += 1
-            with open(dest, "w", encoding="utf-8") as out:
-                json.dump(data, out, ensure_ascii=False, indent=2)
-            self.refresh_library()
-            messagebox.showinfo("Import", "Carnet importé ✅")
+            bulk = BulkImport(self.storage, collect_sources(paths))
         except Exception as e:
             messagebox.showerror("Erreur", f"Import impossible:\n{e}")
+            return
+        self.run_transfer(bulk, self.import_done)
+
+    def import_done(self, bulk: BulkImport):
+        self.refresh_library()
+        message = f"{len(bulk.imported)} carnet(s) importé(s) ✅"
+        if bulk.errors:
+            details = "\n".join(f"{label}: {error}" for label, error in bulk.errors[:10])
+            more = f"\n… et {len(bulk.errors) - 10} autre(s)" if len(bulk.errors) > 10 else ""
+            messagebox.showwarning("Import", f"{message}\n{len(bulk.errors)} fichier(s) ignoré(s) :\n{details}{more}")
+        else:
+            messagebox.showinfo("Import", message)
+
+    def export_library(self):
+        if self._transfer is not None:
+            messagebox.showwarning("Attention", "Un import ou un export est déjà en cours.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".zip", filetypes=LIBRARY_EXPORT_FILETYPES,
+                                            initialfile="foleskine.zip")
+        if not path:
+            return
+        try:
+            self.ensure_page_saved()
+            # Les carnets modifiés doivent être sur disque avant d'être relus
+            self.writer.flush()
+            # Rendu des carnets dans un pool de processus; la progression s'affiche dans la barre de statut
+            bulk = BulkExport(self.storage, path, list(self.library.entries.values()), library_export_format(path))
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Export impossible:\n{e}")
+            return
+        self.run_transfer(bulk, self.export_library_done, "Export")
+
+    def export_library_done(self, bulk: BulkExport):
+        message = f"{bulk.total - len(bulk.errors)} carnet(s) exporté(s) ✅"
+        if bulk.errors:
+            details = "\n".join(f"{path}: {error}" for path, error in bulk.errors[:10])
+            messagebox.showwarning("Export", f"{message}\n{len(bulk.errors)} échec(s) :\n{details}")
+        else:
+            messagebox.showinfo("Export", message)
+
+    def run_transfer(self, bulk, on_done, label: str = ""):
+        # Petites étapes depuis la boucle Tk: l'interface reste réactive pendant l'opération
+        self._transfer = bulk
+        self.progress.configure(maximum=max(1, bulk.total), value=0)
+        self.progress.pack(side="right", padx=(0, 8))
+        self._transfer_step(on_done, f"{label} : " if label else "")
+
+    def _transfer_step(self, on_done, prefix: str = ""):
+        bulk = self._transfer
+        try:
+            finished = bulk.step(0.03)
+        except Exception as e:
+            bulk.close()
+            finished = None
+            messagebox.showerror("Erreur", f"Opération interrompue:\n{e}")
+        self.progress.configure(value=bulk.done)
+        self.status_var.set(f"⏳ {prefix}{bulk.done} / {bulk.total}")
+        if finished is False:
+            self.after(15, self._transfer_step, on_done, prefix)
+            return
+        self._transfer = None
+        self.progress.pack_forget()
+        self.status_var.set("")
+        if finished:
+            on_done(bulk)
 
     def select_current_in_list(self):
-        if not self.current_notebook:
+        # Recherche par chemin dans le modèle (dictionnaire) : aucune lecture de fichier
+        self.notebook_list.select(self.current_notebook.path if self.current_notebook else None)
+
+    # ---------------------- Recherche ----------------------
+    def run_search(self, event=None):
+        query = self.search_var.get().strip()
+        if not query:
+            self.clear_search()
             return
-        titles = []
-        for p in self.lib_paths():
-            try:
-                with open(p, "r", encoding="utf-8") as f:
-                    d = json.load(f)
-                    titles.append(d.get("title") or os.path.splitext(os.path.basename(p))[0])
-            except Exception:
-                titles.append(os.path.splitext(os.path.basename(p))[0])
+        # La page en cours d'édition doit être indexée avant de chercher
+        self.ensure_page_saved()
+        self.writer.flush()
+        self.handle_save_results()
+        if self._transfer is None:
+            build = self.storage.reindex()
+            if build is not None and build.total >= INDEX_STEPS_MIN:
+                # Beaucoup de carnets à indexer (première recherche, import): par étapes, barre de progression
+                self.run_transfer(build, lambda _build: self.show_search_results(query))
+                return
+            if build is not None:
+                build.step(None)
+        self.show_search_results(query)
+
+    def show_search_results(self, query: str):
+        self._search_hits = self.storage.search(query)
+        self.search_results.delete(0, tk.END)
+        for hit in self._search_hits:
+            self.search_results.insert(tk.END, f"{hit['title']} p.{hit['page'] + 1} — {hit['snippet']}")
+        if not self.search_results.winfo_ismapped():
+            self.search_results.pack(fill="x", padx=10, pady=(4, 0), before=self.notebook_list)
+        self.status_var.set(f"🔎 {len(self._search_hits)} résultat(s)")
+
+    def clear_search(self, event=None):
+        self.search_var.set("")
+        self._search_hits = []
+        self.search_results.delete(0, tk.END)
+        self.search_results.pack_forget()
+
+    def on_select_search_hit(self, event=None):
+        idxs = self.search_results.curselection()
+        if not idxs:
+            return
+        hit = self._search_hits[idxs[0]]
+        if self.current_notebook and self.current_notebook.path == hit["path"]:
+            self.ensure_page_saved()
+            self.current_page_index = hit["page"]
+            self.load_page()
+        else:
+            self.open_notebook(hit["path"], hit["page"])
+            self.select_current_in_list()
+        if self.current_notebook and self.current_notebook.path == hit["path"]:
+            # Curseur sur le texte trouvé (après chargement complet pour une grande page)
+            self.restore_cursor(f"1.0+{hit['offset']}c")
+
+    def rebuild_search_index(self):
+        if self._transfer is not None:
+            messagebox.showwarning("Attention", "Un import ou un export est déjà en cours.")
+            return
+        self.ensure_page_saved()
+        self.writer.flush()
+        self.handle_save_results()
         try:
-            idx = titles.index(self.current_notebook.title)
-            self.listbox.selection_clear(0, tk.END)
-            self.listbox.selection_set(idx)
-            self.listbox.see(idx)
-        except ValueError:
-            pass
+            build = self.storage.reindex(full=True)
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Réindexation impossible:\n{e}")
+            return
+        if build is None:
+            self.status_var.set("✅ Index de recherche reconstruit")
+            return
+        self.run_transfer(build, self.rebuild_search_index_done)
+
+    def rebuild_search_index_done(self, build):
+        message = f"{build.total} carnet(s) indexé(s) ✅"
+        if build.errors:
+            details = "\n".join(f"{path}: {error}" for path, error in build.errors[:10])
+            messagebox.showwarning("Index de recherche",
+                                   f"{message}\n{len(build.errors)} carnet(s) illisible(s) :\n{details}")
+        else:
+            self.status_var.set(message)
+
+    # ---------------------- Synchronisation ----------------------
+    def start_sync(self, auto: bool = False):
+        # Réseau et écritures sur un thread à part; les carnets reçus sont relus via le watcher
+        if self._sync is not None:
+            return
+        url = SETTINGS["sync_url"]
+        if not url or not isinstance(self.storage, FileStorage):
+            if not auto:
+                messagebox.showinfo("Synchronisation",
+                                    "Indiquez l'adresse du serveur dans le réglage \"sync_url\" "
+                                    "(stockage en fichiers uniquement).\n\n"
+                                    "Serveur de test : python -m foleskine sync-server")
+            return
+        # La page en cours d'édition part avec cette synchronisation
+        self.ensure_page_saved()
+        self.writer.flush()
+        self.handle_save_results()
+        from foleskine.sync import BackgroundSync
+        self._sync = BackgroundSync(self.storage.lib_dir, url)
+        self._sync.start()
+        self.status_var.set("🔄 Synchronisation…")
+        self.after(200, self.poll_sync)
+
+    def poll_sync(self):
+        sync = self._sync
+        if sync.is_alive():
+            self.after(200, self.poll_sync)
+            return
+        self._sync = None
+        if sync.error is not None:
+            self.status_var.set(f"⚠️ Synchronisation impossible : {sync.error}")
+            return
+        from foleskine.sync import summary_text
+        message = f"🔄 {summary_text(sync.summary)}"
+        if sync.summary["errors"]:
+            message += f" — {len(sync.summary['errors'])} carnet(s) non synchronisé(s)"
+        self.status_var.set(message)
+
+    def periodic_sync(self):
+        self.start_sync(auto=True)
+        self.after(SETTINGS["sync_interval_s"] * 1000, self.periodic_sync)
 
     # ---------------------- Zone principale ----------------------
     def _build_main(self):
@@ -347,7 +935,8 @@ class App(tk.Tk):
         ttk.Button(toolbar, text="▶", width=3, command=self.next_page).grid(row=0, column=2, padx=2)
         ttk.Button(toolbar, text="+ Page", command=self.add_page).grid(row=0, column=3, padx=6)
         ttk.Button(toolbar, text="Aller…", command=self.goto_page_dialog).grid(row=0, column=4, padx=2)
-        ttk.Button(toolbar, text="🖥️", width=4, command=self.toggle_fullscreen).grid(row=0, column=5, padx=6)
+        ttk.Button(toolbar, text="🕓", width=3, command=self.show_history).grid(row=0, column=5, padx=2)
+        ttk.Button(toolbar, text="🖥️", width=4, command=self.toggle_fullscreen).grid(row=0, column=6, padx=6)
 
         # Cadre "papier"
         paper_frame = tk.Frame(self.main, bg="#f3ebd9", bd=0, highlightthickness=1, highlightbackground="#e0d8c6")
@@ -360,15 +949,25 @@ class App(tk.Tk):
         self.text = tk.Text(inner, wrap="word", font=("Georgia", 14), bg="#f3ebd9", relief="flat", undo=True)
         self.text.pack(expand=True, fill="both")
         self.text.bind("<KeyRelease>", self.on_text_change)
+        # Drapeau "modifié" de Tk: partagé avec le pair plein écran (même tampon)
+        self.text.bind("<<Modified>>", self.update_dirty_indicator)
 
         # Bind undo/redo
         self.text.bind("<Control-z>", lambda e: self.text.edit_undo())
         self.text.bind("<Control-y>", lambda e: self.text.edit_redo())
 
         # Barre de statut
+        status_bar = ttk.Frame(self.main)
+        status_bar.grid(row=3, column=0, sticky="ew", pady=(6,0))
         self.status_var = tk.StringVar(value="Prêt")
-        status = ttk.Label(self.main, textvariable=self.status_var)
-        status.grid(row=3, column=0, sticky="ew", pady=(6,0))
+        ttk.Label(status_bar, textvariable=self.status_var).pack(side="left")
+        self.dirty_var = tk.StringVar(value="")
+        ttk.Label(status_bar, textvariable=self.dirty_var, foreground="#a0522d").pack(side="right")
+        # Statistiques de la page et du carnet courants (mises à jour au chargement et à chaque sauvegarde)
+        self.stats_var = tk.StringVar(value="")
+        ttk.Label(status_bar, textvariable=self.stats_var, foreground="#8a7f6a").pack(side="right", padx=(0, 12))
+        # Affichée seulement pendant un import ou un export en masse
+        self.progress = ttk.Progressbar(status_bar, length=160, mode="determinate")
 
     def update_title(self):
         if self.current_notebook:
@@ -377,35 +976,256 @@ class App(tk.Tk):
             self.title_var.set("(aucun carnet)")
 
     def clear_editor(self):
+        self.cancel_page_load()
         self.text.delete("1.0", tk.END)
+        self.text.edit_modified(False)
         self.page_label_var.set("—/—")
+        self.stats_var.set("")
 
+    @timed("ui.load_page")
     def load_page(self):
         if not self.current_notebook:
             self.clear_editor()
             return
+        self.cancel_page_load()
         pages = self.current_notebook.data.get("pages", [""])
         self.text.delete("1.0", tk.END)
         try:
             content = pages[self.current_page_index]
         except IndexError:
             content = ""
-        self.text.insert("1.0", content)
+        self.status_var.set("")
+        if len(content) <= LOAD_FIRST_CHARS:
+            self.text.insert("1.0", content)
+        else:
+            self.start_page_load(content)
+        # Le chargement n'est pas une modification
+        self.text.edit_modified(False)
         self.page_label_var.set(f"Page {self.current_page_index+1} / {len(pages)}")
+        self.update_stats()
+
+    # ---------------------- Statistiques ----------------------
+    # Les totaux d'un carnet sont tenus à jour par ses sauvegardes (Notebook.stats),
+    # ceux de la bibliothèque viennent des entrées de la liste: aucun carnet n'est relu.
+
+    def update_stats(self):
+        """Statistiques de la page et du carnet courants, dans la barre de statut et la liste."""
+        nb = self.current_notebook
+        if nb is None:
+            self.stats_var.set("")
+            return
+        words, chars = nb.page_stats(self.current_page_index)
+        stats = nb.stats
+        updated_at = nb.data.get("updated_at") or ""
+        text = (f"Page : {format_count(words)} mots, {format_count(chars)} car. — "
+                f"Carnet : {stats['pages']} p., {format_count(stats['words'])} mots")
+        if updated_at:
+            text += f", modifié le {format_date(updated_at, with_time=True)}"
+        self.stats_var.set(text)
+        self.library.update(nb.path, title=nb.title, updated_at=updated_at, pages=stats["pages"],
+                            words=stats["words"], chars=stats["chars"])
+        self.notebook_list.redraw()
+        self.update_library_stats()
+
+    def update_library_stats(self):
+        totals = self.library.totals()
+        self.library_stats_var.set(f"{format_count(totals['notebooks'])} carnets · "
+                                   f"{format_count(totals['pages'])} pages · {format_count(totals['words'])} mots")
+
+    # ---------------------- Chargement progressif ----------------------
+    # Une grande page affiche tout de suite son premier écran; la suite est
+    # insérée par tranches de LOAD_SLICE_S entre deux événements, à la marque
+    # LOAD_MARK (la saisie reste possible dans la partie déjà affichée).
+    # ensure_page_saved termine le chargement avant de relire le tampon: la
+    # page sauvegardée est toujours complète.
+
+    def start_page_load(self, content: str):
+        first = chunk_end(content, 0, LOAD_FIRST_CHARS)
+        self.text.insert("1.0", content[:first])
+        self.text.mark_set("insert", "1.0")
+        self.text.mark_set(LOAD_MARK, "end-1c")
+        self.text.mark_gravity(LOAD_MARK, "right")
+        # Les morceaux insérés ne sont pas des actions à annuler
+        self.text.configure(undo=False)
+        self._load_content = content
+        self._load_pos = first
+        self._load_t0 = time.perf_counter()
+        self._load_after_id = self.after(1, self._page_load_step)
+
+    def _page_load_step(self):
+        content = self._load_content
+        user_modified = self.text.edit_modified()
+        deadline = time.perf_counter() + LOAD_SLICE_S
+        while self._load_pos < len(content) and time.perf_counter() < deadline:
+            end = chunk_end(content, self._load_pos, LOAD_CHUNK_CHARS)
+            self.text.insert(LOAD_MARK, content[self._load_pos:end])
+            self._load_pos = end
+        # Seule une frappe de l'utilisateur compte comme modification
+        self.text.edit_modified(user_modified)
+        if self._load_pos < len(content):
+            self.status_var.set(f"⏳ Chargement de la page… {self._load_pos * 100 // len(content)} %")
+            self._load_after_id = self.after(1, self._page_load_step)
+        else:
+            self._page_load_done()
+
+    def finish_page_load(self):
+        """Insère d'un coup la fin d'une page en cours de chargement."""
+        if self._load_content is None:
+            return
+        self.after_cancel(self._load_after_id)
+        user_modified = self.text.edit_modified()
+        self.text.insert(LOAD_MARK, self._load_content[self._load_pos:])
+        self.text.edit_modified(user_modified)
+        self._page_load_done()
+
+    def _page_load_done(self):
+        if diagnostics.ENABLED:
+            diagnostics.record("ui.load_page.stream", (time.perf_counter() - self._load_t0) * 1000)
+        position = self._load_cursor
+        self.cancel_page_load()
+        # La pile d'annulation ne doit pas mener à une page à moitié chargée
+        self.text.edit_reset()
         self.status_var.set("")
+        if position is not None:
+            self.restore_cursor(*position)
 
+    def restore_cursor(self, cursor: str, top: str | None = None):
+        """Place le curseur (index Tk) et, si donnée, la première ligne visible `top`.
+
+        Pendant un chargement progressif, une fois la page complète.
+        """
+        if self._load_content is not None:
+            self._load_cursor = (cursor, top)
+            return
+        self.text.mark_set("insert", cursor)
+        if top is None:
+            self.text.see("insert")
+        else:
+            self.text.yview(top)
+
+    def cancel_page_load(self):
+        if self._load_content is None:
+            return
+        if self._load_after_id is not None:
+            self.after_cancel(self._load_after_id)
+        self._load_content = None
+        self._load_after_id = None
+        self._load_cursor = None
+        self.text.mark_unset(LOAD_MARK)
+        self.text.configure(undo=True)
+
+    @timed("ui.ensure_page_saved")
     def ensure_page_saved(self):
         if not self.current_notebook:
             return
-        content = self.text.get("1.0", "end-1c")
-        pages = self.current_notebook.data["pages"]
-        while self.current_page_index >= len(pages):
-            pages.append("")
-        if pages[self.current_page_index] != content:
-            pages[self.current_page_index] = content
-            self.current_notebook.save()
-            self.status_var.set("✅ Sauvegardé")
+        nb = self.current_notebook
+        self.finish_page_load()
+        # Sans frappe depuis la dernière sauvegarde, on ne relit pas le tampon
+        if self.text.edit_modified():
+            nb.set_page(self.current_page_index, self.text.get("1.0", "end-1c"))
+            self.text.edit_modified(False)
+        if nb.is_dirty:
+            try:
+                nb.save(writer=self.writer)
+            except NotebookConflict:
+                self.resolve_conflict()
+                return
+            self.status_var.set("💾 Sauvegarde…")
+            self.update_stats()
+        self.update_dirty_indicator()
+
+    def update_dirty_indicator(self, event=None):
+        nb = self.current_notebook
+        dirty = self.text.edit_modified() or (nb is not None and nb.is_dirty)
+        self.dirty_var.set("● Non sauvegardé" if dirty else "")
+
+    def poll_save_results(self):
+        # Relève les résultats du thread d'écriture (seul le thread Tk touche à l'UI et à l'index)
+        self.handle_save_results()
+        self.after(200, self.poll_save_results)
+
+    def handle_save_results(self) -> list[Exception]:
+        errors = []
+        while True:
+            try:
+                job, error = self.writer.results.get_nowait()
+            except queue.Empty:
+                return errors
+            if error is not None:
+                errors.append(error)
+                job.notebook.save_failed()
+                self.update_dirty_indicator()
+                self.status_var.set(f"⚠️ Échec de la sauvegarde : {error}")
+            else:
+                job.notebook.write_done(job)
+                LIBRARY.record(job.notebook)
+                self.status_var.set("✅ Sauvegardé")
+
+    def poll_library_changes(self):
+        # Nos propres écritures passent d'abord dans l'index: elles ne seront pas relues
+        self.handle_save_results()
+        changes = self.watcher.poll()
+        if changes is None:
+            self.refresh_library()
+        elif changes:
+            updated, removed = self.storage.apply_changes(changes)
+            if updated or removed:
+                self.library.apply(updated, removed)
+                self.select_current_in_list()
+                self.update_library_stats()
+        if changes is None or changes:
+            self.check_current_on_disk()
+        self.after(self.watcher.INTERVAL_MS, self.poll_library_changes)
+
+    def check_current_on_disk(self):
+        nb = self.current_notebook
+        if nb is None or self._resolving_conflict or not nb.changed_on_disk():
+            return
+        if self.text.edit_modified() or nb.is_dirty:
+            # Le conflit sera proposé à la prochaine sauvegarde
+            self.status_var.set("⚠️ Carnet modifié hors de l'application")
+            return
+        self.reload_current_notebook()
+        self.status_var.set("🔄 Carnet rechargé (modifié hors de l'application)")
+
+    def reload_current_notebook(self):
+        """Relit le carnet courant depuis le disque, sans le sauvegarder ni le compacter."""
+        nb = self.current_notebook
+        cursor = self.text.index("insert")
+        nb.close()
+        self.current_notebook = None
+        self.open_notebook(nb.path, self.current_page_index)
+        if self.current_notebook is None:
+            # Supprimé hors de l'application
+            self.update_title()
+            self.clear_editor()
+            return
+        self.restore_cursor(cursor)
 
+    def resolve_conflict(self):
+        # Un seul dialogue à la fois: les autosauvegardes continuent pendant qu'il est ouvert
+        if self._resolving_conflict:
+            return
+        self._resolving_conflict = True
+        nb = self.current_notebook
+        try:
+            reload = messagebox.askyesno(
+                "Conflit", f"« {nb.title} » a été modifié en dehors de l'application.\n\n"
+                           "Oui : recharger la version du disque (vos modifications non sauvegardées sont perdues).\n"
+                           "Non : remplacer la version du disque par la vôtre.", icon="warning")
+            if reload:
+                self.reload_current_notebook()
+            else:
+                self.writer.flush()
+                nb.overwrite_disk()
+                self.status_var.set("✅ Sauvegardé (version du disque remplacée)")
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Sauvegarde impossible:\n{e}")
+        finally:
+            self._resolving_conflict = False
+        self.update_dirty_indicator()
+
+    @timed("ui.on_text_change")
     def on_text_change(self, event=None):
         # Autosave après 1 seconde sans frappe
         if self._autosave_after_id is not None:
@@ -414,8 +1234,51 @@ class App(tk.Tk):
 
     def periodic_autosave(self):
         self.ensure_page_saved()
+        self.storage.flush()
+        self.write_session()
         self.after(30_000, self.periodic_autosave)
 
+    # ---------------------- Session ----------------------
+    def restore_session(self, session: dict):
+        """Rouvre le carnet, la page, le curseur et le défilement de la dernière session."""
+        path = session.get("notebook")
+        if not isinstance(path, str):
+            return
+        try:
+            nb = self.storage.load(path)
+        except Exception:
+            # Supprimé, déplacé ou autre stockage: la bibliothèque ouvrira le premier carnet
+            return
+        page = session.get("page")
+        self.current_notebook = nb
+        self.current_page_index = min(page if isinstance(page, int) and page > 0 else 0, len(nb.data["pages"]) - 1)
+        self.update_title()
+        self.load_page()
+        cursor, top = session.get("cursor"), session.get("top")
+        self.restore_cursor(cursor if is_text_index(cursor) else "1.0", top if is_text_index(top) else None)
+        self._restore_fullscreen = bool(session.get("fullscreen"))
+
+    def session_state(self) -> dict:
+        state = {"geometry": self.geometry(), "fullscreen": self.is_fullscreen}
+        nb = self.current_notebook
+        if nb is not None:
+            # En plein écran, le curseur et le défilement sont ceux du pair (même tampon)
+            text = self.fullscreen_text or self.text
+            cursor, top = self._load_cursor or (text.index("insert"), text.index("@0,0"))
+            state.update(notebook=nb.path, page=self.current_page_index, cursor=cursor, top=top)
+        return state
+
+    def write_session(self, state: dict | None = None):
+        state = self.session_state() if state is None else state
+        if state == self._session:
+            return
+        try:
+            save_session(state)
+        except OSError:
+            # Confort seulement: la session suivante s'ouvrira sur le premier carnet
+            return
+        self._session = state
+
     def prev_page(self):
         if not self.current_notebook:
             return
@@ -439,9 +1302,8 @@ class App(tk.Tk):
         if not self.current_notebook:
             return
         self.ensure_page_saved()
-        self.current_notebook.data["pages"].append("")
-        self.current_page_index = len(self.current_notebook.data["pages"]) - 1
-        self.current_notebook.save()
+        self.current_page_index = self.current_notebook.append_page()
+        self.current_notebook.save(writer=self.writer)
         self.load_page()
 
     def goto_page_dialog(self):
@@ -466,9 +1328,6 @@ class App(tk.Tk):
             self.exit_fullscreen()
 
     def enter_fullscreen(self):
-        # Sauvegarder le contenu actuel avant de passer en pleine écran
-        self.sync_text_content()
-        
         # Créer la fenêtre pleine écran
         self.fullscreen_window = tk.Toplevel(self)
         self.fullscreen_window.title(f"✍️ {self.current_notebook.title} - Page {self.current_page_index + 1}")
@@ -534,29 +1393,26 @@ class App(tk.Tk):
                             command=self.exit_fullscreen, padx=10)
         exit_btn.pack(side="left", padx=(20, 0))
         
-        # Zone de texte principale
-        self.fullscreen_text = tk.Text(text_container, 
-                                      wrap="word", 
-                                      font=("Georgia", 16, "normal"),
-                                      bg="#2c2c2c", 
-                                      fg="#e8e8e8",
-                                      relief="flat",
-                                      bd=0,
-                                      insertbackground="#cccccc",
-                                      selectbackground="#555555",
-                                      undo=True)
+        # Zone de texte principale: pair de self.text, même tampon et même historique d'annulation
+        self.fullscreen_text = TextPeer(text_container, self.text,
+                                        wrap="word",
+                                        font=("Georgia", 16, "normal"),
+                                        bg="#2c2c2c",
+                                        fg="#e8e8e8",
+                                        relief="flat",
+                                        bd=0,
+                                        insertbackground="#cccccc",
+                                        selectbackground="#555555")
         self.fullscreen_text.pack(expand=True, fill="both")
+        self.fullscreen_text.mark_set("insert", self.text.index("insert"))
+        self.fullscreen_text.see("insert")
 
         # Bind undo/redo
         self.fullscreen_text.bind("<Control-z>", lambda e: self.fullscreen_text.edit_undo())
         self.fullscreen_text.bind("<Control-y>", lambda e: self.fullscreen_text.edit_redo())
         
-        # Charger le contenu actuel
-        content = self.text.get("1.0", "end-1c")
-        self.fullscreen_text.insert("1.0", content)
-        
-        # Synchroniser les changements
-        self.fullscreen_text.bind("<KeyRelease>", self.on_fullscreen_text_change)
+        # Les frappes modifient directement le tampon partagé: il suffit de programmer l'autosave
+        self.fullscreen_text.bind("<KeyRelease>", self.on_text_change)
         
         # Focus sur le texte
         self.fullscreen_text.focus_set()
@@ -569,30 +1425,6 @@ class App(tk.Tk):
                                bg="#2c2c2c")
         instructions.pack(pady=(10, 0))
 
-    def sync_text_content(self):
-        """Synchronise le contenu entre la fenêtre normale et pleine écran"""
-        if self.is_fullscreen and self.fullscreen_text:
-            # Copier de pleine écran vers normal
-            content = self.fullscreen_text.get("1.0", "end-1c")
-            self.text.delete("1.0", tk.END)
-            self.text.insert("1.0", content)
-        else:
-            # Copier de normal vers pleine écran
-            content = self.text.get("1.0", "end-1c")
-            if hasattr(self, 'fullscreen_text') and self.fullscreen_text:
-                self.fullscreen_text.delete("1.0", tk.END)
-                self.fullscreen_text.insert("1.0", content)
-
-    def on_fullscreen_text_change(self, event=None):
-        # Synchroniser avec la fenêtre principale
-        if self.fullscreen_text:
-            content = self.fullscreen_text.get("1.0", "end-1c")
-            self.text.delete("1.0", tk.END)
-            self.text.insert("1.0", content)
-            
-        # Déclencher la sauvegarde automatique
-        self.on_text_change(event)
-
     def fullscreen_prev_page(self):
         if not self.current_notebook or self.current_page_index <= 0:
             return
@@ -610,9 +1442,8 @@ class App(tk.Tk):
             self.current_page_index += 1
         else:
             # Ajouter une nouvelle page
-            self.current_notebook.data["pages"].append("")
-            self.current_page_index = len(self.current_notebook.data["pages"]) - 1
-            self.current_notebook.save()
+            self.current_page_index = self.current_notebook.append_page()
+            self.current_notebook.save(writer=self.writer)
         
         self.load_fullscreen_page()
 
@@ -620,28 +1451,18 @@ class App(tk.Tk):
         if not self.current_notebook or not self.fullscreen_text:
             return
         
-        pages = self.current_notebook.data.get("pages", [""])
-        try:
-            content = pages[self.current_page_index]
-        except IndexError:
-            content = ""
-        
-        self.fullscreen_text.delete("1.0", tk.END)
-        self.fullscreen_text.insert("1.0", content)
+        # Le tampon est partagé: charger la page dans self.text l'affiche aussi en pleine écran
+        self.load_page()
         
         # Mettre à jour le titre de la fenêtre
         self.fullscreen_window.title(f"✍️ {self.current_notebook.title} - Page {self.current_page_index + 1}")
-        
-        # Synchroniser avec la fenêtre principale
-        self.text.delete("1.0", tk.END)
-        self.text.insert("1.0", content)
-        self.page_label_var.set(f"Page {self.current_page_index+1} / {len(pages)}")
 
     def exit_fullscreen(self):
         if self.fullscreen_window:
             # Sauvegarder avant de fermer
-            self.sync_text_content()
             self.ensure_page_saved()
+            # Reprendre la position du curseur dans la fenêtre principale
+            self.text.mark_set("insert", self.fullscreen_text.index("insert"))
             
             # Fermer la fenêtre pleine écran
             self.fullscreen_window.destroy()
@@ -659,13 +1480,7 @@ class App(tk.Tk):
         if not self.current_notebook:
             return True
         
-        # Si on est en pleine écran, synchroniser d'abord
-        if self.is_fullscreen:
-            self.sync_text_content()
-        
-        content = self.text.get("1.0", "end-1c")
-        current_saved = self.current_notebook.data["pages"][self.current_page_index]
-        if content != current_saved:
+        if self.text.edit_modified():
             res = messagebox.askyesnocancel("Sauvegarder", "Sauvegarder les modifications avant de continuer ?")
             if res is None:
                 return False
@@ -674,16 +1489,50 @@ class App(tk.Tk):
         return True
 
     def on_close(self):
+        # État pris avant de quitter le plein écran et de fermer le carnet
+        session = self.session_state()
         if self.is_fullscreen:
             self.exit_fullscreen()
         
         if not self.confirm_save_changes():
             return
+        self.write_session(session)
         self.ensure_page_saved()
+        self.stash_current_notebook()
+        try:
+            # Carnets en cache: sauvegardés si besoin, compactés et fermés
+            self.cache.clear()
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Sauvegarde impossible:\n{e}")
+        if self._transfer is not None:
+            self._transfer.close()
+        if self._scan is not None:
+            self._scan.close()
+        if self._sync is not None:
+            # Écritures atomiques: une synchronisation interrompue reprend à la suivante
+            self._sync.join(10)
+        if self.watcher is not None:
+            self.watcher.close()
+        # Vider la file d'écriture avant de détruire la fenêtre
+        self.writer.stop()
+        errors = self.handle_save_results()
+        if errors:
+            messagebox.showerror("Erreur", f"Sauvegarde impossible:\n{errors[-1]}")
+        self.storage.close()
         self.destroy()
 
 # ---------------------- Lancement ----------------------
+def main():
+    # FOLESKINE_PROFILE=<fichier>: profil cProfile de toute la session
+    diagnostics.start_profiler()
+    try:
+        app = App()
+        app.protocol("WM_DELETE_WINDOW", app.on_close)
+        app.mainloop()
+    finally:
+        diagnostics.stop_profiler()
+
 if __name__ == "__main__":
-    app = App()
-    app.protocol("WM_DELETE_WINDOW", app.on_close)
-    app.mainloop()
\ No newline at end of file
+    # Pool de processus de l'import en masse dans un exécutable PyInstaller
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,37 @@
+"""Contrat d'import du cœur: `import foleskine` reste léger et sans effet de bord.
+
+Chaque test lance un interpréteur neuf: les modules déjà chargés par pytest
+ne doivent pas fausser la vérification. Le temps d'import est mesuré à part
+(benchmarks/import_time.py).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = "import sys, foleskine; print(' '.join(sorted(m for m in ('tkinter', 'sqlite3') if m in sys.modules)))"
+
+class ImportContractTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.data_dir = os.path.join(tmp.name, "data")
+
+    def import_foleskine(self) -> str:
+        env = dict(os.environ, FOLESKINE_DATA_DIR=self.data_dir, PYTHONPATH=ROOT)
+        proc = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=env, cwd=ROOT)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        return proc.stdout.strip()
+
+    def test_no_gui_or_database_modules(self):
+        self.assertEqual(self.import_foleskine(), "", "l'import du cœur charge tkinter ou sqlite3")
+
+    def test_data_dir_not_created(self):
+        self.import_foleskine()
+        self.assertFalse(os.path.exists(self.data_dir), "l'import du cœur crée le dossier de données")
+
+if __name__ == "__main__":
+    unittest.main()
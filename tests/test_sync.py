@@ -0,0 +1,151 @@
+"""Synchronisation: fusion à trois voies, échange base/rev avec le serveur, suppressions.
+
+Deux bibliothèques (deux « machines ») se synchronisent avec un SyncServer
+lancé dans le processus, sur un port libre de localhost.
+"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+# Dossier de données jetable avant l'import du paquet (historique, réglages)
+_DATA = tempfile.TemporaryDirectory()
+os.environ["FOLESKINE_DATA_DIR"] = _DATA.name
+
+from foleskine.history import text_hash  # noqa: E402
+from foleskine.sync import (CONFLICT_MARKERS, LibrarySync, SyncClient, SyncError, SyncServer, merge3,  # noqa: E402
+                            merge_notebook)
+
+def tearDownModule():
+    _DATA.cleanup()
+
+def notebook(title: str, pages: list[str], updated_at: str = "2026-01-01T00:00:00") -> dict:
+    return {"title": title, "created_at": "2026-01-01T00:00:00", "updated_at": updated_at, "pages": pages}
+
+class MergeTest(unittest.TestCase):
+    def test_one_side_changed(self):
+        self.assertEqual(merge3("a\n", "a\n", "b\n"), ("b\n", False))
+        self.assertEqual(merge3("a\n", "b\n", "a\n"), ("b\n", False))
+
+    def test_disjoint_lines_merge_cleanly(self):
+        text, conflict = merge3("un\ndeux\ntrois\n", "UN\ndeux\ntrois\n", "un\ndeux\nTROIS\n")
+        self.assertEqual(text, "UN\ndeux\nTROIS\n")
+        self.assertFalse(conflict)
+
+    def test_same_line_conflicts(self):
+        text, conflict = merge3("un\ndeux\n", "un\nici\n", "un\nlà-bas\n")
+        self.assertTrue(conflict)
+        start, sep, end = CONFLICT_MARKERS
+        self.assertEqual(text, "un\n" + start.format("local") + "ici\n" + sep + "là-bas\n" + end.format("serveur"))
+
+    def test_notebook_pages_added_on_both_sides(self):
+        base = notebook("t", ["a"])
+        merged, conflicts = merge_notebook(base, notebook("t", ["a", "local"]), notebook("t", ["a", "distant"]))
+        self.assertEqual(merged["pages"], ["a", "local", "distant"])
+        self.assertEqual(conflicts, 0)
+
+    def test_title_renamed_on_one_side(self):
+        base = notebook("avant", ["a"])
+        merged, _ = merge_notebook(base, notebook("avant", ["a"]), notebook("après", ["a"]))
+        self.assertEqual(merged["title"], "après")
+
+class SyncRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.server = SyncServer(("127.0.0.1", 0), os.path.join(self.root, "server"))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        for machine in ("a", "b"):
+            os.makedirs(os.path.join(self.root, machine, "notebooks"))
+
+    def lib(self, machine: str) -> str:
+        return os.path.join(self.root, machine, "notebooks")
+
+    def sync(self, machine: str) -> dict:
+        summary = LibrarySync(self.lib(machine), SyncClient(self.server.url),
+                              os.path.join(self.root, machine, "sync")).run()
+        self.assertEqual(summary["errors"], [])
+        return summary
+
+    def write(self, machine: str, name: str, data: dict):
+        path = os.path.join(self.lib(machine), name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        # Empreinte du fichier (taille, date) toujours différente de la précédente
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def read(self, machine: str, name: str) -> dict:
+        with open(os.path.join(self.lib(machine), name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_push_then_pull(self):
+        self.write("a", "journal.json", notebook("Journal", ["page un\n", "page deux\n"]))
+        self.assertEqual(self.sync("a")["pushed"], 1)
+        self.assertEqual(self.sync("b")["pulled"], 1)
+        data = self.read("b", "journal.json")
+        self.assertEqual((data["title"], data["pages"]), ("Journal", ["page un\n", "page deux\n"]))
+
+    def test_edits_on_both_sides_are_merged(self):
+        self.write("a", "journal.json", notebook("Journal", ["un\ndeux\ntrois\n", "autre\n"]))
+        self.sync("a")
+        self.sync("b")
+        self.write("a", "journal.json", notebook("Journal", ["UN\ndeux\ntrois\n", "autre\n"], "2026-01-02T00:00:00"))
+        self.write("b", "journal.json", notebook("Journal", ["un\ndeux\nTROIS\n", "autre\n"], "2026-01-03T00:00:00"))
+        self.sync("a")
+        summary = self.sync("b")
+        self.assertEqual((summary["merged"], summary["conflicts"]), (1, 0))
+        self.sync("a")
+        for machine in ("a", "b"):
+            self.assertEqual(self.read(machine, "journal.json")["pages"], ["UN\ndeux\nTROIS\n", "autre\n"])
+
+    def test_same_line_edited_on_both_sides(self):
+        self.write("a", "journal.json", notebook("Journal", ["un\ndeux\n"]))
+        self.sync("a")
+        self.sync("b")
+        self.write("a", "journal.json", notebook("Journal", ["un\nici\n"], "2026-01-02T00:00:00"))
+        self.write("b", "journal.json", notebook("Journal", ["un\nlà-bas\n"], "2026-01-03T00:00:00"))
+        self.sync("a")
+        self.assertEqual(self.sync("b")["conflicts"], 1)
+        self.sync("a")
+        pages = self.read("a", "journal.json")["pages"]
+        self.assertEqual(pages, self.read("b", "journal.json")["pages"])
+        self.assertIn(CONFLICT_MARKERS[1], pages[0])
+        self.assertIn("ici\n", pages[0])
+        self.assertIn("là-bas\n", pages[0])
+
+    def test_deletion_reaches_the_other_side(self):
+        self.write("a", "journal.json", notebook("Journal", ["un\n"]))
+        self.sync("a")
+        self.sync("b")
+        os.remove(os.path.join(self.lib("a"), "journal.json"))
+        self.sync("a")
+        self.assertEqual(self.sync("b")["deleted"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.lib("b"), "journal.json")))
+        self.assertEqual(len(os.listdir(os.path.join(self.root, "b", "sync", "trash"))), 1)
+        # Tombstone: une nouvelle machine ne reçoit pas le carnet supprimé
+        os.makedirs(self.lib("c"))
+        self.assertEqual(self.sync("c")["pulled"], 0)
+
+    def test_push_against_stale_base_is_refused(self):
+        store = self.server.store
+        h = text_hash("un\n")
+        manifest = dict(notebook("Journal", [h]), base=0)
+        self.assertEqual(store.push({h: "un\n"}, {"journal": manifest})["applied"], {"journal": 1})
+        answer = store.push({}, {"journal": manifest})
+        self.assertEqual(answer["applied"], {})
+        self.assertEqual(answer["conflicts"]["journal"]["rev"], 1)
+
+    def test_malformed_hash_is_rejected(self):
+        client = SyncClient(self.server.url)
+        self.addCleanup(client.close)
+        for name in ("objects", "missing"):
+            with self.assertRaises(SyncError):
+                client.call(name, {"hashes": ["../../secret.txt"]})
+
+if __name__ == "__main__":
+    unittest.main()